@@ -0,0 +1,77 @@
+"""Compares the time taken to convert a checksum CSV into the checksum DB, parsing the CSV in one process (the way the
+converter does by default) and in several processes at the same time, with a single connection writing the rows.
+
+Run it from the root of the repo with `python -m benchmarks.benchmark_converter`; by default, it creates a temporary
+CSV of 50,000,000 rows (about 4 GB, with the same columns as the DRI/Preservica export), but `--csv` can be used to time
+an existing CSV instead. Each way is timed parsing the CSV on its own and parsing it and writing it to a new DB.
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+
+from convert_checksum_csv_to_sqlite import (BULK_LOAD_PRAGMAS, get_csv_rows, get_csv_rows_in_parallel,
+                                            populate_table, set_pragmas)
+from helpers.checksum_db import create_checksum_table
+
+COLUMNS = ("FILEREF", "FIXITYVALUE", "ALGORITHMNAME")
+ALGORITHMS = (("SHA256", hashlib.sha256), ("MD5", hashlib.md5), ("SHA1", hashlib.sha1))
+
+
+def create_synthetic_csv(csv_name: str, number_of_rows: int) -> None:
+    with open(csv_name, "w", newline="") as csv_file:
+        csv_file.write(f"{",".join(COLUMNS)}\n")
+        for row_number in range(number_of_rows):
+            (algorithm_name, hash_func) = ALGORITHMS[row_number % len(ALGORITHMS)]
+            fixity_value = hash_func(row_number.to_bytes(8)).hexdigest().upper()  # upper-cased, as some exports are
+            csv_file.write(f"{row_number:012},{fixity_value},{algorithm_name}\n")
+
+
+def parse_only(rows) -> int:
+    return sum(1 for _ in rows)
+
+
+def parse_and_write(rows, db_name: str, schema_version: int) -> int:
+    if os.path.exists(db_name):
+        os.remove(db_name)
+    connection = sqlite3.connect(db_name)
+    set_pragmas(connection, BULK_LOAD_PRAGMAS)
+    create_checksum_table(connection, "files_in_dri", schema_version)
+    rows_written = populate_table(connection, "files_in_dri", rows, print_func=lambda _: None,
+                                  schema_version=schema_version)
+    connection.close()
+    return rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50_000_000, help="number of rows in the CSV to create")
+    parser.add_argument("--csv", help="time an existing CSV, rather than creating one")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of processes to parse the CSV with in parallel")
+    parser.add_argument("--schema-version", type=int, choices=(1, 2), default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_name = args.csv or os.path.join(temp_dir, "checksums.csv")
+        if not args.csv:
+            print(f"Creating a CSV of {args.rows:,} rows in '{temp_dir}'...")
+            create_synthetic_csv(csv_name, args.rows)
+        db_name = os.path.join(temp_dir, "checksums.db")
+
+        for (name, get_rows) in (("1 process", lambda: get_csv_rows(csv_name, *COLUMNS)),
+                                 (f"{args.workers} processes",
+                                  lambda: get_csv_rows_in_parallel(csv_name, *COLUMNS, workers=args.workers))):
+            for (step, convert) in (("parse", parse_only),
+                                    ("parse + write", lambda rows: parse_and_write(rows, db_name,
+                                                                                   args.schema_version))):
+                start_time = time.perf_counter()
+                number_of_rows = convert(get_rows())
+                seconds = time.perf_counter() - start_time
+                print(f"{name}, {step}: {seconds:,.2f} seconds ({number_of_rows / seconds:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
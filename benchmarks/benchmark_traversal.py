@@ -0,0 +1,66 @@
+"""Compares the time taken to find, and read the metadata of, every file in a folder, the way the app used to (with
+Path.walk() and a stat for each file's size) and the way it does now (with os.scandir, reusing each DirEntry's stat
+result).
+
+Run it from the root of the repo with `python -m benchmarks.benchmark_traversal`; by default, it creates a temporary
+folder of 1,000,000 empty files, in sub-folders of 1,000, but `--dir` can be used to time an existing folder instead
+(e.g. on a network drive, where the difference matters most).
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from holding_verification_core import HoldingVerificationCore
+
+
+def create_synthetic_tree(top_dir: str, number_of_files: int, files_per_dir: int) -> None:
+    for file_number in range(number_of_files):
+        dir_path = os.path.join(top_dir, f"dir_{file_number // files_per_dir:06}")
+        if file_number % files_per_dir == 0:
+            os.mkdir(dir_path)
+        open(os.path.join(dir_path, f"file_{file_number:07}.txt"), "wb").close()
+
+
+def old_traversal(top_dir: str) -> int:
+    total_size = 0
+    for direct_dir, _, files_in_dir in Path(top_dir).walk():
+        for file_name in files_in_dir:
+            total_size += Path(f"{direct_dir / file_name}").stat().st_size
+    return total_size
+
+
+def new_traversal(top_dir: str) -> int:
+    return sum(file_stat.st_size for (_, file_stat) in HoldingVerificationCore.get_files((top_dir,), True))
+
+
+def time_traversal(traversal_func, top_dir: str) -> float:
+    start_time = time.perf_counter()
+    traversal_func(top_dir)
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=1_000_000, help="number of empty files to create")
+    parser.add_argument("--files-per-dir", type=int, default=1_000)
+    parser.add_argument("--dir", help="time an existing folder, rather than creating one")
+    parser.add_argument("--repeats", type=int, default=3, help="the fastest of this many runs is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        top_dir = args.dir or temp_dir
+        if not args.dir:
+            print(f"Creating {args.files:,} empty files in '{temp_dir}'...")
+            create_synthetic_tree(temp_dir, args.files, args.files_per_dir)
+        number_of_files = sum(1 for _ in HoldingVerificationCore.get_files((top_dir,), True))
+
+        for (name, traversal_func) in (("Path.walk + Path.stat", old_traversal),
+                                       ("os.scandir + DirEntry.stat", new_traversal)):
+            seconds = min(time_traversal(traversal_func, top_dir) for _ in range(args.repeats))
+            print(f"{name}: {seconds:,.2f} seconds ({number_of_files / seconds:,.0f} files/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Benchmarks of the loop that hashes files, so that a change that slows it down is noticed.
+
+They need pytest and pytest-benchmark (in requirements.txt); run them from the root of the repo with
+`python -m pytest benchmarks` and compare runs with `--benchmark-autosave` and `--benchmark-compare`.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from helpers.read_benchmark import ALL_ALGORITHMS, get_sample, time_hashing
+from holding_verification_core import READ_STRATEGIES, HoldingVerificationCore, ReadSettings
+
+# (number of files, size of each file) - many small files as on a typical drive and a few large ones like videos
+SYNTHETIC_TREES = {"small_files": (2_000, 4_096), "large_files": (4, 64_000_000)}
+
+
+@pytest.fixture(scope="module", params=SYNTHETIC_TREES)
+def synthetic_tree(request, tmp_path_factory):
+    (number_of_files, file_size) = SYNTHETIC_TREES[request.param]
+    top_dir = tmp_path_factory.mktemp(request.param)
+    for file_number in range(number_of_files):
+        sub_dir = top_dir / f"dir_{file_number // 500}"
+        sub_dir.mkdir(exist_ok=True)
+        (sub_dir / f"file_{file_number}.bin").write_bytes(os.urandom(file_size))
+    return str(top_dir)
+
+
+@pytest.mark.parametrize("read_strategy", READ_STRATEGIES)
+def test_hashing_every_algorithm(benchmark, synthetic_tree, read_strategy):
+    sample = get_sample((synthetic_tree,), max_bytes=2 ** 63, max_files=2 ** 63)
+    result = benchmark(time_hashing, sample, ReadSettings(HoldingVerificationCore.BUFFER_SIZE, read_strategy),
+                       ALL_ALGORITHMS)
+    assert result.bytes_hashed == sum(file_size for (_, file_size) in sample)
+
+
+def test_finding_files(benchmark, synthetic_tree):
+    files = benchmark(lambda: list(HoldingVerificationCore.get_files((synthetic_tree,), True)))
+    assert all(file_stat is not None for (_, file_stat) in files)
@@ -1,43 +1,396 @@
+import argparse
 import csv, sqlite3
 import configparser
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import batched, groupby
 
+from helpers.bloom_filter import create_bloom_filter_file
+from helpers.checksum_db import (ALGORITHMS_TABLE_NAME, DB_VERSIONS_TABLE_NAME, create_checksum_table,
+                                 get_delete_statement, get_insert_statement,
+                                 get_latest_watermark, get_schema_version, get_v2_rows, has_file_size_column,
+                                 has_fingerprint_column, record_db_version, table_exists, to_algorithm_name,
+                                 update_algorithm_stats)
 
-def get_csv_rows(csv_name: str, file_ref_col: str, fixity_value_col: str, algo_name_col: str):
-    with open(csv_name, "r") as checksum_file:
-        dr = csv.DictReader(checksum_file)
+BATCH_SIZE = 100_000
+CHUNK_BYTES = 64 * 1024 * 1024  # the size of each part of the CSV that a worker parses, when parsing in parallel
+MAX_PENDING_CHUNKS_PER_WORKER = 2
+# Safe to turn off the journal and syncing whilst loading, as a failed load means the DB has to be recreated anyway
+BULK_LOAD_PRAGMAS = ("PRAGMA journal_mode = OFF;", "PRAGMA synchronous = OFF;", "PRAGMA cache_size = -512000;")
+DEFAULT_PRAGMAS = ("PRAGMA journal_mode = DELETE;", "PRAGMA synchronous = FULL;")
+
+
+def to_fixity_value(value: str) -> str:
+    """Hex digests are lower-cased, to match the checksums that the app generates; anything else is kept as it is"""
+    value = value.strip()
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        return value
+    return value.lower()
+
+
+def to_file_size(value: str) -> int | None:
+    try:
+        return int(value)
+    except ValueError:
+        return None  # a row without a size means that the size can't be used to rule files out
+
+
+def to_fingerprint(value: str) -> str | None:
+    return value.strip().lower() or None
+
+
+def is_deletion(value: str) -> bool:
+    return value.strip().upper() in ("DELETE", "DELETED", "D")
+
+
+def get_csv_rows(csv_name: str, file_ref_col: str, fixity_value_col: str, algo_name_col: str, file_size_col: str = "",
+                 fingerprint_col: str = "", delta_action_col: str = ""):
+    """Yields the values of the columns needed from each row, one row at a time, rather than reading the whole CSV.
+    If a file size column is given, the size (as an int) is added to the end of each row, followed by the fingerprint,
+    if a fingerprint column is given, and then whether the row is a deletion, if a delta action column is given.
+    Hex fixity values are lower-cased and algorithm names are upper-cased, without any hyphens."""
+    with open(csv_name, "r", newline="") as checksum_file:
+        reader = csv.reader(checksum_file)
         print(f"Getting rows from CSV: '{csv_name}'")
-        rows_to_write = tuple((row[file_ref_col], row[fixity_value_col], row[algo_name_col]) for row in dr)
-    return rows_to_write
+        columns_to_read = get_columns_to_read(csv_name, next(reader, []), file_ref_col, fixity_value_col,
+                                              algo_name_col, file_size_col, fingerprint_col, delta_action_col)
+        yield from parse_rows(reader, columns_to_read)
+
+
+def get_columns_to_read(csv_name: str, header: list[str], file_ref_col: str, fixity_value_col: str,
+                        algo_name_col: str, file_size_col: str = "", fingerprint_col: str = "",
+                        delta_action_col: str = "") -> tuple[tuple[int, object], ...]:
+    """Returns the index of each column needed (found once, from the header), with the function that converts its
+    values, in the order that they're added to each row"""
+    columns_needed = tuple((column, to_value) for (column, to_value) in
+                           ((file_ref_col, str), (fixity_value_col, to_fixity_value),
+                            (algo_name_col, to_algorithm_name), (file_size_col, to_file_size),
+                            (fingerprint_col, to_fingerprint), (delta_action_col, is_deletion)) if column)
+    missing_columns = [column for (column, _) in columns_needed if column not in header]
+    if missing_columns:
+        raise ValueError(f"The CSV '{csv_name}' does not have these columns: {", ".join(missing_columns)}")
+    return tuple((header.index(column), to_value) for (column, to_value) in columns_needed)
+
+
+def parse_rows(csv_rows, columns_to_read: tuple[tuple[int, object], ...]):
+    for row in csv_rows:
+        if row:
+            yield tuple(to_value(row[index]) for (index, to_value) in columns_to_read)
+
+
+def get_byte_ranges(csv_name: str, chunk_bytes: int = CHUNK_BYTES) -> tuple[list[str], list[tuple[int, int]]]:
+    """Returns the CSV's header and splits the rest of it into (start, end) byte ranges of about `chunk_bytes` bytes,
+    each starting at the start of a line and ending at the end of one, so that each range can be parsed on its own.
+    This assumes that no value has a line break in it, which is true of the DRI/Preservica exports."""
+    with open(csv_name, "rb") as checksum_file:
+        header = next(csv.reader(io.TextIOWrapper(io.BytesIO(checksum_file.readline()), newline="")), [])
+        start = checksum_file.tell()
+        file_size = os.fstat(checksum_file.fileno()).st_size
+        byte_ranges = []
+        while start < file_size:
+            checksum_file.seek(max(start + chunk_bytes - 1, start))
+            checksum_file.readline()  # to the end of the line that the range would otherwise end part-way through
+            end = min(checksum_file.tell(), file_size)
+            byte_ranges.append((start, end))
+            start = end
+    return header, byte_ranges
+
+
+def read_byte_range(csv_name: str, start: int, end: int, columns_to_read) -> list[tuple]:
+    """Parses the rows in part of the CSV; run in a worker process, so the rows are returned all together"""
+    with open(csv_name, "rb") as checksum_file:
+        checksum_file.seek(start)
+        csv_text = io.TextIOWrapper(io.BytesIO(checksum_file.read(end - start)), newline="")  # the same encoding
+        return list(parse_rows(csv.reader(csv_text), columns_to_read))                     # as the serial reader
+
+
+def get_csv_rows_in_parallel(csv_name: str, file_ref_col: str, fixity_value_col: str, algo_name_col: str,
+                             file_size_col: str = "", fingerprint_col: str = "", delta_action_col: str = "",
+                             workers: int = os.cpu_count() or 1, chunk_bytes: int = CHUNK_BYTES):
+    """Yields the same rows as get_csv_rows, in the same order, but parses parts of the CSV in `workers` processes at
+    the same time, so that the single connection writing the rows to the DB doesn't have to wait for the parsing.
+    Only a few parts are parsed ahead of the rows being written, so the whole CSV is never held in memory."""
+    print(f"Getting rows from CSV: '{csv_name}', with {workers} workers")
+    (header, byte_ranges) = get_byte_ranges(csv_name, chunk_bytes)
+    columns_to_read = get_columns_to_read(csv_name, header, file_ref_col, fixity_value_col, algo_name_col,
+                                          file_size_col, fingerprint_col, delta_action_col)
+    max_pending_chunks = workers * MAX_PENDING_CHUNKS_PER_WORKER
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending_chunks = deque()
+        try:
+            for (start, end) in byte_ranges:
+                pending_chunks.append(executor.submit(read_byte_range, csv_name, start, end, columns_to_read))
+                if len(pending_chunks) >= max_pending_chunks:
+                    yield from pending_chunks.popleft().result()
+
+            while pending_chunks:
+                yield from pending_chunks.popleft().result()
+        finally:
+            for future in pending_chunks:  # if the rows stop being written (e.g. an error), don't parse the rest
+                future.cancel()
+
+
+def get_rows_func(workers: int):
+    return get_csv_rows if workers <= 1 else partial(get_csv_rows_in_parallel, workers=workers)
+
+
+def set_pragmas(connection: sqlite3.Connection, pragmas: tuple[str, ...]):
+    for pragma in pragmas:
+        connection.execute(pragma)
+
+
+def populate_table(connection: sqlite3.Connection, table_name: str, rows_to_write, batch_size: int = BATCH_SIZE,
+                   print_func=print, schema_version: int = 1, with_file_sizes: bool = False,
+                   with_fingerprints: bool = False) -> int:
+    print_func(f"Adding rows into table: '{table_name}'")
+    insert_statement = get_insert_statement(table_name, schema_version, with_file_sizes, with_fingerprints)
+    if schema_version == 2:
+        rows_to_write = get_v2_rows(connection, rows_to_write)
+    rows_written = 0
+    start_time = time.perf_counter()
+
+    for batch_of_rows in batched(rows_to_write, batch_size):
+        with connection:  # each batch is written in its own transaction
+            connection.executemany(insert_statement, batch_of_rows)
+        rows_written += len(batch_of_rows)
+        rows_per_second = rows_written / max(time.perf_counter() - start_time, 1e-9)
+        print_func(f"{rows_written:,} rows added ({rows_per_second:,.0f} rows/sec)")
+
+    return rows_written
+
 
+def apply_delta(connection: sqlite3.Connection, table_name: str, delta_rows, watermark: str, source: str = "",
+                batch_size: int = BATCH_SIZE, print_func=print) -> tuple[int, int]:
+    """Applies the rows of a delta export (from get_csv_rows with a delta action column) to an existing table, in
+    batches, and records the new watermark. Each row that isn't a deletion replaces the checksum that its file ref has
+    for its algorithm (or adds it, if it doesn't have one); each deletion removes the file ref's checksum for its
+    algorithm, or all of the file ref's checksums, if it doesn't have an algorithm name. The rows are applied in order,
+    so a file ref can be deleted and then added again in the same delta.
 
-def populate_table(cursor: sqlite3.Cursor, table_name: str, rows_to_write: tuple[tuple[str, str, str]]):
-    print(f"Adding rows into table: '{table_name}'")
-    cursor.executemany(f"INSERT INTO {table_name} (file_ref, fixity_value, algorithm_name) VALUES (?, ?, ?);",
-                       rows_to_write)
-    cursor.execute(f"CREATE INDEX index_fixity_value ON {table_name} (fixity_value ASC)")
+    The indexes are kept up to date as each batch is written, so the DB can still be used while it's being updated.
+    Returns the number of rows added and deleted."""
+    latest_watermark = get_latest_watermark(connection)
+    if latest_watermark and watermark <= latest_watermark:
+        raise ValueError(f"The DB is already up to '{latest_watermark}', so a delta up to '{watermark}' can't be "
+                         f"applied to it")
 
+    schema_version = get_schema_version(connection.cursor(), table_name)
+    if not table_exists(connection, DB_VERSIONS_TABLE_NAME):  # converted before its values were normalised
+        normalise_existing_rows(connection, table_name, schema_version, print_func)
+    with_file_sizes = has_file_size_column(connection.cursor(), table_name)
+    with_fingerprints = has_fingerprint_column(connection.cursor(), table_name)
+    insert_statement = get_insert_statement(table_name, schema_version, with_file_sizes, with_fingerprints)
+    (delete_for_algorithm_statement, delete_all_statement) = (get_delete_statement(table_name, schema_version),
+                                                              get_delete_statement(table_name, schema_version, False))
+    create_file_ref_index(connection, table_name, print_func)  # so each file ref's rows can be found quickly
 
-def main():
+    (rows_added, rows_deleted) = (0, 0)
+    start_time = time.perf_counter()
+    for batch_of_rows in batched(delta_rows, batch_size):
+        with connection:  # each batch is applied in its own transaction
+            for (is_deletion_row, rows) in groupby(batch_of_rows, key=lambda delta_row: delta_row[-1]):
+                rows = [(file_ref, fixity_value, algorithm_name, *other_values[:-1])
+                        for (file_ref, fixity_value, algorithm_name, *other_values) in rows]
+                refs_without_algorithms = [(file_ref,) for (file_ref, _, algorithm_name, *_) in rows
+                                           if not algorithm_name]
+                rows = [row for row in rows if row[2]]
+                if schema_version == 2:
+                    rows = list(get_v2_rows(connection, rows))
+                refs_and_algorithms = [(file_ref, algorithm) for (file_ref, _, algorithm, *_) in rows]
+                if is_deletion_row:
+                    rows_deleted += connection.executemany(delete_for_algorithm_statement, refs_and_algorithms).rowcount
+                    rows_deleted += connection.executemany(delete_all_statement, refs_without_algorithms).rowcount
+                else:  # upserted by replacing the file ref's existing row for the algorithm
+                    connection.executemany(delete_for_algorithm_statement, refs_and_algorithms)
+                    connection.executemany(insert_statement, [row[:3 + with_file_sizes + with_fingerprints]
+                                                              for row in rows])
+                    rows_added += len(rows)
+        rows_per_second = (rows_added + rows_deleted) / max(time.perf_counter() - start_time, 1e-9)
+        print_func(f"{rows_added:,} rows added and {rows_deleted:,} deleted ({rows_per_second:,.0f} rows/sec)")
+
+    with connection:
+        record_db_version(connection, watermark, source, rows_added, rows_deleted)
+        update_algorithm_stats(connection, table_name, schema_version)
+    return rows_added, rows_deleted
+
+
+def normalise_existing_rows(connection: sqlite3.Connection, table_name: str, schema_version: int = 1,
+                            print_func=print) -> None:
+    """Normalises the algorithm names and (hex) fixity values of a DB converted before they were normalised as they
+    were read from the CSV, the way that get_csv_rows does, so that the rows of a delta export (which are normalised)
+    match them. This only needs to happen once, before the first delta is applied."""
+    print_func(f"Normalising the algorithm names and fixity values in table: '{table_name}' (this is only done once)")
+    normalised_name_sql = "UPPER(REPLACE(TRIM(algorithm_name), '-', ''))"  # as to_algorithm_name does
+    normalised_fixity_value_sql = "LOWER(TRIM(fixity_value))"
+    with connection:
+        if schema_version == 2:  # the fixity values are already raw digests, unless they weren't hex
+            algorithm_ids = dict(connection.execute(f"SELECT algorithm_name, algorithm_id "
+                                                    f"FROM {ALGORITHMS_TABLE_NAME};"))
+            for (algorithm_name, algorithm_id) in list(algorithm_ids.items()):
+                normalised_name = to_algorithm_name(algorithm_name)
+                if normalised_name == algorithm_name:
+                    continue
+                if normalised_name in algorithm_ids:  # e.g. both "sha-256" and "SHA256"; their rows are merged
+                    connection.execute(f"UPDATE OR IGNORE {table_name} SET algorithm_id = ? WHERE algorithm_id = ?;",
+                                       (algorithm_ids[normalised_name], algorithm_id))
+                    connection.execute(f"DELETE FROM {table_name} WHERE algorithm_id = ?;", (algorithm_id,))
+                    connection.execute(f"DELETE FROM {ALGORITHMS_TABLE_NAME} WHERE algorithm_id = ?;", (algorithm_id,))
+                else:
+                    connection.execute(f"UPDATE {ALGORITHMS_TABLE_NAME} SET algorithm_name = ? WHERE algorithm_id = ?;",
+                                       (normalised_name, algorithm_id))
+                    algorithm_ids[normalised_name] = algorithm_id
+        else:
+            connection.execute(f"UPDATE {table_name} SET algorithm_name = {normalised_name_sql} "
+                               f"WHERE algorithm_name IS NOT {normalised_name_sql};")
+            connection.execute(f"UPDATE {table_name} SET fixity_value = {normalised_fixity_value_sql} "
+                               f"WHERE fixity_value IS NOT {normalised_fixity_value_sql} "  # only hex values are lowered
+                               f"AND {normalised_fixity_value_sql} NOT GLOB '*[^0-9A-Fa-f]*' "
+                               f"AND LENGTH({normalised_fixity_value_sql}) % 2 = 0;")
+
+
+def create_algorithm_fixity_value_index(connection: sqlite3.Connection, table_name: str):
+    """Each checksum is looked up with the algorithm that generated it, so the index is on both; the DB is then
+    analysed (quickly, from a sample), so that SQLite can still use the index to look up a fixity value on its own"""
+    print(f"Creating index on the algorithm names and fixity values of table: '{table_name}'")
+    with connection:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS index_algorithm_fixity_value ON {table_name} "
+                           "(algorithm_name ASC, fixity_value ASC)")
+    connection.execute("PRAGMA analysis_limit = 1000;")
+    connection.execute("ANALYZE;")
+
+
+def create_file_size_index(connection: sqlite3.Connection, table_name: str):
+    print(f"Creating index on the file sizes of table: '{table_name}'")
+    with connection:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS index_file_size ON {table_name} (file_size ASC)")
+
+
+def create_fingerprint_index(connection: sqlite3.Connection, table_name: str):
+    print(f"Creating index on the fingerprints of table: '{table_name}'")
+    with connection:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS index_fingerprint ON {table_name} (fingerprint ASC)")
+
+
+def create_file_ref_index(connection: sqlite3.Connection, table_name: str, print_func=print):
+    print_func(f"Creating index on the file refs of table: '{table_name}', if it doesn't have one")
+    with connection:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS index_file_ref ON {table_name} (file_ref ASC)")
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Convert a CSV export of the checksums in Preservica/DRI into the checksum DB; with '--delta', "
+                    "apply a delta export (ingests and deletions since the last export) to an existing DB instead."
+    )
+    parser.add_argument("--delta", metavar="CSV", help="the delta export to apply to the existing DB")
+    parser.add_argument("--watermark",
+                        help="what the export is up to, e.g. the date of the last ingest in it (e.g. 2026-10-01); "
+                             "required with '--delta', as each delta has to be later than the one before it")
+    parser.add_argument("--workers", type=int,
+                        help="the number of processes to parse the CSV with (overrides CONVERTER_WORKERS in "
+                             "config.ini); 1 parses it in this process")
+    parsed_args = parser.parse_args(args)
+    if parsed_args.delta and not parsed_args.watermark:
+        parser.error("'--watermark' is required with '--delta'")
+    if parsed_args.workers is not None and parsed_args.workers < 1:
+        parser.error("'--workers' must be at least 1")
+    return parsed_args
+
+
+def update_bloom_filter(connection: sqlite3.Connection, default_config, table_name: str):
+    if default_config.getboolean("USE_BLOOM_FILTER", False):
+        bloom_filter_name = os.path.join(os.path.dirname(default_config["CHECKSUM_DB_NAME"]),
+                                         default_config["CHECKSUM_BLOOM_FILTER_NAME"])
+        print(f"Creating Bloom filter: '{bloom_filter_name}'")
+        create_bloom_filter_file(connection, table_name, bloom_filter_name)
+
+
+def main_delta(delta_csv_name: str, watermark: str, default_config, workers: int = 1):
+    checksum_db_name = default_config["CHECKSUM_DB_NAME"]
+    table_name = default_config["CHECKSUM_TABLE_NAME"]
+    connection = sqlite3.connect(checksum_db_name)
+    if not table_exists(connection, table_name):
+        connection.close()
+        raise ValueError(f"'{checksum_db_name}' doesn't have the table '{table_name}' yet, so a delta can't be "
+                         f"applied to it; convert a full export first")
+
+    delta_rows = get_rows_func(workers)(delta_csv_name, default_config["CSV_FILEREF_COLUMN"],
+                              default_config["CSV_FIXITYVALUE_COLUMN"], default_config["CSV_ALGORITHMNAME_COLUMN"],
+                              default_config.get("CSV_FILESIZE_COLUMN", "")
+                              if has_file_size_column(connection.cursor(), table_name) else "",
+                              default_config.get("CSV_FINGERPRINT_COLUMN", "")
+                              if has_fingerprint_column(connection.cursor(), table_name) else "",
+                              default_config.get("CSV_DELTA_ACTION_COLUMN", "ACTION"))
+    try:
+        apply_delta(connection, table_name, delta_rows, watermark, delta_csv_name)
+        update_bloom_filter(connection, default_config, table_name)
+    finally:
+        connection.close()
+    print("Completed.")
+
+
+def main(args=None):
+    args = parse_args(args)
     config = configparser.ConfigParser()
     config.read("config.ini")
     default_config = config["DEFAULT"]
+    workers = args.workers or default_config.getint("CONVERTER_WORKERS", 1)
+    if args.delta:
+        try:
+            main_delta(args.delta, args.watermark, default_config, workers)
+        except ValueError as error:  # e.g. the delta has already been applied; the DB is left as it was
+            print(error)
+        return
+
     checksum_db_name = default_config["CHECKSUM_DB_NAME"]
     table_name = default_config["CHECKSUM_TABLE_NAME"]
-    csv_name = input("Paste the full path of the CSV file with the checksums here and press ENTER: ")
-
+    schema_version = default_config.getint("CHECKSUM_DB_SCHEMA_VERSION", 1)
     connection = sqlite3.connect(checksum_db_name)
-    cursor = connection.cursor()
+    if table_exists(connection, table_name):
+        connection.close()
+        print(f"'{checksum_db_name}' already has the table '{table_name}'; to add the ingests (and deletions) since it "
+              f"was created, run this with '--delta <CSV> --watermark <date>', or delete it to convert a full export.")
+        return
 
-    cursor.execute(f"CREATE TABLE {table_name} (file_ref, fixity_value, algorithm_name);")
+    csv_name = input("Paste the full path of the CSV file with the checksums here and press ENTER: ")
+    set_pragmas(connection, BULK_LOAD_PRAGMAS)
 
     file_ref_col = default_config["CSV_FILEREF_COLUMN"]
     fixity_value_col = default_config["CSV_FIXITYVALUE_COLUMN"]
     algo_name_col = default_config["CSV_ALGORITHMNAME_COLUMN"]
+    file_size_col = default_config.get("CSV_FILESIZE_COLUMN", "")  # optional; lets the app rule out files by size
+    with_file_sizes = file_size_col != ""
+    fingerprint_col = default_config.get("CSV_FINGERPRINT_COLUMN", "")  # optional; see helpers/fingerprint.py
+    with_fingerprints = fingerprint_col != ""
 
-    rows_to_write = get_csv_rows(csv_name, file_ref_col, fixity_value_col, algo_name_col)
-    populate_table(cursor, table_name, rows_to_write)
+    create_checksum_table(connection, table_name, schema_version, with_file_sizes, with_fingerprints)
 
+    rows_to_write = get_rows_func(workers)(csv_name, file_ref_col, fixity_value_col, algo_name_col, file_size_col,
+                                           fingerprint_col)
+    rows_written = populate_table(connection, table_name, rows_to_write, schema_version=schema_version,
+                                  with_file_sizes=with_file_sizes, with_fingerprints=with_fingerprints)
+    if schema_version == 1:  # a version 2 table is keyed on the fixity value so doesn't need a separate index
+        # building the index once all rows are in is much quicker
+        create_algorithm_fixity_value_index(connection, table_name)
+    if with_file_sizes:
+        create_file_size_index(connection, table_name)
+    if with_fingerprints:
+        create_fingerprint_index(connection, table_name)
+
+    record_db_version(connection, args.watermark or "", csv_name, rows_written)
+    update_algorithm_stats(connection, table_name, schema_version)
     connection.commit()
+    set_pragmas(connection, DEFAULT_PRAGMAS)
+
+    update_bloom_filter(connection, default_config, table_name)
+
     connection.close()
     print("Completed.")
 
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+from pathlib import Path
+
+from helpers.checksum_db import fixity_value_from_blob
+
+
+class ChecksumBloomFilter:
+    """A space-efficient set of checksums that can say a checksum is definitely not in the DB.
+
+    It can give false positives (the DB is then queried and nothing is found) but never false negatives.
+    """
+    FILE_SIGNATURE = b"HOLDING-VERIFICATION-BLOOM-FILTER\n"
+
+    def __init__(self, number_of_bits: int, number_of_hashes: int, bits: bytearray | None = None):
+        self.number_of_bits = max(number_of_bits, 8)
+        self.number_of_hashes = max(number_of_hashes, 1)
+        self.bits = bits if bits is not None else bytearray(math.ceil(self.number_of_bits / 8))
+
+    @classmethod
+    def for_number_of_checksums(cls, number_of_checksums: int, false_positive_rate: float = 0.01):
+        number_of_checksums = max(number_of_checksums, 1)
+        number_of_bits = math.ceil(-number_of_checksums * math.log(false_positive_rate) / (math.log(2) ** 2))
+        number_of_hashes = round(number_of_bits / number_of_checksums * math.log(2))
+        return cls(number_of_bits, number_of_hashes)
+
+    def get_bit_positions(self, checksum: str):
+        digest = hashlib.blake2b(checksum.encode(), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], "little")
+        second_hash = int.from_bytes(digest[8:], "little") | 1
+        return ((first_hash + i * second_hash) % self.number_of_bits for i in range(self.number_of_hashes))
+
+    def add(self, checksum: str) -> None:
+        for bit_position in self.get_bit_positions(checksum):
+            self.bits[bit_position >> 3] |= 1 << (bit_position & 7)
+
+    def __contains__(self, checksum: str) -> bool:
+        return all(self.bits[bit_position >> 3] & (1 << (bit_position & 7))
+                   for bit_position in self.get_bit_positions(checksum))
+
+    def save(self, file_name: str, db_fingerprint: str) -> None:
+        header = {"number_of_bits": self.number_of_bits, "number_of_hashes": self.number_of_hashes,
+                  "db_fingerprint": db_fingerprint}
+        temp_file_name = f"{file_name}.{os.getpid()}.tmp"  # so that another run saving it at the same time can't mix
+        try:
+            with open(temp_file_name, "wb") as bloom_filter_file:
+                bloom_filter_file.write(self.FILE_SIGNATURE)
+                bloom_filter_file.write(json.dumps(header).encode() + b"\n")
+                bloom_filter_file.write(self.bits)
+            os.replace(temp_file_name, file_name)  # so that a run loading it never sees a partly-written file
+        finally:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+
+    @classmethod
+    def load(cls, file_name: str):
+        """Returns the Bloom filter and the fingerprint of the DB it was built from"""
+        with open(file_name, "rb") as bloom_filter_file:
+            if bloom_filter_file.readline() != cls.FILE_SIGNATURE:
+                raise ValueError(f"'{file_name}' is not a Bloom filter file")
+            header = json.loads(bloom_filter_file.readline())
+            bits = bytearray(bloom_filter_file.read())
+
+        bloom_filter = cls(header["number_of_bits"], header["number_of_hashes"], bits)
+        if len(bits) != math.ceil(bloom_filter.number_of_bits / 8):
+            raise ValueError(f"'{file_name}' is incomplete")
+        return bloom_filter, header["db_fingerprint"]
+
+
+def get_db_fingerprint(connection, table_name: str) -> str:
+    """Identifies the contents of the DB without reading all of it, so that a stale Bloom filter can be detected.
+
+    Made up of the DB file's size, the 'file change counter' that SQLite increments in the file's header on every
+    committed write, and the largest rowid in the table (or the number of rows, if it's a 'WITHOUT ROWID' table).
+    """
+    (_, _, db_file_name) = connection.execute("PRAGMA database_list;").fetchone()
+    with open(db_file_name, "rb") as db_file:
+        db_file.seek(24)
+        file_change_counter = int.from_bytes(db_file.read(4), "big")
+    try:
+        (max_rowid,) = connection.execute(f"SELECT MAX(rowid) FROM {table_name};").fetchone()
+    except sqlite3.OperationalError:
+        (max_rowid,) = connection.execute(f"SELECT COUNT(*) FROM {table_name};").fetchone()
+    return f"{os.path.getsize(db_file_name)}:{file_change_counter}:{max_rowid}"
+
+
+def build_bloom_filter(connection, table_name: str, false_positive_rate: float = 0.01) -> ChecksumBloomFilter:
+    (number_of_checksums,) = connection.execute(f"SELECT COUNT(*) FROM {table_name};").fetchone()
+    bloom_filter = ChecksumBloomFilter.for_number_of_checksums(number_of_checksums, false_positive_rate)
+    for (fixity_value,) in connection.execute(f"SELECT fixity_value FROM {table_name};"):
+        bloom_filter.add(fixity_value_from_blob(fixity_value))
+    return bloom_filter
+
+
+def create_bloom_filter_file(connection, table_name: str, bloom_filter_file_name: str) -> ChecksumBloomFilter:
+    bloom_filter = build_bloom_filter(connection, table_name)
+    bloom_filter.save(bloom_filter_file_name, get_db_fingerprint(connection, table_name))
+    return bloom_filter
+
+
+def load_or_create_bloom_filter(connection, table_name: str, bloom_filter_file_name: str,
+                                print_func=print) -> ChecksumBloomFilter:
+    """Loads the Bloom filter file, rebuilding it if it's missing, unreadable or was built from a different DB"""
+    if Path(bloom_filter_file_name).exists():
+        try:
+            (bloom_filter, db_fingerprint) = ChecksumBloomFilter.load(bloom_filter_file_name)
+            if db_fingerprint == get_db_fingerprint(connection, table_name):
+                return bloom_filter
+            print_func(f"The Bloom filter '{bloom_filter_file_name}' was built from a different version of the DB.")
+        except (OSError, ValueError, KeyError) as e:
+            print_func(f"Unable to load the Bloom filter '{bloom_filter_file_name}', due to this error: {e}")
+
+    print_func(f"Building the Bloom filter '{bloom_filter_file_name}' from the DB...")
+    return create_bloom_filter_file(connection, table_name, bloom_filter_file_name)
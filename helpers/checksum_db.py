@@ -0,0 +1,165 @@
+"""The schemas of the checksum DB that convert_checksum_csv_to_sqlite.py creates and holding_verification_core.py reads.
+
+Version 1 stores each CSV row as text: (file_ref, fixity_value, algorithm_name), with a separate index on fixity_value.
+Version 2 stores the fixity values as raw digests (BLOBs) and the algorithm names in a small lookup table, in a
+'WITHOUT ROWID' table keyed on the fixity value, so the table is its own index; this roughly halves the size of the DB.
+Either version can also have a file_size column and a fingerprint column (see helpers/fingerprint.py), each with its own
+index, if the CSV had the size or fingerprint of each file.
+
+Each full load or delta update (see convert_checksum_csv_to_sqlite.py) is recorded in the db_versions table, with the
+watermark (e.g. the date up to which ingests were exported) that it brought the DB up to. After each one, the number of
+rows for each algorithm is recorded in the algorithm_stats table, so that the app knows which algorithms to look up
+checksums with, and in which order, without counting the rows itself.
+"""
+ALGORITHMS_TABLE_NAME = "algorithms"
+DB_VERSIONS_TABLE_NAME = "db_versions"
+ALGORITHM_STATS_TABLE_NAME = "algorithm_stats"
+
+
+def to_algorithm_name(value: str) -> str:
+    """Returns the name that the converter stores an algorithm as, e.g. "sha-256" or "sha256" becomes SHA256"""
+    return value.strip().upper().replace("-", "")
+
+
+def get_schema_version(cursor, table_name: str) -> int:
+    cursor.execute(f"PRAGMA table_info({table_name});")
+    column_names = [column[1] for column in cursor.fetchall()]
+    return 2 if "algorithm_id" in column_names else 1
+
+
+def has_file_size_column(cursor, table_name: str) -> bool:
+    cursor.execute(f"PRAGMA table_info({table_name});")
+    return "file_size" in (column[1] for column in cursor.fetchall())
+
+
+def has_fingerprint_column(cursor, table_name: str) -> bool:
+    cursor.execute(f"PRAGMA table_info({table_name});")
+    return "fingerprint" in (column[1] for column in cursor.fetchall())
+
+
+def create_checksum_table(connection, table_name: str, schema_version: int = 1, with_file_sizes: bool = False,
+                          with_fingerprints: bool = False):
+    optional_columns = (", file_size INTEGER" if with_file_sizes else "") + (", fingerprint TEXT" if with_fingerprints
+                                                                            else "")
+    if schema_version == 2:
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {ALGORITHMS_TABLE_NAME} "
+                           "(algorithm_id INTEGER PRIMARY KEY, algorithm_name TEXT UNIQUE NOT NULL);")
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (fixity_value BLOB NOT NULL, "
+                           f"file_ref TEXT NOT NULL, algorithm_id INTEGER NOT NULL{optional_columns}, "
+                           "PRIMARY KEY (fixity_value, file_ref, algorithm_id)) WITHOUT ROWID;")
+    else:
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (file_ref, fixity_value, "
+                           f"algorithm_name{optional_columns});")
+
+
+def get_insert_statement(table_name: str, schema_version: int = 1, with_file_sizes: bool = False,
+                         with_fingerprints: bool = False) -> str:
+    optional_columns = (("file_size",) if with_file_sizes else ()) + (("fingerprint",) if with_fingerprints else ())
+    (optional_column_names, optional_values) = ("".join(f", {column}" for column in optional_columns),
+                                                ", ?" * len(optional_columns))
+    if schema_version == 2:
+        return (f"INSERT OR IGNORE INTO {table_name} (file_ref, fixity_value, algorithm_id{optional_column_names}) "
+                f"VALUES (?, ?, ?{optional_values});")
+    return (f"INSERT INTO {table_name} (file_ref, fixity_value, algorithm_name{optional_column_names}) "
+            f"VALUES (?, ?, ?{optional_values});")
+
+
+def get_delete_statement(table_name: str, schema_version: int = 1, for_one_algorithm: bool = True) -> str:
+    """Returns a statement that deletes the rows of a file ref, for one algorithm or (if not `for_one_algorithm`) all"""
+    if not for_one_algorithm:
+        return f"DELETE FROM {table_name} WHERE file_ref = ?;"
+    algorithm_column = "algorithm_id" if schema_version == 2 else "algorithm_name"
+    return f"DELETE FROM {table_name} WHERE file_ref = ? AND {algorithm_column} = ?;"
+
+
+def table_exists(connection, table_name: str) -> bool:
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;",
+                              (table_name,)).fetchone() is not None
+
+
+def create_db_versions_table(connection) -> None:
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {DB_VERSIONS_TABLE_NAME} (version INTEGER PRIMARY KEY, "
+                       "applied TEXT, watermark TEXT, source TEXT, rows_added INTEGER, rows_deleted INTEGER);")
+
+
+def get_latest_watermark(connection) -> str:
+    if not table_exists(connection, DB_VERSIONS_TABLE_NAME):
+        return ""
+    row = connection.execute(f"SELECT watermark FROM {DB_VERSIONS_TABLE_NAME} ORDER BY version DESC LIMIT 1;"
+                             ).fetchone()
+    return row[0] if row else ""
+
+
+def record_db_version(connection, watermark: str, source: str, rows_added: int, rows_deleted: int = 0) -> None:
+    create_db_versions_table(connection)
+    connection.execute(f"INSERT INTO {DB_VERSIONS_TABLE_NAME} (applied, watermark, source, rows_added, rows_deleted) "
+                       "VALUES (datetime('now'), ?, ?, ?, ?);", (watermark, source, rows_added, rows_deleted))
+
+
+def update_algorithm_stats(connection, table_name: str, schema_version: int = 1) -> None:
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {ALGORITHM_STATS_TABLE_NAME} (table_name TEXT NOT NULL, "
+                       "algorithm_name TEXT NOT NULL, row_count INTEGER NOT NULL, "
+                       "PRIMARY KEY (table_name, algorithm_name));")
+    connection.execute(f"DELETE FROM {ALGORITHM_STATS_TABLE_NAME} WHERE table_name = ?;", (table_name,))
+    algorithm_names = (f"{table_name} NATURAL JOIN {ALGORITHMS_TABLE_NAME}" if schema_version == 2 else table_name)
+    connection.execute(f"INSERT INTO {ALGORITHM_STATS_TABLE_NAME} (table_name, algorithm_name, row_count) "
+                       f"SELECT ?, algorithm_name, COUNT(*) FROM {algorithm_names} GROUP BY algorithm_name;",
+                       (table_name,))
+
+
+def get_algorithm_row_counts(connection, table_name: str) -> dict[str, int] | None:
+    """Returns the number of rows for each algorithm name in the table, or None if they haven't been recorded"""
+    if not table_exists(connection, ALGORITHM_STATS_TABLE_NAME):
+        return None
+    row_counts = dict(connection.execute(f"SELECT algorithm_name, row_count FROM {ALGORITHM_STATS_TABLE_NAME} "
+                                         "WHERE table_name = ?;", (table_name,)).fetchall())
+    return row_counts or None
+
+
+def get_file_size_select_statement(table_name: str) -> str:
+    return f"SELECT 1 FROM {table_name} WHERE file_size = ? LIMIT 1;"
+
+
+def get_fingerprint_select_statement(table_name: str) -> str:
+    return f"SELECT 1 FROM {table_name} WHERE fingerprint = ? LIMIT 1;"
+
+
+def get_lowest_and_highest_fingerprints(cursor, table_name: str) -> tuple[str, str]:
+    """Returns the lowest and highest fingerprints in the table (found using its index); as each fingerprint starts
+    with its sample size, if they both start with the same one, every fingerprint between them does too"""
+    cursor.execute(f"SELECT MIN(fingerprint), MAX(fingerprint) FROM {table_name};")
+    return cursor.fetchone()
+
+
+def get_select_statement(table_name: str, schema_version: int = 1, by_algorithm: bool = False) -> str:
+    """Returns the start of a SELECT statement, up to the comparison with the fixity value; if `by_algorithm`, the
+    first parameter is the algorithm name, so that only that algorithm's rows are searched"""
+    if schema_version == 2:
+        return (f"""SELECT checksums.file_ref, checksums.fixity_value, algorithms.algorithm_name FROM {table_name} """
+                f"""AS checksums JOIN {ALGORITHMS_TABLE_NAME} AS algorithms USING (algorithm_id) """
+                f"""WHERE {"algorithms.algorithm_name = ? AND " if by_algorithm else ""}checksums."fixity_value" """)
+    return (f"""SELECT file_ref, fixity_value, algorithm_name FROM {table_name} """
+            f"""WHERE {"algorithm_name = ? AND " if by_algorithm else ""}"fixity_value" """)
+
+
+def fixity_value_to_blob(fixity_value: str) -> bytes | str:
+    try:
+        return bytes.fromhex(fixity_value)
+    except (TypeError, ValueError):
+        return fixity_value  # not a hex digest, so kept as it is, rather than losing the row
+
+
+def fixity_value_from_blob(fixity_value: bytes | str) -> str:
+    return fixity_value.hex() if isinstance(fixity_value, bytes) else fixity_value
+
+
+def get_v2_rows(connection, rows):
+    """Converts (file_ref, fixity_value, algorithm_name) rows into the version 2 schema's rows, adding any algorithm
+    names that haven't been seen before to the algorithms table. Any other values (e.g. the file size) are kept."""
+    algorithm_ids = dict(connection.execute(f"SELECT algorithm_name, algorithm_id FROM {ALGORITHMS_TABLE_NAME};"))
+    for file_ref, fixity_value, algorithm_name, *other_values in rows:
+        if algorithm_name not in algorithm_ids:
+            algorithm_ids[algorithm_name] = connection.execute(
+                f"INSERT INTO {ALGORITHMS_TABLE_NAME} (algorithm_name) VALUES (?);", (algorithm_name,)
+            ).lastrowid
+        yield file_ref, fixity_value_to_blob(fixity_value), algorithm_ids[algorithm_name], *other_values
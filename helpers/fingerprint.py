@@ -0,0 +1,53 @@
+"""Cheap fingerprints of large files, which can rule a file out of the checksum DB without reading all of it.
+
+A fingerprint is the SHA256 of the file's size in bytes (as text), a colon, its first `sample_size` bytes and its last
+`sample_size` bytes (not counting any bytes twice, so a file smaller than 2 samples is fingerprinted in full), after the
+sample size and a colon, e.g. `65536:3a7bd3...`; fingerprints taken with different sample sizes never match, so the app
+checks that the DB's fingerprints were taken with the sample size it's using.
+
+To create the fingerprint column for the checksum CSV, run this with the preserved files (or a copy of them):
+
+    python -m helpers.fingerprint FILE [FILE ...] > fingerprints.csv
+"""
+import argparse
+import csv
+import hashlib
+import os
+import sys
+
+DEFAULT_SAMPLE_SIZE = 65_536
+
+
+def get_fingerprint(file_path: str, sample_size: int = DEFAULT_SAMPLE_SIZE) -> str:
+    with open(file_path, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        fingerprint = hashlib.sha256(f"{file_size}:".encode())
+        fingerprint.update(file.read(sample_size))
+        if file_size > sample_size:
+            file.seek(max(file_size - sample_size, sample_size))
+            fingerprint.update(file.read(sample_size))
+    return f"{sample_size}:{fingerprint.hexdigest()}"
+
+
+def get_sample_size(fingerprint: str) -> int | None:
+    """Returns the sample size that the fingerprint was taken with, or None if it doesn't have one"""
+    (sample_size, separator, _) = fingerprint.partition(":")
+    return int(sample_size) if separator and sample_size.isdigit() else None
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Writes the size and fingerprint of each file as a CSV")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help="number of bytes read from the start and end of each file (if it isn't "
+                             "FINGERPRINT_SAMPLE_SIZE in config.ini, the fingerprints aren't used)")
+    args = parser.parse_args(args)
+
+    csv_writer = csv.writer(sys.stdout)
+    csv_writer.writerow(("file_path", "file_size", "fingerprint"))
+    for file_path in args.files:
+        csv_writer.writerow((file_path, os.path.getsize(file_path), get_fingerprint(file_path, args.sample_size)))
+
+
+if __name__ == "__main__":
+    main()
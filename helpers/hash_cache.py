@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import time
+
+
+class HashCache:
+    """A local SQLite file that remembers the checksums of files already hashed, so that a file is only hashed again if
+    its size, modification time or inode has changed since.
+
+    When there are more than `max_entries` files in the cache, the ones that haven't been seen for the most runs are
+    removed.
+
+    Several runs (e.g. scheduled jobs) can share the cache at the same time: the changes are held in memory and written
+    in one short transaction every `WRITE_EVERY` changes or `WRITE_EVERY_SECONDS` seconds, so the cache is only locked
+    for as long as it takes to write them, and the cache is in WAL mode, so that reading it never waits for a write.
+    """
+    WRITE_EVERY = 1_000
+    WRITE_EVERY_SECONDS = 1.0
+
+    def __init__(self, file_name: str, max_entries: int = 10_000_000, clock=time.monotonic):
+        self.file_name = file_name
+        self.max_entries = max_entries
+        self.clock = clock
+        self.connection = sqlite3.connect(file_name, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL;")
+        self.pending_puts: dict[str, tuple] = {}  # by path, so a file put more than once is only written once
+        self.pending_touches: set[str] = set()  # the paths of the files found in the cache since the last write
+        self.last_write_time = clock()
+        self.connection.execute("CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, started TEXT);")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS file_hashes (path TEXT PRIMARY KEY, size INTEGER, "
+                                "mtime_ns INTEGER, inode INTEGER, sha256 TEXT, md5 TEXT, sha1 TEXT, "
+                                "last_seen_run INTEGER);")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS index_last_seen_run ON file_hashes (last_seen_run ASC);")
+        self.connection.commit()
+        self.run_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start_run(self) -> None:
+        self.run_id = self.connection.execute("INSERT INTO runs (started) VALUES (datetime('now'));").lastrowid
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, file_stat: os.stat_result) -> dict[str, str] | None:
+        file_key = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+        pending_put = self.pending_puts.get(path)
+        if pending_put is not None:
+            row = pending_put[5:8] if pending_put[1:4] == file_key else None
+        else:
+            row = self.connection.execute(
+                "SELECT sha256, md5, sha1 FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?;",
+                (path, *file_key)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.pending_touches.add(path)
+        self.write_regularly()
+        (sha256, md5, sha1) = row
+        return {"sha256": sha256, "md5": md5, "sha1": sha1}
+
+    def put(self, path: str, file_stat: os.stat_result, checksums: dict[str, str]) -> None:
+        self.pending_puts[path] = (path, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino,
+                                   self.run_id, checksums["sha256"], checksums["md5"], checksums["sha1"])
+        self.write_regularly()
+
+    def write_regularly(self) -> None:
+        if (len(self.pending_puts) + len(self.pending_touches) >= self.WRITE_EVERY
+                or self.clock() - self.last_write_time >= self.WRITE_EVERY_SECONDS):
+            self.write()
+
+    def write(self) -> None:
+        """Writes the changes held in memory to the cache, in one transaction"""
+        if self.pending_puts or self.pending_touches:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, inode, last_seen_run, sha256, md5, "
+                    "sha1) VALUES (?, ?, ?, ?, ?, ?, ?, ?);", self.pending_puts.values()
+                )
+                self.connection.executemany("UPDATE file_hashes SET last_seen_run = ? WHERE path = ?;",
+                                            ((self.run_id, path) for path in self.pending_touches))
+            self.pending_puts = {}
+            self.pending_touches = set()
+        self.last_write_time = self.clock()
+
+    def evict(self) -> int:
+        self.write()
+        (number_of_entries,) = self.connection.execute("SELECT COUNT(*) FROM file_hashes;").fetchone()
+        number_to_evict = number_of_entries - self.max_entries
+        if number_to_evict <= 0:
+            return 0
+
+        self.connection.execute("DELETE FROM file_hashes WHERE path IN "
+                                "(SELECT path FROM file_hashes ORDER BY last_seen_run ASC LIMIT ?);", (number_to_evict,))
+        return number_to_evict
+
+    def end_run(self) -> None:
+        self.evict()
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.write()
+        self.connection.commit()
+        self.connection.close()
@@ -1,25 +1,34 @@
+import sys
+
 from colorama import Fore
 from colorama import Style
 from colorama import init as colorama_init
 
 class ColourCliText:
-    def __init__(self):
-        colorama_init()
+    """Wraps text in colour codes, unless the output isn't a terminal (e.g. it's redirected to a file), in which case
+    the text is returned as it is and colorama isn't set up, as its wrapping of stdout slows every write down"""
+    def __init__(self, use_colour: bool | None = None):
+        self.use_colour = (sys.stdout is not None and sys.stdout.isatty()) if use_colour is None else use_colour
+        if self.use_colour:
+            colorama_init()
+
+    def colour(self, colour_codes: str, text) -> str:
+        return f"{colour_codes}{text}{Style.RESET_ALL}" if self.use_colour else f"{text}"
 
     def yellow(self, text) -> str:
-        return f"{Fore.YELLOW}{text}{Style.RESET_ALL}"
+        return self.colour(Fore.YELLOW, text)
 
     def green(self, text) -> str:
-        return f"{Fore.GREEN}{text}{Style.RESET_ALL}"
+        return self.colour(Fore.GREEN, text)
 
     def red(self, text) -> str:
-        return f"{Fore.RED}{text}{Style.RESET_ALL}"
+        return self.colour(Fore.RED, text)
 
     def light_red(self, text) -> str:
-        return f"{Fore.LIGHTRED_EX}{text}{Style.RESET_ALL}"
+        return self.colour(Fore.LIGHTRED_EX, text)
 
     def bright_cyan(self, text) -> str:
-        return f"{Fore.CYAN}{Style.BRIGHT}{text}{Style.RESET_ALL}"
+        return self.colour(f"{Fore.CYAN}{Style.BRIGHT}", text)
 
     def magenta(self, text) -> str:
-        return f"{Fore.MAGENTA}{text}{Style.RESET_ALL}"
\ No newline at end of file
+        return self.colour(Fore.MAGENTA, text)
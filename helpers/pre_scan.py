@@ -0,0 +1,68 @@
+import queue
+import threading
+from pathlib import Path
+
+from helpers.traversal import get_stat_or_none, walk_files
+
+
+class PreScan:
+    """Counts the files in the selected paths, and how many bytes they add up to, on a background thread, so that
+    processing can start straight away and the totals can be used to work out how much of the run is left.
+
+    The path and stat result of each file found are also passed on to processing (see get_files()) through a bounded
+    queue, so the tree is only walked, and each file statted, once; the scan can get up to MAX_QUEUED_FILES files ahead
+    of processing, after which the totals are the files found so far until processing catches up.
+    """
+    MAX_QUEUED_FILES = 100_000  # each takes a few hundred bytes (its path and stat result)
+
+    def __init__(self, paths, paths_to_skip=frozenset(), max_queued_files: int = MAX_QUEUED_FILES):
+        self.paths = paths
+        self.paths_to_skip = paths_to_skip  # e.g. files already processed by the run being resumed
+        self.files_found = 0
+        self.bytes_found = 0
+        self.files_to_process = queue.Queue(maxsize=max_queued_files)
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.scan, daemon=True)
+
+    def start(self) -> "PreScan":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def add_file(self, path: str, file_stat=None) -> None:
+        if path in self.paths_to_skip:
+            return
+        self.files_found += 1
+        self.bytes_found += file_stat.st_size if file_stat else 0
+        self.put((path, file_stat))
+
+    def put(self, file_to_process: tuple[str, object] | None) -> None:
+        while not self.stopped.is_set():  # rather than blocking forever if processing has stopped
+            try:
+                self.files_to_process.put(file_to_process, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get_files(self):
+        """Yields the path and stat result (or None if it couldn't be read) of each file found, in the same order as
+        HoldingVerificationCore.get_files() would, waiting for the scan to find them if it hasn't yet"""
+        while (file_to_process := self.files_to_process.get()) is not None:
+            yield file_to_process
+
+    def scan(self) -> None:
+        try:
+            for path in self.paths:
+                if not Path(path).is_dir():
+                    self.add_file(path, get_stat_or_none(path))
+                    continue
+                for (file_path, file_stat) in walk_files(str(Path(path))):  # the same path that processing uses
+                    if self.stopped.is_set():
+                        return
+                    self.add_file(file_path, file_stat)
+        finally:
+            self.finished.set()
+            self.put(None)  # so that get_files() knows there are no more, even if the scan failed
@@ -0,0 +1,190 @@
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from helpers.helper import ColourCliText
+
+
+@dataclass(frozen=True)
+class FileProgress:
+    """Sent by HoldingVerificationCore each time a file has been processed"""
+    path: str
+    file_size: int
+    checksum_found: bool
+
+
+class ProgressTracker:
+    """Keeps running totals of the files processed so far, to show how quickly a run is going.
+
+    If given a PreScan, it also works out how much of the run is complete, and how long is left, from the number of
+    bytes processed so far, as large files take much longer to hash than small ones.
+    """
+    def __init__(self, clock=time.monotonic, pre_scan=None):
+        self.clock = clock
+        self.start_time = clock()
+        self.pre_scan = pre_scan
+        self.files_processed = 0
+        self.bytes_processed = 0
+        self.files_matched = 0
+        self.current_file = ""
+
+    def update(self, file_progress: FileProgress) -> None:
+        self.files_processed += 1
+        self.bytes_processed += file_progress.file_size
+        self.files_matched += file_progress.checksum_found
+        self.current_file = file_progress.path
+
+    @property
+    def files_not_matched(self) -> int:
+        return self.files_processed - self.files_matched
+
+    @property
+    def seconds_elapsed(self) -> float:
+        return max(self.clock() - self.start_time, 1e-9)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files_processed / self.seconds_elapsed
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_processed / 1_000_000 / self.seconds_elapsed
+
+    @property
+    def total_bytes(self) -> int | None:
+        """The number of bytes to process (so far, if the pre-scan hasn't finished) or None if there's no pre-scan"""
+        if self.pre_scan is None:
+            return None
+        return max(self.pre_scan.bytes_found, self.bytes_processed)  # files can grow after they've been scanned
+
+    @property
+    def percent_complete(self) -> float | None:
+        total_bytes = self.total_bytes
+        if total_bytes is None:
+            return None
+        return 100.0 if total_bytes == 0 else self.bytes_processed / total_bytes * 100
+
+    @property
+    def seconds_remaining(self) -> float | None:
+        """None until there is a pre-scan that has finished and some bytes have been processed to estimate the speed"""
+        if self.pre_scan is None or not self.pre_scan.finished.is_set() or self.bytes_processed == 0:
+            return None
+        return (self.total_bytes - self.bytes_processed) / (self.bytes_processed / self.seconds_elapsed)
+
+    def describe(self) -> str:
+        description = f"{self.files_processed:,} files processed ({self.mb_per_second:,.1f} MB/sec)"
+        if self.pre_scan is None:
+            return description
+
+        scan_status = "" if self.pre_scan.finished.is_set() else " found so far"
+        description = (f"{self.files_processed:,} of {self.pre_scan.files_found:,} files{scan_status} processed; "
+                       f"{self.percent_complete:.1f}% of {self.total_bytes / 1_000_000:,.1f} MB "
+                       f"({self.mb_per_second:,.1f} MB/sec)")
+        seconds_remaining = self.seconds_remaining
+        if seconds_remaining is not None:
+            description += f", about {timedelta(seconds=round(seconds_remaining))} left"
+        return description
+
+
+PROGRESS_OUTPUTS = ("lines", "status", "silent")
+
+
+class LineProgressReporter:
+    """Prints a line for each file processed (the default); the slowest output when there are lots of small files"""
+    def __init__(self, colour_text=None):
+        self.colour_text = colour_text or ColourCliText()
+
+    def file_processed(self, file_progress: FileProgress, progress_tracker: ProgressTracker) -> None:
+        (yellow, green, light_red) = (self.colour_text.yellow, self.colour_text.green, self.colour_text.light_red)
+        checksum_found = file_progress.checksum_found
+        checksum_found_colour = green(checksum_found) if checksum_found else light_red(checksum_found)
+        print(f"{yellow("File ingested")} = {checksum_found_colour}: {file_progress.path}")
+
+    def totals(self, description: str) -> None:
+        print(f"\n{self.colour_text.bright_cyan(description)}\n")
+
+    def message(self, text: str) -> None:
+        print(text)
+
+    def finish(self) -> None:
+        pass
+
+
+class StatusLineProgressReporter(LineProgressReporter):
+    """Keeps the totals so far on a single line, rewritten at most `refreshes_per_second` times a second, rather than
+    writing a line for each file"""
+    def __init__(self, refreshes_per_second: float = 4, clock=time.monotonic, colour_text=None):
+        super().__init__(colour_text)
+        self.seconds_between_refreshes = 1 / refreshes_per_second
+        self.clock = clock
+        self.last_refresh_time = None
+        self.last_status_length = 0
+        self.progress_tracker = None
+
+    def show_status(self) -> None:
+        status = self.progress_tracker.describe()
+        # The previous status is overwritten, so any characters it had past the end of this one are blanked out
+        print(f"\r{status}{" " * (self.last_status_length - len(status))}", end="", flush=True)
+        self.last_status_length = len(status)
+        self.last_refresh_time = self.clock()
+
+    def file_processed(self, file_progress: FileProgress, progress_tracker: ProgressTracker) -> None:
+        self.progress_tracker = progress_tracker
+        if self.last_refresh_time is None or self.clock() - self.last_refresh_time >= self.seconds_between_refreshes:
+            self.show_status()
+
+    def totals(self, description: str) -> None:
+        pass  # the status line already has them
+
+    def message(self, text: str) -> None:
+        if self.last_status_length:
+            print()  # so that the message doesn't get mixed up with the status line
+            self.last_status_length = 0
+        print(text)
+
+    def finish(self) -> None:
+        if self.progress_tracker:
+            self.show_status()  # the final totals, which might not have been shown yet
+            print()
+        self.last_refresh_time = None
+        self.last_status_length = 0
+        self.progress_tracker = None
+
+
+class SilentProgressReporter:
+    """Doesn't print anything while files are processed; if given a log file name, the line for each file (without
+    colours) is added to it instead, which is much quicker than writing to a console"""
+    def __init__(self, log_file_name: str = ""):
+        self.log_file_name = log_file_name
+        self.log_file = None
+
+    def log(self, text: str) -> None:
+        if not self.log_file_name:
+            return
+        if self.log_file is None:
+            self.log_file = open(self.log_file_name, "a", encoding="utf-8")
+        self.log_file.write(f"{text}\n")
+
+    def file_processed(self, file_progress: FileProgress, progress_tracker: ProgressTracker) -> None:
+        self.log(f"File ingested = {file_progress.checksum_found}: {file_progress.path}")
+
+    def totals(self, description: str) -> None:
+        self.log(description)
+
+    def message(self, text: str) -> None:
+        self.log(text)
+
+    def finish(self) -> None:
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
+
+def get_progress_reporter(progress_output: str = "lines", refreshes_per_second: float = 4, log_file_name: str = ""):
+    if progress_output == "status":
+        return StatusLineProgressReporter(refreshes_per_second)
+    elif progress_output == "silent":
+        return SilentProgressReporter(log_file_name)
+    elif progress_output == "lines":
+        return LineProgressReporter()
+    raise ValueError(f"Unknown progress output: {progress_output}; use one of {", ".join(PROGRESS_OUTPUTS)}")
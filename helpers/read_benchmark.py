@@ -0,0 +1,103 @@
+import stat
+import time
+from dataclasses import dataclass
+from itertools import product
+
+from holding_verification_core import HASH_FUNCTIONS, HoldingVerificationCore, ReadSettings, generate_checksums_for_file
+
+BUFFER_SIZES = (65_536, 262_144, 1_000_000, 4_000_000, 16_000_000)
+ALL_ALGORITHMS = "all"  # every algorithm, from a single read of each file, as the app hashes files
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    read_settings: ReadSettings
+    algorithm: str
+    bytes_hashed: int
+    seconds: float
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_hashed / 1_000_000 / max(self.seconds, 1e-9)
+
+
+def get_sample(paths, max_bytes: int, max_files: int) -> list[tuple[str, int]]:
+    """Returns the path and size of the files in the paths, in the order they'd be processed, up to whichever limit
+    is reached first"""
+    sample = []
+    sample_bytes = 0
+    for (file_path, file_stat) in HoldingVerificationCore.get_files(paths, True):
+        if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+            continue
+        sample.append((file_path, file_stat.st_size))
+        sample_bytes += file_stat.st_size
+        if sample_bytes >= max_bytes or len(sample) >= max_files:
+            break
+    return sample
+
+
+def time_hashing(sample: list[tuple[str, int]], read_settings: ReadSettings, algorithm: str) -> BenchmarkResult:
+    hash_names = tuple(HASH_FUNCTIONS) if algorithm == ALL_ALGORITHMS else (algorithm,)
+    bytes_hashed = 0
+    start_time = time.perf_counter()
+    for (file_path, file_size) in sample:
+        (_, errors) = generate_checksums_for_file(file_path, hash_names, read_settings.buffer_size,
+                                                  read_settings.read_strategy)
+        bytes_hashed += 0 if errors else file_size
+    return BenchmarkResult(read_settings, algorithm, bytes_hashed, time.perf_counter() - start_time)
+
+
+def run_benchmark(sample: list[tuple[str, int]], buffer_sizes, read_strategies, algorithms, repeats: int = 1,
+                  print_func=print) -> list[BenchmarkResult]:
+    """Hashes the sample once with each combination of settings and algorithm, keeping the fastest of `repeats`
+    attempts. The sample is read once beforehand so that the first combination isn't the only one reading from the
+    drive rather than the OS's file cache (unless the sample is too big to be cached)."""
+    time_hashing(sample, ReadSettings(max(buffer_sizes), "read"), next(iter(HASH_FUNCTIONS)))
+
+    fastest_results: dict[tuple[ReadSettings, str], BenchmarkResult] = {}
+    for _ in range(repeats):
+        for (buffer_size, read_strategy, algorithm) in product(buffer_sizes, read_strategies, algorithms):
+            result = time_hashing(sample, ReadSettings(buffer_size, read_strategy), algorithm)
+            key = (result.read_settings, algorithm)
+            if key not in fastest_results or result.seconds < fastest_results[key].seconds:
+                fastest_results[key] = result
+
+    for result in fastest_results.values():
+        print_func(f"{result.algorithm:>6}  {result.read_settings.read_strategy:>8}  "
+                   f"{result.read_settings.buffer_size:>12,} bytes  {result.mb_per_second:>10,.1f} MB/sec")
+    return list(fastest_results.values())
+
+
+def get_best_read_settings(results: list[BenchmarkResult]) -> ReadSettings:
+    """The settings are picked by how quickly every algorithm was calculated, if timed, as that's what the app does"""
+    results_to_compare = [result for result in results if result.algorithm == ALL_ALGORITHMS] or results
+    return max(results_to_compare, key=lambda result: result.mb_per_second).read_settings
+
+
+def update_config_file(config_file_name: str, section_name: str, values: dict[str, str]) -> None:
+    """Sets the values in a section of the config file (adding the section if it's missing), keeping the file's
+    comments and layout, which configparser doesn't"""
+    with open(config_file_name, "r", encoding="utf-8") as config_file:
+        lines = config_file.read().splitlines()
+
+    header_indexes = [index for (index, line) in enumerate(lines) if line.strip().startswith("[")]
+    section_start = next((index for index in header_indexes if lines[index].strip() == f"[{section_name}]"), None)
+    if section_start is None:
+        lines += ["", f"[{section_name}]", *(f"{key}={value}" for (key, value) in values.items())]
+    else:
+        section_end = next((index for index in header_indexes if index > section_start), len(lines))
+        values_to_add = dict(values)
+        last_value_index = section_start
+        for index in range(section_start + 1, section_end):
+            line = lines[index].strip()
+            if not line or line.startswith(("#", ";")) or "=" not in line:
+                continue
+            last_value_index = index
+            key = line.split("=", 1)[0].strip()
+            matching_key = next((new_key for new_key in values_to_add if new_key.upper() == key.upper()), None)
+            if matching_key:
+                lines[index] = f"{key}={values_to_add.pop(matching_key)}"
+        lines[last_value_index + 1:last_value_index + 1] = [f"{key}={value}" for (key, value) in values_to_add.items()]
+
+    with open(config_file_name, "w", encoding="utf-8") as config_file:
+        config_file.write("\n".join(lines) + "\n")
@@ -0,0 +1,110 @@
+"""Where the result row of each file processed is written.
+
+Rows are buffered and written out together, every `flush_every_rows` rows or `flush_every_seconds` seconds, whichever
+comes first, and each time they're written, they're synced to the disk, so that a week-long run loses at most the last
+few rows if the machine loses power.
+"""
+import abc
+import csv
+import json
+import os
+import time
+
+
+class ResultSink(abc.ABC):
+    """Collects result rows; they're all written once flush() or close() has been called"""
+    def __init__(self, flush_every_rows: int = 1_000, flush_every_seconds: float = 30.0, clock=time.monotonic):
+        self.flush_every_rows = max(flush_every_rows, 1)
+        self.flush_every_seconds = flush_every_seconds
+        self.clock = clock
+        self.pending_rows = []
+        self.last_flush_time = clock()
+        self.durable_rows = 0  # the number of rows (not counting any header) that are safely on the disk
+        self.last_durable_row = None
+
+    def writerow(self, row) -> None:
+        self.pending_rows.append(row)
+        if (len(self.pending_rows) >= self.flush_every_rows
+                or self.clock() - self.last_flush_time >= self.flush_every_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending_rows:
+            self.write_rows(self.pending_rows)
+            self.durable_rows += len(self.pending_rows)
+            self.last_durable_row = self.pending_rows[-1]
+            self.pending_rows = []
+        self.last_flush_time = self.clock()
+
+    @abc.abstractmethod
+    def write_rows(self, rows) -> None:
+        """Writes the rows and syncs them to the disk"""
+
+    def close(self, keep_checkpoint: bool = False) -> None:
+        self.flush()
+
+
+def get_checkpoint_name(csv_name: str) -> str:
+    return f"{csv_name}.checkpoint"
+
+
+def read_checkpoint(csv_name: str) -> dict | None:
+    try:
+        with open(get_checkpoint_name(csv_name), "r", encoding="utf-8") as checkpoint_file:
+            return json.load(checkpoint_file)
+    except (OSError, ValueError):
+        return None  # without a checkpoint, only a row that was part-way through being written can be removed
+
+
+class CsvResultSink(ResultSink):
+    """Writes the rows to a CSV file. Each time the rows are synced to the disk, the size of the CSV up to the last
+    durable row is recorded in a '.checkpoint' file alongside it, so that a resumed run can remove anything after it
+    (which might not have been written in full)."""
+    def __init__(self, csv_file, header=None, flush_every_rows: int = 1_000, flush_every_seconds: float = 30.0,
+                 clock=time.monotonic):
+        super().__init__(flush_every_rows, flush_every_seconds, clock)
+        self.csv_file = csv_file
+        self.name = csv_file.name
+        self.csv_writer = csv.writer(csv_file)
+        if header and csv_file.tell() == 0:
+            self.csv_writer.writerow(header)
+            csv_file.flush()
+
+    def write_rows(self, rows) -> None:
+        self.csv_writer.writerows(rows)
+        self.csv_file.flush()
+        os.fsync(self.csv_file.fileno())
+        self.write_checkpoint(rows[-1])
+
+    def write_checkpoint(self, last_durable_row) -> None:
+        checkpoint_name = get_checkpoint_name(self.name)
+        temp_checkpoint_name = f"{checkpoint_name}.tmp"
+        with open(temp_checkpoint_name, "w", encoding="utf-8") as checkpoint_file:
+            json.dump({"durable_bytes": self.csv_file.tell(), "last_durable_path": last_durable_row[0]},
+                      checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_checkpoint_name, checkpoint_name)  # so there's always a complete checkpoint
+
+    def close(self, keep_checkpoint: bool = False) -> None:
+        """Writes any rows left and closes the CSV; the checkpoint is only kept if the run might be resumed"""
+        super().close()
+        self.csv_file.close()
+        if not keep_checkpoint and os.path.exists(get_checkpoint_name(self.name)):
+            os.remove(get_checkpoint_name(self.name))
+
+
+class MultiResultSink(ResultSink):
+    """Writes the rows to several sinks (e.g. a CSV and the results DB) at the same time"""
+    def __init__(self, sinks, flush_every_rows: int = 1_000, flush_every_seconds: float = 30.0, clock=time.monotonic):
+        super().__init__(flush_every_rows, flush_every_seconds, clock)
+        self.sinks = sinks
+
+    def write_rows(self, rows) -> None:
+        for sink in self.sinks:
+            sink.write_rows(rows)
+
+    def close(self, keep_checkpoint: bool = False) -> None:
+        super().close()
+        for sink in self.sinks:
+            sink.close(keep_checkpoint)
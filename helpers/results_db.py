@@ -0,0 +1,120 @@
+"""An optional SQLite DB that the results of every run are added to, so that the results of many runs can be queried
+together (e.g. "which files, across the last 40 drives scanned, are still not held?") rather than opening lots of large
+CSVs.
+
+Each run has a row in the 'runs' table and each file processed has a row in the 'file_results' table, with the same
+columns as the CSV.
+"""
+import csv
+import json
+import sqlite3
+import time
+
+from helpers.result_sinks import ResultSink
+
+FILE_RESULT_COLUMNS = ("path", "file_size", "in_dri", "sha256", "matching_file_refs", "matching_algorithm_name",
+                       "matching_algorithm_hash", "fast_reject", "duplicate_of")
+
+
+class ResultsDb:
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name, timeout=60, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, roots TEXT, "
+                                    "output_csv_name TEXT, started TEXT, finished TEXT, seconds_taken REAL, "
+                                    "files_processed INTEGER, files_in_dri INTEGER, files_not_in_dri INTEGER, "
+                                    "duplicate_files INTEGER, cancelled INTEGER);")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS file_results (run_id INTEGER NOT NULL, path TEXT, "
+                                    "file_size INTEGER, in_dri INTEGER, sha256 TEXT, matching_file_refs TEXT, "
+                                    "matching_algorithm_name TEXT, matching_algorithm_hash TEXT, fast_reject TEXT, "
+                                    "duplicate_of TEXT);")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS index_file_results_sha256 ON file_results (sha256);")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS index_file_results_in_dri "
+                                    "ON file_results (in_dri, run_id);")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS index_file_results_path "
+                                    "ON file_results (path, run_id);")
+        self.start_times: dict[int, float] = {}
+
+    def start_run(self, roots, output_csv_name: str = "") -> int:
+        with self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (roots, output_csv_name, started) VALUES (?, ?, datetime('now'));",
+                (json.dumps(list(roots)), output_csv_name)
+            ).lastrowid
+        self.start_times[run_id] = time.monotonic()
+        return run_id
+
+    def end_run(self, run_id: int, summary) -> None:
+        seconds_taken = time.monotonic() - self.start_times.pop(run_id, time.monotonic())
+        with self.connection:
+            self.connection.execute(
+                "UPDATE runs SET output_csv_name = ?, finished = datetime('now'), seconds_taken = ?, "
+                "files_processed = ?, files_in_dri = ?, files_not_in_dri = ?, duplicate_files = ?, cancelled = ? "
+                "WHERE run_id = ?;",
+                (summary.output_csv_name, seconds_taken, summary.files_processed, summary.tally.get(True, 0),
+                 summary.tally.get(False, 0), summary.duplicate_files, summary.cancelled, run_id)
+            )
+
+    def add_file_results(self, run_id: int, rows) -> None:
+        placeholders = ", ".join("?" * (len(FILE_RESULT_COLUMNS) + 1))
+        with self.connection:  # each batch of rows is added in one transaction
+            self.connection.executemany(
+                f"INSERT INTO file_results (run_id, {", ".join(FILE_RESULT_COLUMNS)}) VALUES ({placeholders});",
+                ((run_id, *row) for row in rows)
+            )
+
+    def get_runs(self, last_runs: int | None = None):
+        return self.connection.execute(
+            "SELECT run_id, roots, started, seconds_taken, files_processed, files_in_dri, files_not_in_dri, "
+            "cancelled FROM runs ORDER BY run_id DESC LIMIT ?;", (last_runs or -1,)
+        ).fetchall()
+
+    def query_file_results(self, run_ids=None, last_runs: int | None = None, in_dri: bool | None = None,
+                           latest_only: bool = True):
+        """Yields the file results of the runs given (or the last `last_runs` runs, or every run). If `latest_only`,
+        only the result from the latest of these runs is given for each path, e.g. so that a file that wasn't held
+        when one drive was scanned, but was by the time it was scanned again, isn't counted as not held."""
+        if run_ids is None:
+            run_ids = [run_id for (run_id, *_) in self.get_runs(last_runs)]
+        run_ids_table = "(SELECT value AS run_id FROM json_each(?))"
+        conditions = [f"run_id IN {run_ids_table}"]
+        parameters = [json.dumps(list(run_ids))]
+        if latest_only:
+            conditions.append(f"run_id = (SELECT MAX(latest.run_id) FROM file_results AS latest "
+                              f"WHERE latest.path = file_results.path AND latest.run_id IN {run_ids_table})")
+            parameters.append(json.dumps(list(run_ids)))
+        if in_dri is not None:
+            conditions.append("in_dri = ?")
+            parameters.append(in_dri)
+
+        cursor = self.connection.execute(
+            f"SELECT run_id, {", ".join(FILE_RESULT_COLUMNS)} FROM file_results WHERE {" AND ".join(conditions)} "
+            "ORDER BY run_id, rowid;", parameters
+        )
+        yield from cursor  # the rows are read as they're needed, so any number of them can be exported
+
+    def export_file_results(self, csv_name: str, csv_header, **query_args) -> int:
+        rows_exported = 0
+        with open(csv_name, "w", newline="", encoding="utf-8") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(("Run ID", *csv_header))
+            for (run_id, path, file_size, in_dri, *other_values) in self.query_file_results(**query_args):
+                csv_writer.writerow((run_id, path, file_size, bool(in_dri), *other_values))
+                rows_exported += 1
+        return rows_exported
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SqliteResultSink(ResultSink):
+    """Adds the rows of a run to the results DB, in one transaction per batch of rows"""
+    def __init__(self, results_db: ResultsDb, run_id: int, flush_every_rows: int = 1_000,
+                 flush_every_seconds: float = 30.0, clock=time.monotonic):
+        super().__init__(flush_every_rows, flush_every_seconds, clock)
+        self.results_db = results_db
+        self.run_id = run_id
+
+    def write_rows(self, rows) -> None:
+        self.results_db.add_file_results(self.run_id, rows)
@@ -0,0 +1,40 @@
+import os
+
+
+def get_stat_or_none(path_or_entry: str | os.DirEntry) -> os.stat_result | None:
+    try:
+        return path_or_entry.stat() if isinstance(path_or_entry, os.DirEntry) else os.stat(path_or_entry)
+    except OSError:
+        return None  # HoldingVerificationCore.run() tries again and, if it still fails, records the error in its row
+
+
+def is_dir_entry_a_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def walk_files(top_dir: str):
+    """Yields the path and stat result of every file in the folder and its sub-folders, in the same order as
+    Path.walk().
+
+    The stat result comes from the DirEntry, which is cached, so each file's metadata is only read once; on Windows it
+    comes back with the folder's listing, so costs nothing extra (but its st_ino is always 0).
+    """
+    dirs_to_walk = [top_dir]
+    while dirs_to_walk:
+        dir_path = dirs_to_walk.pop()
+        try:
+            with os.scandir(dir_path) as entries:
+                entries = list(entries)
+        except OSError:  # like Path.walk(), folders that can't be read are skipped
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            if is_dir_entry_a_dir(entry):
+                sub_dirs.append(entry.path)
+            else:
+                yield entry.path, get_stat_or_none(entry)
+        dirs_to_walk.extend(reversed(sub_dirs))
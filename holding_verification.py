@@ -1,11 +1,23 @@
+import argparse
 import configparser
+import dataclasses
+import json
+import multiprocessing
 import os
 import sqlite3
 from pathlib import Path
 
 from holding_verification_ui import HoldingVerificationUi
-from holding_verification_core import HoldingVerificationCore, check_db_exists
+from holding_verification_core import (HASH_FUNCTIONS, READ_STRATEGIES, HoldingVerificationCore, ReadSettings,
+                                       RunSettings, check_db_exists)
+from helpers.columnar_sink import COLUMNAR_FORMATS, is_columnar_output_available
+from helpers.hash_cache import HashCache
+from helpers.progress import PROGRESS_OUTPUTS, get_progress_reporter
+from helpers.results_db import ResultsDb
+from helpers.read_benchmark import (ALL_ALGORITHMS, BUFFER_SIZES, get_best_read_settings, get_sample, run_benchmark,
+                                    update_config_file)
 from sys import platform
+import sys
 
 from helpers.helper import ColourCliText
 
@@ -14,27 +26,331 @@ yellow = colour_text.yellow
 light_red = colour_text.light_red
 green = colour_text.green
 bright_cyan = colour_text.bright_cyan
+red = colour_text.red
 
-def main():
+# Exit codes for when the app is run headless (with paths given as arguments)
+# (1 is left for Python's own code for an uncaught exception, so that it can't be mistaken for one of these)
+EXIT_SUCCESS = 0
+EXIT_INVALID_ARGUMENTS = 2  # the same code that argparse uses
+EXIT_DB_MISSING = 3
+EXIT_FILE_ERRORS = 4  # processing completed but some files couldn't be hashed
+EXIT_RUN_FAILED = 5  # processing stopped part of the way through, e.g. the output folder couldn't be written to
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Find out whether files on a drive have already been ingested. If any paths are given, they are "
+                    "processed without any prompts (e.g. for running from a scheduler); otherwise the app asks which "
+                    "file(s)/folder to process. To find the fastest read settings for a drive, run "
+                    "'holding_verification.py benchmark --help'; to export results from the results DB, run "
+                    "'holding_verification.py query --help'."
+    )
+    parser.add_argument("paths", nargs="*", help="files and/or folders to look up, without prompting")
+    parser.add_argument("--db", help="path to the checksum DB (overrides CHECKSUM_DB_NAME in config.ini)")
+    parser.add_argument("--table", help="name of the checksum table (overrides CHECKSUM_TABLE_NAME in config.ini)")
+    parser.add_argument("--output-dir", default="", help="folder to write the CSV results to (default: current folder)")
+    parser.add_argument("--prefix", help="title to prepend to the CSV result's file name, instead of prompting for it")
+    parser.add_argument("--workers", type=int,
+                        help="number of files to hash in parallel (overrides HASHING_WORKERS in config.ini)")
+    parser.add_argument("--hashing-pool", choices=("thread", "process"),
+                        help="hash files using a pool of threads or processes (overrides HASHING_POOL in config.ini)")
+    parser.add_argument("--in-memory-index", action=argparse.BooleanOptionalAction,
+                        help="load every checksum in the DB into memory at startup so that most lookups don't need to "
+                             "query the DB (overrides IN_MEMORY_CHECKSUM_INDEX in config.ini)")
+    parser.add_argument("--bloom-filter", action=argparse.BooleanOptionalAction,
+                        help="skip querying the DB for checksums that the Bloom filter file says are definitely not "
+                             "in it (overrides USE_BLOOM_FILTER in config.ini)")
+    parser.add_argument("--pre-scan", action=argparse.BooleanOptionalAction,
+                        help="count the files and bytes to process, alongside the processing, so that the percentage "
+                             "complete and time left can be shown (overrides PRE_SCAN in config.ini)")
+    parser.add_argument("--size-prefilter", action=argparse.BooleanOptionalAction,
+                        help="don't hash files of a size that no file in the DB has, if the DB has file sizes "
+                             "(overrides USE_SIZE_PREFILTER in config.ini)")
+    parser.add_argument("--sha256-for-fast-rejects", action=argparse.BooleanOptionalAction,
+                        help="still calculate the SHA256 of files that can't be in the DB, for the CSV (overrides "
+                             "SHA256_FOR_FAST_REJECTS in config.ini)")
+    parser.add_argument("--fingerprint-prefilter", action=argparse.BooleanOptionalAction,
+                        help="don't fully hash large files whose fingerprint no file in the DB has, if the DB has "
+                             "fingerprints (overrides USE_FINGERPRINT_PREFILTER in config.ini)")
+    parser.add_argument("--duplicates", action=argparse.BooleanOptionalAction,
+                        help="only look up the checksums of a file once if there are copies of it in the folders, and "
+                             "note which file each copy is a duplicate of (overrides DETECT_DUPLICATES in config.ini)")
+    parser.add_argument("--read-strategy", choices=READ_STRATEGIES,
+                        help="how files are read to hash them (overrides READ_STRATEGY in config.ini)")
+    parser.add_argument("--buffer-size", type=int,
+                        help="number of bytes to read from a file at a time (overrides READ_BUFFER_SIZE in config.ini)")
+    parser.add_argument("--progress", choices=PROGRESS_OUTPUTS,
+                        help="'lines' prints a line for each file, 'status' keeps the totals on a single line and "
+                             "'silent' prints nothing until the end, which is quickest for lots of small files "
+                             "(overrides PROGRESS_OUTPUT in config.ini)")
+    parser.add_argument("--log-file", metavar="FILE",
+                        help="with '--progress silent', the file to add the line for each file to (overrides "
+                             "PROGRESS_LOG_FILE_NAME in config.ini)")
+    parser.add_argument("--results-db", metavar="FILE",
+                        help="also add the results to this SQLite DB, which keeps the results of every run (overrides "
+                             "RESULTS_DB_NAME in config.ini)")
+    parser.add_argument("--csv", action=argparse.BooleanOptionalAction,
+                        help="write the results to a CSV; '--no-csv' only adds them to the results DB (overrides "
+                             "WRITE_CSV in config.ini)")
+    parser.add_argument("--columnar-format", choices=(*COLUMNAR_FORMATS, "none"),
+                        help="also write the results to a Parquet or Arrow file, which needs pyarrow (overrides "
+                             "COLUMNAR_OUTPUT_FORMAT in config.ini)")
+    parser.add_argument("--resume", metavar="CSV", default="",
+                        help="carry on from where a run that didn't complete left off, skipping the files already in "
+                             "its '_IN_PROGRESS' CSV and adding the rest of the results to it")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="hash every file, rather than reusing the checksums of files that haven't changed since "
+                             "they were last hashed (overrides USE_HASH_CACHE in config.ini)")
+    parsed_args = parser.parse_args(args)
+    if parsed_args.resume and not Path(parsed_args.resume).is_file():
+        parser.error(f"the CSV '{parsed_args.resume}' does not exist")
+    missing_paths = [path for path in parsed_args.paths if not Path(path).exists()]
+    if missing_paths:
+        parser.error(f"these paths do not exist: {", ".join(missing_paths)}")
+    if parsed_args.output_dir and not Path(parsed_args.output_dir).is_dir():
+        parser.error(f"the output folder '{parsed_args.output_dir}' does not exist")
+
+    # Made absolute as the current directory might be changed before they're used
+    parsed_args.paths = [os.path.abspath(path) for path in parsed_args.paths]
+    for path_arg in ("db", "output_dir", "resume", "results_db"):
+        if getattr(parsed_args, path_arg):
+            setattr(parsed_args, path_arg, os.path.abspath(getattr(parsed_args, path_arg)))
+    return parsed_args
+
+
+def parse_benchmark_args(args):
+    parser = argparse.ArgumentParser(
+        prog="holding_verification.py benchmark",
+        description="Time how quickly a sample of the files on a drive can be hashed with different buffer sizes, read "
+                    "strategies and algorithms, and save the fastest settings to config.ini."
+    )
+    parser.add_argument("paths", nargs="+", help="files and/or folders on the drive to take the sample from")
+    parser.add_argument("--sample-mb", type=int, default=500, help="size of the sample, in MB (default: 500)")
+    parser.add_argument("--max-files", type=int, default=1_000, help="most files in the sample (default: 1,000)")
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=BUFFER_SIZES, metavar="BYTES")
+    parser.add_argument("--read-strategies", nargs="+", choices=READ_STRATEGIES, default=READ_STRATEGIES)
+    parser.add_argument("--algorithms", nargs="+", choices=(*HASH_FUNCTIONS, ALL_ALGORITHMS),
+                        default=(*HASH_FUNCTIONS, ALL_ALGORITHMS),
+                        help=f"'{ALL_ALGORITHMS}' calculates every checksum from one read, as the app does")
+    parser.add_argument("--repeats", type=int, default=1, help="the fastest of this many attempts is used")
+    parser.add_argument("--for-path", metavar="PATH",
+                        help="save the settings for this drive/folder only (in a READ_SETTINGS section), rather than "
+                             "as the defaults")
+    parser.add_argument("--write-config", action=argparse.BooleanOptionalAction, default=True,
+                        help="save the fastest settings to config.ini (default: true)")
+    parsed_args = parser.parse_args(args)
+    missing_paths = [path for path in parsed_args.paths if not Path(path).exists()]
+    if missing_paths:
+        parser.error(f"these paths do not exist: {", ".join(missing_paths)}")
+
+    # Made absolute as the current directory might be changed before they're used
+    parsed_args.paths = [os.path.abspath(path) for path in parsed_args.paths]
+    if parsed_args.for_path:
+        parsed_args.for_path = os.path.abspath(parsed_args.for_path)
+    return parsed_args
+
+
+def run_benchmark_command(args) -> int:
+    sample = get_sample(args.paths, args.sample_mb * 1_000_000, args.max_files)
+    if not sample:
+        print(red("No files were found to hash."))
+        return EXIT_INVALID_ARGUMENTS
+
+    sample_bytes = sum(file_size for (_, file_size) in sample)
+    print(f"Hashing a sample of {len(sample):,} files ({sample_bytes:,} bytes) with each combination of settings...\n")
+    results = run_benchmark(sample, args.buffer_sizes, args.read_strategies, args.algorithms, args.repeats)
+    best_read_settings = get_best_read_settings(results)
+    print(f"\n{green("Fastest settings")}: READ_STRATEGY={best_read_settings.read_strategy}, "
+          f"READ_BUFFER_SIZE={best_read_settings.buffer_size}")
+
+    if args.write_config:
+        values = {"READ_STRATEGY": best_read_settings.read_strategy,
+                  "READ_BUFFER_SIZE": str(best_read_settings.buffer_size)}
+        section_name = f"READ_SETTINGS {args.for_path}" if args.for_path else "DEFAULT"
+        if args.for_path:
+            values = {"PATH": args.for_path, **values}
+        update_config_file("config.ini", section_name, values)
+        print(f"Saved to the [{section_name}] section of 'config.ini'.")
+    return EXIT_SUCCESS
+
+
+def parse_query_args(args):
+    parser = argparse.ArgumentParser(
+        prog="holding_verification.py query",
+        description="Export the results of earlier runs from the results DB to a CSV, e.g. the files that are still "
+                    "not held, across the last 40 runs: 'holding_verification.py query --last-runs 40 --status "
+                    "not-held --output not_held.csv'."
+    )
+    parser.add_argument("--results-db", metavar="FILE", help="overrides RESULTS_DB_NAME in config.ini")
+    runs = parser.add_mutually_exclusive_group()
+    runs.add_argument("--runs", type=int, nargs="+", metavar="RUN_ID", help="only these runs (default: every run)")
+    runs.add_argument("--last-runs", type=int, metavar="N", help="only the last N runs")
+    parser.add_argument("--status", choices=("held", "not-held", "all"), default="all",
+                        help="only the files that are (or aren't) in Preservica/DRI (default: all)")
+    parser.add_argument("--all-results", action="store_true",
+                        help="export every result of each file, rather than only its result from the latest run")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--output", metavar="CSV", help="the CSV to export the results to")
+    action.add_argument("--list-runs", action="store_true", help="list the runs in the results DB instead")
+    parsed_args = parser.parse_args(args)
+    if parsed_args.results_db:
+        parsed_args.results_db = os.path.abspath(parsed_args.results_db)
+    if parsed_args.output:
+        parsed_args.output = os.path.abspath(parsed_args.output)
+    return parsed_args
+
+
+def run_query_command(args, default_results_db_name: str) -> int:
+    results_db_name = args.results_db or default_results_db_name
+    if not results_db_name or not Path(results_db_name).exists():
+        print(red(f"The results DB '{results_db_name}' does not exist; set RESULTS_DB_NAME in config.ini or use "
+                  f"'--results-db'."))
+        return EXIT_DB_MISSING
+
+    results_db = ResultsDb(results_db_name)
+    if args.list_runs:
+        for (run_id, roots, started, seconds_taken, files_processed, files_in_dri, files_not_in_dri,
+             cancelled) in results_db.get_runs(args.last_runs):
+            status = red(" (cancelled)") if cancelled else ""
+            print(f"{bright_cyan(run_id)}: {started}, {", ".join(json.loads(roots))}: {files_processed or 0:,} files, "
+                  f"{files_in_dri or 0:,} in Preservica/DRI, {files_not_in_dri or 0:,} not{status}")
+    else:
+        in_dri = {"held": True, "not-held": False, "all": None}[args.status]
+        rows_exported = results_db.export_file_results(args.output, HoldingVerificationCore.CSV_HEADER,
+                                                       run_ids=args.runs, last_runs=args.last_runs, in_dri=in_dri,
+                                                       latest_only=not args.all_results)
+        print(f"{green(f"{rows_exported:,}")} results exported to '{yellow(args.output)}'.")
+    results_db.close()
+    return EXIT_SUCCESS
+
+
+def get_read_settings_by_path(config: configparser.ConfigParser) -> dict[str, ReadSettings]:
+    """Sections whose names start with 'READ_SETTINGS' give the settings to use for the drive/folder in their PATH;
+    any settings they don't have are taken from the DEFAULT section"""
+    return {
+        section["PATH"]: ReadSettings(section.getint("READ_BUFFER_SIZE"), section["READ_STRATEGY"])
+        for (section_name, section) in config.items() if section_name.upper().startswith("READ_SETTINGS")
+    }
+
+
+def get_option(arg_value, default_config: configparser.SectionProxy, key: str, default: bool) -> bool:
+    """An on/off option given on the command line overrides the one in the "config.ini" file"""
+    return arg_value if arg_value is not None else default_config.getboolean(key, default)
+
+
+def get_run_settings(args, config: configparser.ConfigParser, db_file_name: str) -> RunSettings:
+    """The settings for every run, from the "config.ini" file, overridden by any command line arguments (apart from
+    the prefix of the CSV's name, which might still need to be asked for)"""
+    default_config = config["DEFAULT"]
+    use_bloom_filter = get_option(args.bloom_filter, default_config, "USE_BLOOM_FILTER", False)
+    columnar_format = args.columnar_format or default_config.get("COLUMNAR_OUTPUT_FORMAT", "")
+    return RunSettings(
+        output_dir=args.output_dir,
+        hashing_workers=args.workers or default_config.getint("HASHING_WORKERS", 1),
+        hashing_pool=args.hashing_pool or default_config.get("HASHING_POOL", "thread"),
+        read_settings=ReadSettings(args.buffer_size or default_config.getint("READ_BUFFER_SIZE", 1_000_000),
+                                   args.read_strategy or default_config.get("READ_STRATEGY", "read")),
+        read_settings_by_path=get_read_settings_by_path(config),
+        use_in_memory_index=get_option(args.in_memory_index, default_config, "IN_MEMORY_CHECKSUM_INDEX", False),
+        # Unless CHECKSUM_BLOOM_FILTER_NAME is a full path, the filter is kept next to the checksum DB
+        bloom_filter_file_name=os.path.join(os.path.dirname(db_file_name),
+                                            default_config["CHECKSUM_BLOOM_FILTER_NAME"]) if use_bloom_filter else "",
+        use_pre_scan=get_option(args.pre_scan, default_config, "PRE_SCAN", False),
+        use_size_prefilter=get_option(args.size_prefilter, default_config, "USE_SIZE_PREFILTER", True),
+        sha256_for_fast_rejects=get_option(args.sha256_for_fast_rejects, default_config, "SHA256_FOR_FAST_REJECTS",
+                                           False),
+        use_fingerprint_prefilter=get_option(args.fingerprint_prefilter, default_config, "USE_FINGERPRINT_PREFILTER",
+                                             True),
+        fingerprint_files_over_size=default_config.getint("FINGERPRINT_FILES_OVER_SIZE", 1_000_000_000),
+        fingerprint_sample_size=default_config.getint("FINGERPRINT_SAMPLE_SIZE", 65_536),
+        detect_duplicates=get_option(args.duplicates, default_config, "DETECT_DUPLICATES", False),
+        results_flush_every_rows=default_config.getint("RESULTS_FLUSH_EVERY_ROWS", 1_000),
+        results_flush_every_seconds=default_config.getfloat("RESULTS_FLUSH_EVERY_SECONDS", 30.0),
+        write_csv=get_option(args.csv, default_config, "WRITE_CSV", True),
+        columnar_format="" if columnar_format == "none" else columnar_format,
+        columnar_row_group_rows=default_config.getint("COLUMNAR_ROW_GROUP_ROWS", 100_000)
+    )
+
+
+def run_headless(ui: HoldingVerificationUi, paths: list[str]) -> int:
+    selected_items = {"are_directories": any(Path(path).is_dir() for path in paths)}
+    try:
+        result_summary = ui.run_verification(tuple(paths), selected_items)
+    except Exception as error:
+        print(red(f"The run failed: {error!r}. The results so far have been kept; use '--resume' with the "
+                  "'_IN_PROGRESS' CSV to carry on."))
+        return EXIT_RUN_FAILED
+    return EXIT_FILE_ERRORS if result_summary.all_file_errors else EXIT_SUCCESS
+
+
+def change_to_app_dir() -> None:
     # On Macs, the exe runs the script in the '_internal' dir so this changes it to the location of the executable
     if platform == "darwin":
         file_loc = Path(__file__) # this file's location
         os.chdir(file_loc.parent.parent if file_loc.parent.name.endswith("_internal") else file_loc.parent)
 
+
+def main() -> int:
+    if sys.argv[1:2] == ["benchmark"]:
+        benchmark_args = parse_benchmark_args(sys.argv[2:])
+        change_to_app_dir()
+        return run_benchmark_command(benchmark_args)
+    if sys.argv[1:2] == ["query"]:
+        query_args = parse_query_args(sys.argv[2:])
+        change_to_app_dir()
+        config = configparser.ConfigParser()
+        config.read("config.ini")
+        return run_query_command(query_args, config["DEFAULT"].get("RESULTS_DB_NAME", ""))
+
+    args = parse_args()
+    headless = len(args.paths) > 0
+    change_to_app_dir()
+
     config = configparser.ConfigParser()
     config.read("config.ini")
     default_config = config["DEFAULT"]
-    db_file_name = default_config["CHECKSUM_DB_NAME"]
+    db_file_name = args.db or default_config["CHECKSUM_DB_NAME"]
+    if headless and not Path(db_file_name).exists():
+        print(red(f"'{db_file_name}' does not exist."))
+        return EXIT_DB_MISSING
     check_db_exists(db_file_name)
-    table_name = default_config["CHECKSUM_TABLE_NAME"]
+    table_name = args.table or default_config["CHECKSUM_TABLE_NAME"]
+    settings = get_run_settings(args, config, db_file_name)
+    progress_reporter = get_progress_reporter(
+        args.progress or default_config.get("PROGRESS_OUTPUT", "lines"),
+        default_config.getfloat("PROGRESS_REFRESHES_PER_SECOND", 4),
+        args.log_file if args.log_file is not None else default_config.get("PROGRESS_LOG_FILE_NAME", "")
+    )
+    use_hash_cache = default_config.getboolean("USE_HASH_CACHE", True) and not args.no_cache
+    # Unless HASH_CACHE_NAME is a full path, the cache is kept next to the checksum DB (the same folder as --db)
+    hash_cache_name = os.path.join(os.path.dirname(db_file_name), default_config["HASH_CACHE_NAME"])
+    hash_cache = HashCache(hash_cache_name, default_config.getint("HASH_CACHE_MAX_ENTRIES")) if use_hash_cache else None
 
-    db_function = sqlite3.connect(db_file_name)
+    results_db_name = args.results_db if args.results_db is not None else default_config.get("RESULTS_DB_NAME", "")
+    results_db = ResultsDb(results_db_name) if results_db_name else None
+    if settings.columnar_format and not is_columnar_output_available():
+        print(red(f"Writing the results as {settings.columnar_format} needs pyarrow: pip install pyarrow"))
+        return EXIT_INVALID_ARGUMENTS
+
+    db_function = sqlite3.connect(db_file_name, check_same_thread=False)  # the GUI runs verifications on another thread
     enter = yellow("Enter")
-    csv_file_name_prefix = input(
+    csv_file_name_prefix = args.prefix if args.prefix is not None or headless else input(
         f"Add a title to be prepended to the CSV result's file name then '{enter}' or just press '{enter}' to skip: "
-    ).strip().replace(" ", "_")
-    app_core = HoldingVerificationCore(db_function, table_name, csv_file_name_prefix)
-    ui = HoldingVerificationUi(app_core)
+    )
+    settings = dataclasses.replace(settings,
+                                   csv_file_name_prefix=(csv_file_name_prefix or "").strip().replace(" ", "_"))
+    app_core = HoldingVerificationCore(db_function, table_name, settings, hash_cache, progress_reporter, results_db)
+    ui = HoldingVerificationUi(app_core, args.resume)
+
+    if headless:
+        exit_code = run_headless(ui, args.paths)
+        app_core.connection.close()
+        if hash_cache:
+            hash_cache.close()
+        if results_db:
+            results_db.close()
+        return exit_code
+
     cli_or_gui = ui.prompt_use_gui()
 
     if cli_or_gui == "c":
@@ -43,11 +359,18 @@ def main():
             user_choice = input(f"Press '{yellow("q")}' and '{enter}' to quit: ").lower().strip()
             if user_choice == "q":
                 app_core.connection.close()
+                if hash_cache:
+                    hash_cache.close()
+                if results_db:
+                    results_db.close()
                 break
             else:
                 continue
     else:
         ui.open_select_window()
 
+    return EXIT_SUCCESS
+
 if __name__ == "__main__":
-    main()
+    multiprocessing.freeze_support()  # Needed for the process pool to work in the PyInstaller .exe
+    sys.exit(main())
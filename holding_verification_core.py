@@ -1,19 +1,36 @@
+import bisect
 import csv
 import hashlib
+import mmap
 import os
-from collections import defaultdict
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import closing, nullcontext
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import batched, count, takewhile
 from pathlib import Path
 
+from helpers.bloom_filter import load_or_create_bloom_filter
+from helpers.columnar_sink import ColumnarResultSink
+from helpers.checksum_db import (fixity_value_from_blob, fixity_value_to_blob, get_algorithm_row_counts,
+                                 get_file_size_select_statement, get_fingerprint_select_statement,
+                                 get_lowest_and_highest_fingerprints, get_schema_version,
+                                 get_select_statement, has_file_size_column, has_fingerprint_column, to_algorithm_name)
+from helpers.fingerprint import get_fingerprint, get_sample_size
+from helpers.hash_cache import HashCache
+from helpers.pre_scan import PreScan
+from helpers.progress import FileProgress, LineProgressReporter, ProgressTracker
+from helpers.result_sinks import CsvResultSink, MultiResultSink, read_checkpoint
+from helpers.results_db import ResultsDb, SqliteResultSink
+from helpers.traversal import get_stat_or_none, walk_files
 from helpers.helper import ColourCliText
 
 colour_text = ColourCliText()
 yellow = colour_text.yellow
-light_red = colour_text.light_red
 red = colour_text.red
-green = colour_text.green
-bright_cyan = colour_text.bright_cyan
 
 
 def check_db_exists(db_file_name, confirm_db_added_prompt=input):
@@ -29,93 +46,707 @@ def check_db_exists(db_file_name, confirm_db_added_prompt=input):
                 db_file_does_not_exist = response
 
 
+#  MD5 is 2nd since really old files (which we have a lot of) are MD5 so looking for them first is optimal
+HASH_FUNCTIONS = {"sha256": hashlib.sha256, "md5": hashlib.md5, "sha1": hashlib.sha1}
+
+
+# "read" allocates a new bytes object for every chunk, "readinto" reuses one buffer for the whole file and "mmap" hashes
+# the file straight from the OS's page cache (only use it for local drives, as a network drop can crash the app)
+READ_STRATEGIES = ("read", "readinto", "mmap")
+
+
+@dataclass(frozen=True)
+class ReadSettings:
+    buffer_size: int
+    read_strategy: str = "read"
+
+
+@dataclass(frozen=True)
+class RunSettings:
+    """How files are found, hashed, ruled out and written out; holding_verification.py builds them once from the
+    "config.ini" file and the command line arguments"""
+    csv_file_name_prefix: str = ""
+    output_dir: str = ""
+    hashing_workers: int = 1
+    hashing_pool: str = "thread"
+    read_settings: ReadSettings | None = None
+    read_settings_by_path: dict[str, ReadSettings] | None = None
+    use_in_memory_index: bool = False
+    bloom_filter_file_name: str = ""
+    use_pre_scan: bool = False
+    use_size_prefilter: bool = False
+    sha256_for_fast_rejects: bool = False
+    use_fingerprint_prefilter: bool = False
+    fingerprint_files_over_size: int = 1_000_000_000
+    fingerprint_sample_size: int = 65_536
+    detect_duplicates: bool = False
+    results_flush_every_rows: int = 1_000
+    results_flush_every_seconds: float = 30.0
+    write_csv: bool = True
+    columnar_format: str = ""
+    columnar_row_group_rows: int = 100_000
+
+
+def update_hashes_with_chunks(chunks, hash_funcs) -> None:
+    for chunk in chunks:
+        for hash_func in hash_funcs:
+            hash_func.update(chunk)
+
+
+def read_chunks(file, buffer_size: int):
+    while contents := file.read(buffer_size):
+        yield contents
+
+
+read_buffers = threading.local()  # each thread (or worker process) reuses one buffer for every file it reads
+
+
+def get_read_buffer(buffer_size: int) -> bytearray:
+    """Creating (and zeroing) a new buffer for each file would be slower than reading a small file into it"""
+    buffer = getattr(read_buffers, "buffer", None)
+    if buffer is None or len(buffer) != buffer_size:
+        buffer = read_buffers.buffer = bytearray(buffer_size)
+    return buffer
+
+
+def read_chunks_into_buffer(file, buffer_size: int):
+    """Yields views of the same buffer, so each chunk must be used before the next one is read"""
+    buffer = get_read_buffer(buffer_size)
+    with memoryview(buffer) as buffer_view:
+        while bytes_read := file.readinto(buffer):
+            with buffer_view[:bytes_read] as chunk:
+                yield chunk
+
+
+def map_file(file) -> mmap.mmap | None:
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # e.g. the file is empty or its file system doesn't support mapping
+        return None
+
+
+def read_chunks_from_map(file_map: mmap.mmap, buffer_size: int):
+    with memoryview(file_map) as file_view:
+        for start in range(0, len(file_view), buffer_size):
+            with file_view[start:start + buffer_size] as chunk:
+                yield chunk
+
+
+def update_hashes_with_file_contents(file_path: str, hash_funcs, buffer_size: int, read_strategy: str = "read") -> None:
+    """Reads the file once, feeding every chunk to each of the hash functions"""
+    with open(file_path, "rb") as file:
+        file_map = map_file(file) if read_strategy == "mmap" else None
+        if file_map is not None:
+            chunks = read_chunks_from_map(file_map, buffer_size)
+        elif read_strategy == "read":
+            chunks = read_chunks(file, buffer_size)
+        else:  # if the file couldn't be mapped, nothing has been hashed yet so it can be read instead
+            chunks = read_chunks_into_buffer(file, buffer_size)
+
+        # The chunks are closed first so that their views of the map are released before it's closed
+        with file_map if file_map is not None else nullcontext(), closing(chunks):
+            update_hashes_with_chunks(chunks, hash_funcs)
+
+
+def generate_checksums_for_file(file_path: str, hash_names, buffer_size: int,
+                                read_strategy: str = "read") -> tuple[dict[str, str], dict[str, str]]:
+    """Module-level so that it can be sent to the worker processes of a process pool"""
+    errors = dict()
+    hash_funcs = {hash_name: HASH_FUNCTIONS[hash_name]() for hash_name in hash_names}
+    try:
+        update_hashes_with_file_contents(file_path, hash_funcs.values(), buffer_size, read_strategy)
+        return {hash_name: hash_func.hexdigest() for hash_name, hash_func in hash_funcs.items()}, errors
+    except OSError as e:
+        errors[file_path] = str(e)
+        return {hash_name: "" for hash_name in hash_funcs}, errors
+
+
+class SerialExecutor(Executor):
+    """Runs each task as soon as it's submitted, so that files are hashed one at a time on the calling thread"""
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def get_completed_future(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class InMemoryChecksumIndex:
+    """Every fixity value in the DB, held in memory so that checksums which aren't in the DB don't need a query.
+
+    The fixity values are stored as raw digests (rather than hex strings), grouped by digest size (MD5: 16 bytes,
+    SHA1: 20 bytes, SHA256: 32 bytes) and packed, in sorted order, into one bytearray per size.
+
+    The fixity values are expected in sorted order (as `from_db` reads them), so each digest is appended as it's read,
+    skipping it if it's the same as the one before, without first collecting them all; any sizes whose digests weren't
+    in order are sorted once they've all been read.
+    """
+    def __init__(self, fixity_values):
+        self.packed_digests: dict[int, bytearray] = {}
+        last_digests: dict[int, bytes] = {}
+        unsorted_sizes: set[int] = set()
+        for fixity_value in fixity_values:
+            digest = fixity_value if isinstance(fixity_value, bytes) else fixity_value_to_blob(fixity_value)
+            if not isinstance(digest, bytes) or not digest:  # if not a hex digest, it can't match a generated checksum
+                continue
+            size = len(digest)
+            last_digest = last_digests.get(size)
+            if digest == last_digest:  # the same checksum for another file_ref or algorithm
+                continue
+            if last_digest is not None and digest < last_digest:
+                unsorted_sizes.add(size)
+            self.packed_digests.setdefault(size, bytearray()).extend(digest)
+            last_digests[size] = digest
+
+        for size in unsorted_sizes:
+            packed = self.packed_digests[size]
+            digests = {bytes(packed[start:start + size]) for start in range(0, len(packed), size)}
+            self.packed_digests[size] = bytearray(b"".join(sorted(digests)))
+
+    @classmethod
+    def from_db(cls, cursor, table_name: str):
+        if get_schema_version(cursor, table_name) == 2:  # the digests are the primary key, so are read in order
+            cursor.execute(f"SELECT fixity_value FROM {table_name} ORDER BY fixity_value;")
+        else:  # lower-cased so that they sort in the same order as their digests (SQLite sorts them, on disk if needed)
+            cursor.execute(f"SELECT fixity_value FROM {table_name} ORDER BY LOWER(fixity_value);")
+        return cls(fixity_value for (fixity_value,) in cursor)
+
+    def __len__(self) -> int:
+        return sum(len(packed) // size for size, packed in self.packed_digests.items())
+
+    def __contains__(self, checksum: str) -> bool:
+        try:
+            digest = bytes.fromhex(checksum)
+        except ValueError:
+            return False
+
+        size = len(digest)
+        packed = self.packed_digests.get(size, b"")
+        number_of_digests = len(packed) // size if size else 0
+        index = bisect.bisect_left(range(number_of_digests), digest, key=lambda i: packed[i * size:(i + 1) * size])
+        return index < number_of_digests and packed[index * size:(index + 1) * size] == digest
+
+
 @dataclass(frozen=True)
 class ResultSummary:
     files_processed: int
     tally: dict[bool, int]
     all_file_errors: list[dict[str, str]]
     output_csv_name: str
+    hash_cache_hits: int = 0
+    hash_cache_misses: int = 0
+    cancelled: bool = False
+    duplicate_files: int = 0
+    duplicate_bytes: int = 0
+    results_db_run_id: int | None = None
+    columnar_output_name: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class EarlierCopy:
+    """The first file in a run with a particular size and SHA256, and what was found when it was looked up (only what
+    goes in the CSV, rather than the DB rows, as one is kept for every file in the run)"""
+    path: str
+    file_refs: str
+    checksum_value: str
+    checksum_found: bool
+    checksum_found_name: str
 
 
 class HoldingVerificationCore:
-    def __init__(self, connection, table_name, csv_file_name_prefix=""):
+    def __init__(self, connection, table_name, settings: RunSettings | None = None,
+                 hash_cache: HashCache | None = None, progress_reporter=None, results_db: ResultsDb | None = None):
+        settings = settings or RunSettings()
+        self.settings = settings
         self.connection = connection
         self.cursor = self.connection.cursor()
-        self.select_statement = f"""SELECT file_ref, fixity_value, algorithm_name FROM {table_name} WHERE "fixity_value" """
+        self.table_name = table_name
+        self.schema_version = None  # detected the first time the DB is queried
+        self.select_statement = get_select_statement(table_name)
+        self.algorithm_select_statement = get_select_statement(table_name, by_algorithm=True)
+        # The number of rows for each algorithm, if the DB has them; if it does, each checksum is only looked up among
+        # the rows of its algorithm, the algorithms are tried most rows first and any without rows aren't tried at all
+        self.algorithm_row_counts: dict[str, int] | None = None
         self.IN_PROGRESS_SUFFIX = "_IN_PROGRESS"
-        self.csv_file_name_prefix = f"{csv_file_name_prefix}_" if csv_file_name_prefix else csv_file_name_prefix
+        self.csv_file_name_prefix = f"{settings.csv_file_name_prefix}_" if settings.csv_file_name_prefix else ""
         self.print = print
+        self.hashing_workers = max(settings.hashing_workers, 1)
+        self.hashing_pool = settings.hashing_pool
+        self.rows_by_checksum: dict[str, list[list[str]]] = {}  # DB rows for the checksums of the current batch of files
+        self.checksum_filters = []  # each one can rule out checksums that are definitely not in the DB
+        self.hash_cache = hash_cache
+        self.output_dir = settings.output_dir
+        self.progress_callback = None  # called with a FileProgress each time a file has been processed
+        # Count the files and bytes to process first, to estimate the time left
+        self.use_pre_scan = settings.use_pre_scan
+        self.pre_scan: PreScan | None = None
+        self.progress_tracker = ProgressTracker()
+        # Writing a line to the console for each file can take longer than hashing it, so the output can be reduced
+        self.progress_reporter = progress_reporter or LineProgressReporter(colour_text)
+        # Results are written (and synced to the disk) in batches, rather than one row at a time
+        self.results_flush_every_rows = settings.results_flush_every_rows
+        self.results_flush_every_seconds = settings.results_flush_every_seconds
+        self.results_db = results_db  # the results of every run can also be added to a DB, to query them together
+        # The results can also be written to a Parquet or Arrow file ("parquet" or "arrow"), if pyarrow is installed
+        self.columnar_format = settings.columnar_format
+        self.columnar_row_group_rows = settings.columnar_row_group_rows
+        # The results must go somewhere
+        self.write_csv = settings.write_csv or (results_db is None and self.columnar_format == "")
+        self.cancel_event = threading.Event()  # set it (e.g. from another thread) to stop a run part-way through
+        if settings.read_settings:
+            self.BUFFER_SIZE = settings.read_settings.buffer_size
+            self.READ_STRATEGY = settings.read_settings.read_strategy
+        # Drives can be fastest with different settings, so the settings for the longest matching path are used
+        self.read_settings_by_path = sorted(
+            ((os.path.join(os.path.normcase(os.path.normpath(path)), ""), read_settings)
+             for (path, read_settings) in (settings.read_settings_by_path or {}).items()),
+            key=lambda path_and_settings: len(path_and_settings[0]), reverse=True
+        )
+        invalid_read_strategies = {self.READ_STRATEGY, *(read_settings.read_strategy for (_, read_settings) in
+                                                         self.read_settings_by_path)} - set(READ_STRATEGIES)
+        if invalid_read_strategies:
+            raise ValueError(f"Unknown read strategy: {", ".join(invalid_read_strategies)}; "
+                             f"use one of {", ".join(READ_STRATEGIES)}")
+
+        # Files of a size that no file in the DB has can't be in it, so they don't need to be hashed
+        self.use_size_prefilter = settings.use_size_prefilter and self.can_use_size_prefilter()
+        # So that the CSV still has the SHA256 of every file
+        self.sha256_for_fast_rejects = settings.sha256_for_fast_rejects
+        self.sizes_in_db: dict[int, bool] = {}  # the sizes looked up in the current run
+        # Large files whose fingerprint (their size, start and end) isn't in the DB don't need to be hashed in full
+        self.fingerprint_files_over_size = settings.fingerprint_files_over_size
+        self.fingerprint_sample_size = settings.fingerprint_sample_size
+        self.use_fingerprint_prefilter = settings.use_fingerprint_prefilter and self.can_use_fingerprint_prefilter()
+        self.fingerprints_in_db: dict[str, bool] = {}  # by path, for the files waiting to be written to the CSV
+        # Copies of a file are only looked up once; the first copy of each file in the run is kept by size and SHA256
+        self.detect_duplicates = settings.detect_duplicates
+        self.earlier_copies: dict[int, dict[str, EarlierCopy]] = {}
+        self.duplicate_files = 0
+        self.duplicate_bytes = 0
+
+        if settings.use_in_memory_index:
+            self.print("Loading the checksums in the DB into memory...")
+            checksum_index = InMemoryChecksumIndex.from_db(self.cursor, table_name)
+            self.print(f"{len(checksum_index):,} checksums loaded.")
+            self.checksum_filters.append(checksum_index)
+
+        if settings.bloom_filter_file_name:
+            self.checksum_filters.append(
+                load_or_create_bloom_filter(self.connection, table_name, settings.bloom_filter_file_name, self.print)
+            )
 
     BUFFER_SIZE = 1_000_000
+    READ_STRATEGY = "read"
+    CSV_HEADER = ("Local File Path", "File Size (Bytes)", "In Preservica/DRI", "SHA256 Hash", "Matching File Refs",
+                  "Matching Algorithm Name", "Matching Algorithm Hash", "Fast Reject", "Duplicate Of")
+    HASH_FUNCTIONS = HASH_FUNCTIONS
+    MAX_PENDING_FILES_PER_WORKER = 4  # bounds how far the hashing workers can get ahead of the CSV writer
+    LOOKUP_BATCH_SIZE = 100  # number of files whose checksums are looked up in the DB together
+    # A batch also ends once its files add up to this many bytes, or this many seconds after its first file was
+    # hashed, so that the results (and the live progress) aren't held back while a batch of large files is hashed
+    LOOKUP_BATCH_BYTES = 100_000_000
+    LOOKUP_BATCH_SECONDS = 0.5
+    MAX_SQL_VARIABLES = 999  # the lowest limit of "?" parameters per statement across SQLite versions
+
+    def can_use_size_prefilter(self) -> bool:
+        if not has_file_size_column(self.cursor, self.table_name):
+            return False
+        self.cursor.execute(f"SELECT 1 FROM {self.table_name} WHERE file_size IS NULL LIMIT 1;")
+        if self.cursor.fetchone():
+            self.print(yellow("Some rows in the DB don't have a file size, so files can't be ruled out by their size."))
+            return False
+        return True
+
+    def is_size_in_db(self, file_size: int) -> bool:
+        if file_size not in self.sizes_in_db:
+            self.cursor.execute(get_file_size_select_statement(self.table_name), (file_size,))
+            self.sizes_in_db[file_size] = self.cursor.fetchone() is not None
+        return self.sizes_in_db[file_size]
+
+    def can_use_fingerprint_prefilter(self) -> bool:
+        if not has_fingerprint_column(self.cursor, self.table_name):
+            return False
+        self.cursor.execute(f"SELECT 1 FROM {self.table_name} WHERE fingerprint IS NULL LIMIT 1;")
+        if self.cursor.fetchone():
+            self.print(yellow("Some rows in the DB don't have a fingerprint, so files can't be ruled out by their "
+                              "fingerprint."))
+            return False
+        # Fingerprints taken with a different sample size never match, so every large file would be ruled out
+        sample_sizes = {get_sample_size(fingerprint or "")
+                        for fingerprint in get_lowest_and_highest_fingerprints(self.cursor, self.table_name)}
+        if sample_sizes != {self.fingerprint_sample_size}:
+            self.print(yellow(f"The DB's fingerprints weren't all taken with a sample size of "
+                              f"{self.fingerprint_sample_size:,} bytes (FINGERPRINT_SAMPLE_SIZE), so files can't be "
+                              f"ruled out by their fingerprint."))
+            return False
+        return True
+
+    def is_fingerprint_in_db(self, file_path: str) -> bool:
+        if file_path not in self.fingerprints_in_db:
+            try:
+                fingerprint = get_fingerprint(file_path, self.fingerprint_sample_size)
+            except OSError:
+                return True  # the error will be reported when the file is opened to hash it
+            self.cursor.execute(get_fingerprint_select_statement(self.table_name), (fingerprint,))
+            self.fingerprints_in_db[file_path] = self.cursor.fetchone() is not None
+        return self.fingerprints_in_db[file_path]
+
+    def get_fast_reject_reason(self, file_path: str, file_size: int | None) -> str:
+        """Returns why the file is definitely not in the DB without looking up its checksums, or "" if it might be"""
+        if file_size is None:
+            return ""
+        if self.use_size_prefilter and not self.is_size_in_db(file_size):
+            return "size"
+        if (self.use_fingerprint_prefilter and file_size > self.fingerprint_files_over_size
+                and not self.is_fingerprint_in_db(file_path)):
+            return "fingerprint"
+        return ""
+
+    def get_hash_names_to_calculate(self, fast_reject_reason: str) -> tuple[str, ...]:
+        if not fast_reject_reason:
+            return tuple(self.HASH_FUNCTIONS)
+        return ("sha256",) if self.sha256_for_fast_rejects else ()
+
+    def is_copy_of_earlier_file(self, file_stat, checksums: dict[str, str]) -> bool:
+        sha256_hash = checksums.get("sha256", "")
+        return (self.detect_duplicates and file_stat is not None and sha256_hash != ""
+                and sha256_hash in self.earlier_copies.get(file_stat.st_size, {}))
+
+    def get_earlier_copy(self, path: str, file_size: int, sha256_hash: str):
+        """Returns the file's SHA256, any errors calculating it and the earlier file in the run with the same contents,
+        if there is one.
+
+        Files are grouped by size first, as only files of the same size can be copies of each other. So, if this file
+        or the first one of its size wasn't hashed (as it can't be in the DB), its SHA256 is only calculated once there
+        are 2 files of that size.
+        """
+        copies_of_size = self.earlier_copies.get(file_size)
+        if not copies_of_size or file_size == 0:  # empty files aren't counted as copies of each other
+            return sha256_hash, {}, None
+
+        if "" in copies_of_size:
+            unhashed_copy = copies_of_size.pop("")
+            (checksums, errors) = self.get_checksums_for_file(unhashed_copy.path, ("sha256",))
+            if not errors:
+                copies_of_size.setdefault(checksums["sha256"], unhashed_copy)
+
+        errors = {}
+        if not sha256_hash:
+            (checksums, errors) = self.get_checksums_for_file(path, ("sha256",))
+            sha256_hash = checksums["sha256"]
+        return sha256_hash, errors, None if errors else copies_of_size.get(sha256_hash)
+
+    def remember_copy(self, path: str, file_size: int, sha256_hash: str, file_refs: str, checksum_value: str,
+                      checksum_found: bool, checksum_found_name: str) -> None:
+        copies_of_size = self.earlier_copies.setdefault(file_size, {})
+        if sha256_hash not in copies_of_size:
+            copies_of_size[sha256_hash] = EarlierCopy(path, file_refs, checksum_value, checksum_found,
+                                                      checksum_found_name)
+
+    def get_read_settings(self, file_path: str) -> ReadSettings:
+        """Returns the settings for the drive/folder that the file is in, if it has its own, or the default settings"""
+        if self.read_settings_by_path:
+            normalised_file_path = os.path.normcase(file_path)
+            for (path, settings) in self.read_settings_by_path:
+                if normalised_file_path.startswith(path):
+                    return settings
+        return ReadSettings(self.BUFFER_SIZE, self.READ_STRATEGY)
 
     def get_checksum_for_file(self, file_path: str, hash_func) -> tuple[str, dict[str, str]]:
         errors = dict()
+        read_settings = self.get_read_settings(file_path)
         try:
-            with open(file_path, "rb") as file:
-                while True:
-                    contents = file.read(self.BUFFER_SIZE)
-                    if not contents:
-                        break
-                    hash_func.update(contents)
-
-                return hash_func.hexdigest(), errors
+            update_hashes_with_file_contents(file_path, (hash_func,), read_settings.buffer_size,
+                                             read_settings.read_strategy)
+            return hash_func.hexdigest(), errors
         except OSError as e:
             errors[file_path] = str(e)
             return "", errors
 
-    def find_checksum_in_db(self, file_hash: str) -> list[list[str]]:
-        self.cursor.execute(f"""{self.select_statement}= "{file_hash}";""")
-        results_with_hash = self.cursor.fetchall()
-        return results_with_hash
-
-    def get_rows_with_hash(self, path: str, presumed_hash_name: str):
-        sha256_name = "sha256"
-        #  MD5 is 2nd since really old files (which we have a lot of) are MD5 so looking for them first is optimal
-        hashes_to_lookup = {sha256_name: hashlib.sha256, "md5": hashlib.md5, "sha1": hashlib.sha1}
-        errors = dict()
-        actual_hash_name = ""
-        checksum_found = False
-        rows_with_hash = []
-        sha256_hash = "" # We need to get this, regardless of whether the file has matched with another hash
-
-        presumed_hash = {presumed_hash_name: hashes_to_lookup[presumed_hash_name]} if presumed_hash_name in hashes_to_lookup else {}
-        hashes_to_lookup =  presumed_hash | hashes_to_lookup
-
-        for hash_name, hash_function in hashes_to_lookup.items():
-            (checksum, errors) = self.get_checksum_for_file(path, hash_function())
-            if hash_name == sha256_name:
-                sha256_hash = checksum
-                if checksum_found: # An md5 or sha1 may have matched previously so don't need to look in DB again
-                    break
-            rows_with_hash = self.find_checksum_in_db(checksum)
-            checksum_found = len(rows_with_hash) > 0
-
-            if checksum_found:
-                actual_hash_name = hash_name
-                if sha256_hash:
-                    break
+    def get_checksums_for_file(self, file_path: str, hash_names) -> tuple[dict[str, str], dict[str, str]]:
+        read_settings = self.get_read_settings(file_path)
+        return generate_checksums_for_file(file_path, hash_names, read_settings.buffer_size,
+                                           read_settings.read_strategy)
+
+    def get_process_pool_args(self, file_path: str) -> tuple[int, str]:
+        read_settings = self.get_read_settings(file_path)
+        return read_settings.buffer_size, read_settings.read_strategy
+
+    def get_hashing_executor(self):
+        """Returns the executor to hash the files with, the function it should call and a function that returns any
+        extra arguments for it, for each file"""
+        if self.hashing_workers == 1:
+            return SerialExecutor(), self.get_checksums_for_file, lambda file_path: ()
+        elif self.hashing_pool == "process":
+            return (ProcessPoolExecutor(max_workers=self.hashing_workers), generate_checksums_for_file,
+                    self.get_process_pool_args)
         else:
-            actual_hash_name = ""
+            return ThreadPoolExecutor(max_workers=self.hashing_workers), self.get_checksums_for_file, lambda file_path: ()
+
+    def get_cached_checksums(self, file_path: str, file_stat=None):
+        """Returns the file's stat result and its checksums from the hash cache, if it hasn't changed since"""
+        if self.hash_cache is None:
+            return file_stat, None
+        file_stat = file_stat or get_stat_or_none(file_path)
+        if file_stat is None:
+            return None, None  # the error will be reported when the file is hashed
+        return file_stat, self.hash_cache.get(file_path, file_stat)
+
+    def get_hashed_file(self, file_path: str, file_stat, checksums_were_cached: bool, future: Future):
+        (checksums, errors) = future.result()
+        every_checksum_calculated = len(checksums) == len(self.HASH_FUNCTIONS)
+        if self.hash_cache and file_stat is not None and not checksums_were_cached and not errors \
+                and every_checksum_calculated:
+            self.hash_cache.put(file_path, file_stat, checksums)
+        return file_path, file_stat, (checksums, errors)
+
+    def hash_files(self, files):
+        """Takes the path and stat result (or None) of each file and yields them with the file's checksums and errors,
+        in the same order as the files were given"""
+        (executor, checksums_func, get_extra_args) = self.get_hashing_executor()
+        max_pending_files = self.hashing_workers * self.MAX_PENDING_FILES_PER_WORKER if self.hashing_workers > 1 else 1
+
+        with executor:
+            pending_files = deque()
+            try:
+                for (file_path, file_stat) in files:
+                    if self.cancel_event.is_set():
+                        return
+                    (file_stat, cached_checksums) = self.get_cached_checksums(file_path, file_stat)
+                    hash_names = self.get_hash_names_to_calculate(
+                        self.get_fast_reject_reason(file_path, file_stat.st_size if file_stat else None)
+                    )
+                    if cached_checksums or not hash_names:
+                        future = get_completed_future((cached_checksums or {}, {}))
+                    else:
+                        future = executor.submit(checksums_func, file_path, hash_names, *get_extra_args(file_path))
+                    pending_files.append((file_path, file_stat, cached_checksums is not None, future))
+
+                    if len(pending_files) >= max_pending_files:
+                        yield self.get_hashed_file(*pending_files.popleft())
+
+                while pending_files and not self.cancel_event.is_set():
+                    yield self.get_hashed_file(*pending_files.popleft())
+            finally:
+                for (_, _, _, future) in pending_files:  # if cancelled, don't wait for files that haven't started
+                    future.cancel()
+
+    def might_be_in_db(self, file_hash: str) -> bool:
+        return all(file_hash in checksum_filter for checksum_filter in self.checksum_filters)
+
+    def get_db_schema_version(self) -> int:
+        if self.schema_version is None:
+            self.schema_version = get_schema_version(self.cursor, self.table_name)
+            self.select_statement = get_select_statement(self.table_name, self.schema_version)
+            self.algorithm_select_statement = get_select_statement(self.table_name, self.schema_version, True)
+            self.algorithm_row_counts = self.get_algorithm_row_counts()
+        return self.schema_version
+
+    def get_algorithm_row_counts(self) -> dict[str, int] | None:
+        """Returns the number of rows for each algorithm that the app generates checksums with, from the stats that
+        convert_checksum_csv_to_sqlite.py records, or None if the DB doesn't have them or they have algorithm names
+        that it wouldn't have written (in which case, the checksums are looked up without their algorithm)"""
+        row_counts = get_algorithm_row_counts(self.connection, self.table_name)
+        if row_counts is None:
+            return None
+        if any(algorithm_name != to_algorithm_name(algorithm_name) for algorithm_name in row_counts):
+            self.progress_reporter.message(yellow("The DB's algorithm names aren't all in the form that "
+                                                  "convert_checksum_csv_to_sqlite.py writes, so checksums will be "
+                                                  "looked up without their algorithm."))
+            return None
+
+        row_counts = {hash_name: row_counts.get(to_algorithm_name(hash_name), 0) for hash_name in self.HASH_FUNCTIONS}
+        self.progress_reporter.message("Rows in the DB for each algorithm: " + ", ".join(
+            f"{to_algorithm_name(hash_name)}: {row_count:,}{"" if row_count else " (not looked up)"}"
+            for (hash_name, row_count) in row_counts.items()
+        ))
+        return row_counts
+
+    def to_db_fixity_value(self, file_hash: str):
+        return fixity_value_to_blob(file_hash) if self.get_db_schema_version() == 2 else file_hash
+
+    def from_db_row(self, row):
+        """Returns the row with its fixity value as a hex string, whichever schema the DB uses"""
+        return (row[0], fixity_value_from_blob(row[1]), *row[2:]) if self.schema_version == 2 else row
+
+    def get_select_statement_and_params(self, hash_name: str) -> tuple[str, tuple[str, ...]]:
+        """Returns the start of the statement to look up the checksums of an algorithm with, and the parameters that
+        go before the fixity values"""
+        if self.algorithm_row_counts is None or not hash_name:
+            return self.select_statement, ()
+        return self.algorithm_select_statement, (to_algorithm_name(hash_name),)
+
+    def find_checksum_in_db(self, file_hash: str, hash_name: str = "") -> list[list[str]]:
+        if not self.might_be_in_db(file_hash):
+            return []
+
+        db_fixity_value = self.to_db_fixity_value(file_hash)
+        if self.algorithm_row_counts is not None and hash_name and not self.algorithm_row_counts.get(hash_name):
+            return []
+        (select_statement, params) = self.get_select_statement_and_params(hash_name)
+        self.cursor.execute(f"""{select_statement}= ?;""", (*params, db_fixity_value))
+        results_with_hash = [self.from_db_row(row) for row in self.cursor.fetchall()]
+        return results_with_hash
 
+    def find_checksums_in_db(self, checksums) -> dict[str, list[list[str]]]:
+        """Looks up many (hash name, checksum) pairs using as few queries as possible and returns the rows found for
+        each checksum; if the DB has the number of rows for each algorithm, each algorithm's checksums are looked up
+        together, among that algorithm's rows"""
+        unique_checksums = list(dict.fromkeys(checksums))
+        rows_by_checksum = {file_hash: [] for (_, file_hash) in unique_checksums}
+        checksums_that_might_be_in_db = [(hash_name, file_hash) for (hash_name, file_hash) in unique_checksums
+                                         if self.might_be_in_db(file_hash)]
+        if checksums_that_might_be_in_db:
+            self.get_db_schema_version()
+
+        file_hashes_by_hash_name = defaultdict(list)
+        for (hash_name, file_hash) in checksums_that_might_be_in_db:
+            if self.algorithm_row_counts is None:
+                file_hashes_by_hash_name[""].append(file_hash)  # all looked up together, whatever their algorithm
+            elif self.algorithm_row_counts.get(hash_name):
+                file_hashes_by_hash_name[hash_name].append(file_hash)
+
+        for (hash_name, file_hashes) in file_hashes_by_hash_name.items():
+            (select_statement, params) = self.get_select_statement_and_params(hash_name)
+            for file_hashes_to_look_up in batched(file_hashes, self.MAX_SQL_VARIABLES - len(params)):
+                db_fixity_values = tuple(self.to_db_fixity_value(file_hash) for file_hash in file_hashes_to_look_up)
+                placeholders = ", ".join("?" * len(db_fixity_values))
+                self.cursor.execute(f"""{select_statement}IN ({placeholders});""", (*params, *db_fixity_values))
+                for row in map(self.from_db_row, self.cursor.fetchall()):
+                    rows_by_checksum[row[1]].append(row)
+
+        return rows_by_checksum
+
+    def get_lookup_batches(self, hashed_files, clock=time.monotonic):
+        """Groups the hashed files into batches whose checksums are looked up together, each ending after
+        LOOKUP_BATCH_SIZE files, LOOKUP_BATCH_BYTES bytes or LOOKUP_BATCH_SECONDS seconds, whichever comes first"""
+        batch = []
+        (batch_bytes, batch_start_time) = (0, 0.0)
+        for hashed_file in hashed_files:
+            if not batch:
+                (batch_bytes, batch_start_time) = (0, clock())
+            batch.append(hashed_file)
+            (_, file_stat, _) = hashed_file
+            batch_bytes += file_stat.st_size if file_stat else 0
+            if len(batch) >= self.LOOKUP_BATCH_SIZE or batch_bytes >= self.LOOKUP_BATCH_BYTES \
+                    or clock() - batch_start_time >= self.LOOKUP_BATCH_SECONDS:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def prefetch_rows_for_files(self, hashed_files) -> None:
+        checksums_of_files = (
+            hash_name_and_checksum for (file_path, file_stat, (checksums, errors)) in hashed_files
+            if not errors and not self.get_fast_reject_reason(file_path, file_stat.st_size if file_stat else None)
+            and not self.is_copy_of_earlier_file(file_stat, checksums)  # their results are already known
+            for hash_name_and_checksum in checksums.items()
+        )
+        self.rows_by_checksum = self.find_checksums_in_db(checksums_of_files)
+
+    def get_hash_lookup_order(self, presumed_hash_name: str) -> list[str]:
+        if self.algorithm_row_counts is None:
+            hash_names = list(self.HASH_FUNCTIONS)
+        else:  # the algorithms with the most rows in the DB first, as a file is most likely to match one of those
+            row_counts = self.algorithm_row_counts
+            hash_names = sorted((hash_name for hash_name in self.HASH_FUNCTIONS if row_counts[hash_name]),
+                                key=lambda hash_name: row_counts[hash_name], reverse=True)
+        if presumed_hash_name in hash_names:
+            hash_names.remove(presumed_hash_name)
+            hash_names.insert(0, presumed_hash_name)
+        return hash_names
+
+    def look_up_checksums(self, checksums: dict[str, str], presumed_hash_name: str):
+        """Looks up each checksum in the DB, starting with the presumed algorithm, until one of them is found"""
+        for hash_name in self.get_hash_lookup_order(presumed_hash_name):
+            checksum = checksums[hash_name]
+            rows_with_hash = self.rows_by_checksum[checksum] if checksum in self.rows_by_checksum \
+                else self.find_checksum_in_db(checksum, hash_name)
+            if rows_with_hash:
+                return rows_with_hash, True, hash_name
+
+        return [], False, ""
+
+    def get_rows_with_hash(self, path: str, presumed_hash_name: str, checksums_and_errors=None):
+        # All the digests are generated from a single read of the file; the presumed hash only decides the lookup order
+        (checksums, errors) = checksums_and_errors or self.get_checksums_for_file(path, self.HASH_FUNCTIONS)
+        sha256_hash = checksums["sha256"]  # We need to get this, regardless of whether the file has matched with another hash
+
+        if errors:
+            return sha256_hash, [], False, errors, ""
+
+        (rows_with_hash, checksum_found, actual_hash_name) = self.look_up_checksums(checksums, presumed_hash_name)
         return sha256_hash, rows_with_hash, checksum_found, errors, actual_hash_name
 
-    def run(self, path, file_hash_name, all_file_errors: list[dict[str, str]], csv_writer, tally):
-        file_size = Path(path).stat().st_size
-        if file_size > 500_000_000:
-            print(f"Currently processing a file that is {file_size:,} bytes; might take a while...")
-
-        (sha256_hash, rows_with_hash, checksum_found, errors_generating_checksum, checksum_found_name) = \
-            self.get_rows_with_hash(path, file_hash_name)
+    def run(self, path, file_hash_name, all_file_errors: list[dict[str, str]], csv_writer, tally,
+            checksums_and_errors=None, file_stat=None):
+        stat_errors = {}
+        if file_stat is None:
+            try:
+                file_stat = Path(path).stat()
+            except OSError as e:  # e.g. a broken symlink; recorded like a file that couldn't be hashed, not raised
+                stat_errors = {path: str(e)}
+        file_size = file_stat.st_size if file_stat else None
+        if file_size and file_size > 500_000_000:
+            self.progress_reporter.message(f"Currently processing a file that is {file_size:,} bytes; might take a "
+                                           "while...")
+
+        fast_reject_reason = self.get_fast_reject_reason(path, file_size)
+        self.fingerprints_in_db.pop(path, None)
+        if (fast_reject_reason or self.detect_duplicates) and not checksums_and_errors and not stat_errors:
+            hash_names = self.get_hash_names_to_calculate(fast_reject_reason)
+            checksums_and_errors = self.get_checksums_for_file(path, hash_names) if hash_names else ({}, {})
+
+        earlier_copy = None
+        if self.detect_duplicates and not stat_errors and not checksums_and_errors[1]:
+            (sha256_hash, errors, earlier_copy) = self.get_earlier_copy(path, file_size,
+                                                                        checksums_and_errors[0].get("sha256", ""))
+            checksums_and_errors = ({**checksums_and_errors[0], "sha256": sha256_hash}, errors)
+
+        if stat_errors:  # the file's size can't be known, so nothing else about it can be trusted either
+            (sha256_hash, rows_with_hash, checksum_found, errors_generating_checksum, checksum_found_name) = \
+                ("", [], False, stat_errors, "")
+        elif earlier_copy:  # the file has the same contents as an earlier one, so it's found (or not) in the same way
+            (sha256_hash, rows_with_hash, checksum_found, errors_generating_checksum, checksum_found_name) = \
+                (checksums_and_errors[0]["sha256"], [], earlier_copy.checksum_found, {},
+                 earlier_copy.checksum_found_name)
+            self.duplicate_files += 1
+            self.duplicate_bytes += file_size
+        elif fast_reject_reason:  # the file can't be in the DB, so its checksums aren't looked up
+            (checksums, errors) = checksums_and_errors
+            (sha256_hash, rows_with_hash, checksum_found, errors_generating_checksum, checksum_found_name) = \
+                (checksums.get("sha256", ""), [], False, errors, "")
+        else:
+            (sha256_hash, rows_with_hash, checksum_found, errors_generating_checksum, checksum_found_name) = \
+                self.get_rows_with_hash(path, file_hash_name, checksums_and_errors)
 
-        checksum_found_colour = green(checksum_found) if checksum_found else light_red(checksum_found)
-        print(f"{yellow("File ingested")} = {checksum_found_colour}: {path}")
         tally[checksum_found] += 1
 
-        file_refs = ", ".join((row[0] for row in rows_with_hash))
-        checksum_value = "".join({row[1] for row in rows_with_hash})
+        if earlier_copy:
+            (file_refs, checksum_value) = (earlier_copy.file_refs, earlier_copy.checksum_value)
+        else:
+            file_refs = ", ".join((row[0] for row in rows_with_hash))
+            checksum_value = "".join({row[1] for row in rows_with_hash})
+
+        if self.detect_duplicates and not earlier_copy and not errors_generating_checksum:
+            self.remember_copy(path, file_size, sha256_hash, file_refs, checksum_value, checksum_found,
+                               checksum_found_name)
 
-        row = (path, file_size, checksum_found, sha256_hash, file_refs, checksum_found_name, checksum_value)
+        row = (path, file_size, checksum_found, sha256_hash, file_refs, checksum_found_name, checksum_value,
+               fast_reject_reason, earlier_copy.path if earlier_copy else "")
         csv_writer.writerow(row)
+        file_progress = FileProgress(path, file_size or 0, checksum_found)
+        self.progress_tracker.update(file_progress)
+        self.progress_reporter.file_processed(file_progress, self.progress_tracker)
+        if self.progress_callback:
+            self.progress_callback(file_progress)
 
         if errors_generating_checksum:
             all_file_errors.append(errors_generating_checksum)
@@ -124,14 +755,133 @@ class HoldingVerificationCore:
         return starting_hash_name_for_next_file, all_file_errors, tally
 
     def get_csv_output_writer_and_file_name(self, dirs: str, date: str = datetime.now().strftime("%d-%m-%Y-%H_%M_%S")):
-        output_csv_name = (f"{self.csv_file_name_prefix}INGESTED_FILES_in_{dirs}_{date}"
-                           f"{self.IN_PROGRESS_SUFFIX}.csv")
+        output_csv_name = self.get_output_file_name(dirs, date)
         csv_file = open(output_csv_name, "w", newline="", encoding="utf-8")
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(("Local File Path", "File Size (Bytes)", "In Preservica/DRI", "SHA256 Hash",
-                             "Matching File Refs", "Matching Algorithm Name", "Matching Algorithm Hash"))
-        return csv_file, csv_writer, output_csv_name
-
+        return csv_file, self.get_result_sink(csv_file), output_csv_name
+
+    def get_output_file_name(self, dirs: str, date: str, extension: str = "csv") -> str:
+        return os.path.join(self.output_dir, f"{self.csv_file_name_prefix}INGESTED_FILES_in_{dirs}_{date}"
+                                             f"{self.IN_PROGRESS_SUFFIX}.{extension}")
+
+    def get_columnar_output_part_names(self, output_csv_name: str):
+        """Yields the name of each part of the Parquet/Arrow file for the CSV (whether or not it exists yet): the same
+        name as the CSV, then '_part_2', '_part_3', etc."""
+        (csv_name_without_extension, _) = os.path.splitext(output_csv_name)
+        yield f"{csv_name_without_extension}.{self.columnar_format}"
+        for part in count(2):
+            yield f"{csv_name_without_extension}_part_{part}.{self.columnar_format}"
+
+    def get_columnar_output_file_name(self, output_csv_name: str) -> str:
+        """As a resumed run can't add to the file written before it stopped, each resumed run writes a new part"""
+        return next(part_name for part_name in self.get_columnar_output_part_names(output_csv_name)
+                    if not os.path.exists(part_name))
+
+    def get_result_sink(self, csv_file) -> CsvResultSink:
+        return CsvResultSink(csv_file, self.CSV_HEADER, self.results_flush_every_rows, self.results_flush_every_seconds)
+
+    def add_other_outputs_to_result_sink(self, csv_writer, paths, output_csv_name: str, dirs: str):
+        """Returns where the results of the run should be written, the run's ID in the results DB, if there is one, and
+        the name of the Parquet/Arrow file, if there is one"""
+        (sinks, run_id, columnar_output_name) = ([csv_writer], None, "")
+        if self.columnar_format:
+            columnar_output_name = self.get_columnar_output_file_name(
+                output_csv_name or self.get_output_file_name(dirs, datetime.now().strftime("%d-%m-%Y-%H_%M_%S"))
+            )
+            sinks.append(ColumnarResultSink(columnar_output_name, self.CSV_HEADER, self.columnar_format,
+                                            self.columnar_row_group_rows))
+        if self.results_db is not None:
+            run_id = self.results_db.start_run(paths, output_csv_name)
+            sinks.append(SqliteResultSink(self.results_db, run_id, self.results_flush_every_rows,
+                                          self.results_flush_every_seconds))
+
+        sinks = [sink for sink in sinks if sink is not None]
+        result_sink = sinks[0] if len(sinks) == 1 else \
+            MultiResultSink(sinks, self.results_flush_every_rows, self.results_flush_every_seconds)
+        return result_sink, run_id, columnar_output_name
+
+    @staticmethod
+    def remove_rows_after_checkpoint(csv_name: str) -> None:
+        """Rows after the last one synced to the disk might not have been written in full (e.g. after a power cut)"""
+        checkpoint = read_checkpoint(csv_name)
+        if checkpoint and os.path.getsize(csv_name) > checkpoint["durable_bytes"]:
+            os.truncate(csv_name, checkpoint["durable_bytes"])
+
+    @staticmethod
+    def remove_incomplete_last_row(csv_name: str) -> None:
+        """If the app stopped part-way through writing a row, everything after the last complete row is removed"""
+        chunk_size = 65_536
+        with open(csv_name, "rb+") as csv_file:
+            end_of_file = csv_file.seek(0, os.SEEK_END)
+            position = end_of_file
+            while position > 0:
+                chunk_start = max(position - chunk_size, 0)
+                csv_file.seek(chunk_start)
+                chunk = csv_file.read(position - chunk_start)
+                last_newline_index = chunk.rfind(b"\n")
+                if last_newline_index != -1:
+                    csv_file.truncate(chunk_start + last_newline_index + 1)
+                    return
+                position = chunk_start
+            csv_file.truncate(0)
+
+    def read_in_progress_csv(self, csv_name: str):
+        """Returns the paths of the files in a CSV from a run that didn't complete, the number of rows, the tally of
+        them and the algorithm of the last checksum found"""
+        self.remove_rows_after_checkpoint(csv_name)
+        self.remove_incomplete_last_row(csv_name)
+        processed_paths = set()
+        tally: dict[bool, int] = defaultdict(int)
+        rows_in_csv = 0
+        last_hash_name_found = ""
+
+        with open(csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            csv_reader = csv.DictReader(csv_file)
+            if csv_reader.fieldnames is not None and tuple(csv_reader.fieldnames) != self.CSV_HEADER:
+                raise ValueError(f"'{csv_name}' can't be resumed as it has different columns to the ones this version "
+                                 f"of the app writes: {", ".join(self.CSV_HEADER)}")
+            for row in csv_reader:
+                rows_in_csv += 1
+                processed_paths.add(row["Local File Path"])
+                checksum_found = row["In Preservica/DRI"] == "True"
+                tally[checksum_found] += 1
+                if checksum_found:
+                    last_hash_name_found = row["Matching Algorithm Name"]
+
+        return processed_paths, rows_in_csv, tally, last_hash_name_found
+
+    def get_csv_writer_for_resumed_run(self, csv_name: str):
+        csv_file = open(csv_name, "a", newline="", encoding="utf-8")
+        return csv_file, self.get_result_sink(csv_file), csv_name  # the header is written if the app stopped before it
+
+    @staticmethod
+    def get_files(paths, are_directories: bool):
+        """Yields the path and stat result (or None if it couldn't be read) of each file to process, reading each
+        file's metadata only once as, on network drives, each read is a round trip to the server"""
+        for path in paths:
+            if not are_directories or not Path(path).is_dir():  # files can be given alongside folders when run headless
+                yield path, get_stat_or_none(path)
+            else:
+                yield from walk_files(str(Path(path)))
+
+    @staticmethod
+    def get_file_paths(paths, are_directories: bool):
+        for (file_path, _) in HoldingVerificationCore.get_files(paths, are_directories):
+            yield file_path
+
+    def end_processing(self, result_sink, keep_checkpoint: bool) -> None:
+        """Writes the rows left and resets everything kept for the run, whether or not it completed"""
+        self.rows_by_checksum = {}
+        self.sizes_in_db = {}  # the DB might change before the next run
+        self.earlier_copies = {}
+        self.fingerprints_in_db = {}
+        if self.pre_scan:
+            self.pre_scan.stop()
+        self.progress_reporter.finish()
+        self.cancel_event.clear()
+        result_sink.close(keep_checkpoint=keep_checkpoint)
+        self.connection.commit()
+        if self.hash_cache:
+            self.hash_cache.write()
 
     def start(self, selected_items) -> ResultSummary:
         are_directories = selected_items["are_directories"]
@@ -154,38 +904,87 @@ class HoldingVerificationCore:
         all_file_errors: list[dict[str, str]] = []
         tally: dict[bool, int] = defaultdict(int)
         files_processed = 0
-
-        csv_file, csv_writer, output_csv_name = self.get_csv_output_writer_and_file_name(dir_for_csv_name)
-
-        if are_directories:
-            for path in paths:
-                for direct_dir, _, files_in_dir in Path(path).walk():
-                    if files_in_dir:  # for each directory, there could be just directories inside
-                        for file_name in files_in_dir:
-                            item_path = f"{direct_dir / file_name}"
-                            files_processed += 1
-                            (hash_name, all_file_errors, tally) = self.run(
-                                str(item_path), assumed_hash_algo, all_file_errors, csv_writer, tally
-                            )
-                            assumed_hash_algo = hash_name  # Assume next file uses same algo in order to reduce file hashing
-
-                        if files_processed % 100 == 0:
-                            print(f"\n{bright_cyan(f"{files_processed:,} files processed")}\n")
-
+        processed_paths = set()
+        resume_csv_name = selected_items.get("resume_csv_name")
+        self.duplicate_files = 0
+        self.duplicate_bytes = 0
+        if self.hash_cache:
+            self.hash_cache.start_run()
+
+        if resume_csv_name:  # carry on from where a run that didn't complete left off
+            (processed_paths, files_processed, tally, last_hash_name_found) = self.read_in_progress_csv(resume_csv_name)
+            assumed_hash_algo = last_hash_name_found or assumed_hash_algo
+            (_, csv_writer, output_csv_name) = self.get_csv_writer_for_resumed_run(resume_csv_name)
+            self.print(f"Resuming '{resume_csv_name}': skipping the {files_processed:,} files already processed")
+        elif self.write_csv:
+            (_, csv_writer, output_csv_name) = self.get_csv_output_writer_and_file_name(dir_for_csv_name)
         else:
-            for path in paths:
-                files_processed += 1
-                (hash_name, all_file_errors, tally) = self.run(path, assumed_hash_algo, all_file_errors, csv_writer, tally)
-                assumed_hash_algo = hash_name  # Assume next file uses same algo in order to reduce file hashing
-
-        csv_file.close()
-        self.connection.commit()
-        final_output_csv_name = output_csv_name.replace(self.IN_PROGRESS_SUFFIX, "")
+            (csv_writer, output_csv_name) = (None, "")
+        (result_sink, results_db_run_id, columnar_output_name) = self.add_other_outputs_to_result_sink(
+            csv_writer, paths, output_csv_name, dir_for_csv_name
+        )
+
+        # The pre-scan runs alongside the processing, so the totals (and time left) become more accurate as it goes
+        self.pre_scan = PreScan(paths, processed_paths).start() if self.use_pre_scan else None
+        self.progress_tracker = ProgressTracker(pre_scan=self.pre_scan)
+        # Files are hashed (possibly in parallel) but results are written one at a time, in the order they were found
+        # With a pre-scan, the files it finds are processed, rather than walking the folders a second time
+        found_files = self.pre_scan.get_files() if self.pre_scan else self.get_files(paths, are_directories)
+        files = ((path, file_stat) for (path, file_stat) in found_files if path not in processed_paths)
+        hashed_files = self.hash_files(files)
+        completed = False
         try:
-            os.rename(output_csv_name, final_output_csv_name)
-        except Exception as e:
-            self.print(red("\n\nWARNING: Processing completed but was unable to remove '_IN_PROGRESS' from the " +
-                      f"CSV file name, due to this error: {e}")
-            )
+            for batch_of_hashed_files in self.get_lookup_batches(hashed_files):
+                self.prefetch_rows_for_files(batch_of_hashed_files)
 
-        return ResultSummary(files_processed, tally, all_file_errors, final_output_csv_name)
+                for item_path, file_stat, checksums_and_errors in batch_of_hashed_files:
+                    if self.cancel_event.is_set():  # the rest of the batch is left for a resumed run
+                        break
+                    files_processed += 1
+                    (hash_name, all_file_errors, tally) = self.run(
+                        item_path, assumed_hash_algo, all_file_errors, result_sink, tally, checksums_and_errors,
+                        file_stat
+                    )
+                    assumed_hash_algo = hash_name  # Assume next file uses same algo in order to reduce DB lookups
+
+                    if are_directories and files_processed % 100 == 0:
+                        progress = self.progress_tracker.describe() if self.pre_scan else \
+                            f"{files_processed:,} files processed"
+                        self.progress_reporter.totals(progress)
+            completed = True
+        finally:  # even if the run fails part-way (e.g. a DB error or Ctrl+C), the rows so far are kept to resume from
+            cancelled = self.cancel_event.is_set() or not completed
+            self.end_processing(result_sink, keep_checkpoint=cancelled)
+
+        (hash_cache_hits, hash_cache_misses) = (0, 0)
+        if self.hash_cache:
+            self.hash_cache.end_run()
+            (hash_cache_hits, hash_cache_misses) = (self.hash_cache.hits, self.hash_cache.misses)
+
+        if cancelled:  # the CSV keeps its '_IN_PROGRESS' suffix so that the run can be resumed
+            result_summary = ResultSummary(files_processed, tally, all_file_errors, output_csv_name, hash_cache_hits,
+                                           hash_cache_misses, cancelled, self.duplicate_files, self.duplicate_bytes,
+                                           results_db_run_id, columnar_output_name)
+        else:
+            final_output_csv_name = output_csv_name.replace(self.IN_PROGRESS_SUFFIX, "")
+            final_columnar_output_name = columnar_output_name.replace(self.IN_PROGRESS_SUFFIX, "")
+            try:
+                if output_csv_name:
+                    os.rename(output_csv_name, final_output_csv_name)
+                if columnar_output_name:  # including the parts written before the run was resumed
+                    for part_name in takewhile(os.path.exists, self.get_columnar_output_part_names(
+                            output_csv_name or columnar_output_name)):
+                        os.rename(part_name, part_name.replace(self.IN_PROGRESS_SUFFIX, ""))
+            except Exception as e:
+                self.print(red("\n\nWARNING: Processing completed but was unable to remove '_IN_PROGRESS' from the " +
+                          f"CSV file name, due to this error: {e}")
+                )
+
+            result_summary = ResultSummary(files_processed, tally, all_file_errors, final_output_csv_name,
+                                           hash_cache_hits, hash_cache_misses, duplicate_files=self.duplicate_files,
+                                           duplicate_bytes=self.duplicate_bytes, results_db_run_id=results_db_run_id,
+                                           columnar_output_name=final_columnar_output_name)
+
+        if self.results_db:
+            self.results_db.end_run(results_db_run_id, result_summary)
+        return result_summary
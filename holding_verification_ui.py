@@ -1,5 +1,9 @@
+import queue
+import threading
+from datetime import timedelta
 from pathlib import Path
 from helpers.helper import ColourCliText
+from helpers.progress import ProgressTracker
 
 from holding_verification_core import HoldingVerificationCore, ResultSummary
 
@@ -12,8 +16,11 @@ bright_cyan = colour_text.bright_cyan
 
 
 class HoldingVerificationUi:
-    def __init__(self, app: HoldingVerificationCore):
+    PROGRESS_REFRESH_MS = 200
+
+    def __init__(self, app: HoldingVerificationCore, resume_csv_name: str = ""):
         self.app = app
+        self.resume_csv_name = resume_csv_name  # only used for the first run
 
     def prompt_use_gui(self, gui_or_cli_prompt=input) -> str:
         enter = yellow("Enter")
@@ -26,9 +33,27 @@ class HoldingVerificationUi:
         paths_as_list = f"\n  {paths_as_string}" if len(paths_as_string) > 1 else paths_as_string
         print(f"""\n{yellow("You've selected")}: {paths_as_list}\n\t""")
         selected_items["paths"] = item_paths
+        selected_items["resume_csv_name"], self.resume_csv_name = self.resume_csv_name, ""
 
         result_summary = self.app.start(selected_items)
         self.print_summary(result_summary)
+        return result_summary
+
+    def run_verification_in_background(self, item_paths, selected_items, progress_queue: queue.Queue):
+        """Runs the verification on another thread, so the window stays responsive, and puts its progress and
+        outcome on the queue for the window to pick up"""
+        def verify():
+            try:
+                progress_queue.put(("completed", self.run_verification(item_paths, selected_items)))
+            except Exception as e:
+                progress_queue.put(("failed", e))
+            finally:
+                self.app.progress_callback = None
+
+        self.app.progress_callback = lambda file_progress: progress_queue.put(("progress", file_progress))
+        worker_thread = threading.Thread(target=verify, daemon=True)
+        worker_thread.start()
+        return worker_thread
 
     def open_select_window(self):
         from sys import platform
@@ -44,7 +69,7 @@ class HoldingVerificationUi:
         windows_os = "win32"  # Windows 64-bit also falls under "win32"
 
         if platform == windows_os:
-            window_dims = "565x490"
+            window_dims = "565x640"
             button_text_colour = "white"
             file_button_x = 180
             folder_button_x = 300
@@ -52,9 +77,10 @@ class HoldingVerificationUi:
             dnd_bg_colour = "white"
             dnd_confirm_button_x = 419
             dnd_confirm_button_y = 455
+            progress_panel_width = 545
 
         else:
-            window_dims = "500x450"
+            window_dims = "500x600"
             button_text_colour = "black"
             file_button_x = 130
             folder_button_x = 250
@@ -62,6 +88,7 @@ class HoldingVerificationUi:
             dnd_bg_colour = "grey"
             dnd_confirm_button_x = 319
             dnd_confirm_button_y = 405
+            progress_panel_width = 480
 
         select_window.geometry(window_dims)
         file_and_folder_button_y = 50
@@ -74,6 +101,81 @@ class HoldingVerificationUi:
             confirm_dropped_items_button.config(bg='SystemButtonFace')
             confirm_dropped_items_button["state"] = "disabled"
 
+        progress_queue = queue.Queue()
+        worker_thread = None
+        progress_tracker = ProgressTracker()
+        close_when_finished = False
+        current_file_text = tk.StringVar(select_window, "Current file: -")
+        counts_text = tk.StringVar(select_window, "Files processed: 0 (in Preservica/DRI: 0, not in Preservica/DRI: 0)")
+        speed_text = tk.StringVar(select_window, "Speed: -")
+        time_left_text = tk.StringVar(select_window, "")
+
+        def set_selection_buttons_state(state: str):
+            select_file_button["state"] = state
+            select_dir_button["state"] = state
+            if state == "disabled" or confirmed_dropped_items:
+                confirm_dropped_items_button["state"] = state
+
+        def show_progress():
+            current_file_text.set(f"Current file: {progress_tracker.current_file or "-"}")
+            counts_text.set(f"Files processed: {progress_tracker.files_processed:,} (in Preservica/DRI: "
+                            f"{progress_tracker.files_matched:,}, not in Preservica/DRI: "
+                            f"{progress_tracker.files_not_matched:,})")
+            speed_text.set(f"Speed: {progress_tracker.files_per_second:,.1f} files/sec, "
+                           f"{progress_tracker.mb_per_second:,.1f} MB/sec")
+            progress_tracker.pre_scan = self.app.pre_scan  # created by the run, once it has started
+            if progress_tracker.percent_complete is not None:
+                seconds_remaining = progress_tracker.seconds_remaining
+                time_left = "calculating..." if seconds_remaining is None \
+                    else f"about {timedelta(seconds=round(seconds_remaining))}"
+                time_left_text.set(f"Complete: {progress_tracker.percent_complete:.1f}% of "
+                                   f"{progress_tracker.total_bytes / 1_000_000:,.1f} MB, time left: {time_left}")
+
+        def check_progress():
+            finished = False
+            while True:
+                try:
+                    (event, value) = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event == "progress":
+                    progress_tracker.update(value)
+                else:
+                    finished = True
+                    if event == "failed":
+                        print(red(f"Processing stopped due to this error: {value}"))
+
+            show_progress()
+            if not finished:
+                select_window.after(self.PROGRESS_REFRESH_MS, check_progress)
+            elif close_when_finished:
+                select_window.destroy()
+            else:
+                cancel_button["state"] = "disabled"
+                set_selection_buttons_state("normal")
+
+        def start_verification(paths_selected):
+            nonlocal worker_thread, progress_tracker
+            set_selection_buttons_state("disabled")
+            cancel_button["state"] = "normal"
+            progress_tracker = ProgressTracker()
+            self.app.pre_scan = None  # so that the totals from the last run aren't shown
+            worker_thread = self.run_verification_in_background(paths_selected, selected_items, progress_queue)
+            select_window.after(self.PROGRESS_REFRESH_MS, check_progress)
+
+        def cancel_callback():
+            cancel_button["state"] = "disabled"
+            current_file_text.set("Cancelling...")
+            self.app.cancel_event.set()
+
+        def close_window_callback():
+            nonlocal close_when_finished
+            if worker_thread is not None and worker_thread.is_alive():
+                close_when_finished = True  # the window closes once the run has stopped and the CSV is closed
+                cancel_callback()
+            else:
+                select_window.destroy()
+
         def file_callback() -> None:
             nonlocal item_path
             clear_list_box()
@@ -81,7 +183,7 @@ class HoldingVerificationUi:
             item_path = askopenfilenames(parent=select_window, initialdir="", title='Select File(s)')
             if item_path != "":
                 selected_items["are_directories"] = False
-                self.run_verification(item_path, selected_items)
+                start_verification(item_path)
 
         def folder_callback() -> None:
             nonlocal item_path
@@ -92,7 +194,7 @@ class HoldingVerificationUi:
 
             if item_path != ("",):
                 selected_items["are_directories"] = True
-                self.run_verification(item_path, selected_items)
+                start_verification(item_path)
 
         select_file_button = tk.Button(select_window, bg="blue", fg=button_text_colour, text="Select File(s)",
                                        command=file_callback)
@@ -114,7 +216,7 @@ class HoldingVerificationUi:
             selected_items["are_directories"] = path.is_dir()
 
             if item_path != ("",):  # shouldn't be possible as button is disabled until an item is dropped
-                self.run_verification(item_path, selected_items)
+                start_verification(item_path)
 
         def list_dropped_items_callback(drop_event: TkinterDnD.DnDEvent):
             nonlocal confirmed_dropped_items
@@ -160,6 +262,16 @@ class HoldingVerificationUi:
         confirm_dropped_items_button["state"] = "disabled"
         confirm_dropped_items_button.place(x=dnd_confirm_button_x, y=dnd_confirm_button_y)
 
+        progress_panel = tk.LabelFrame(select_window, text="Progress", width=progress_panel_width, height=140)
+        progress_panel.pack_propagate(False)
+        for progress_text in (current_file_text, counts_text, speed_text, time_left_text):
+            tk.Label(progress_panel, textvariable=progress_text, anchor="w").pack(fill="x")
+        cancel_button = tk.Button(progress_panel, text="Cancel", command=cancel_callback)
+        cancel_button["state"] = "disabled"
+        cancel_button.pack(anchor="e", padx=5)
+        progress_panel.place(x=10, y=dnd_confirm_button_y + 40)
+
+        select_window.protocol("WM_DELETE_WINDOW", close_window_callback)
         select_window.wait_window()
 
         if len(item_path) == 0:
@@ -202,7 +314,13 @@ class HoldingVerificationUi:
         self.run_verification(selected_items["paths"], selected_items)
 
     def print_summary(self, summary: ResultSummary):
-        print(f"\n{green("Completed.")}\n\n")
+        if summary.cancelled and not summary.output_csv_name:
+            print(f"\n{red("Cancelled.")} Without a CSV, the run can't be resumed.\n")
+        elif summary.cancelled:
+            print(f"\n{red("Cancelled.")} The results so far are in '{yellow(summary.output_csv_name)}'; to carry on "
+                  f"from where this run stopped, start the app with '--resume \"{summary.output_csv_name}\"'.\n")
+        else:
+            print(f"\n{green("Completed.")}\n\n")
         file_or_files = "file was" if summary.files_processed == 1 else "files were"
         print(f"{bright_cyan(f"{summary.files_processed:,}")} {file_or_files} processed:")
         preserved = summary.tally.get(True)
@@ -212,7 +330,23 @@ class HoldingVerificationUi:
         Files not in Preservica/DRI: {red(f"{summary.tally.get(False):}")}
         """)
 
-        print(f"The full results can be found in a file called '{yellow(summary.output_csv_name)}'.\n")
+        if summary.hash_cache_hits or summary.hash_cache_misses:
+            print(f"""Files whose checksums were reused from the hash cache: {green(f"{summary.hash_cache_hits:,}")}
+        Files that had to be hashed: {yellow(f"{summary.hash_cache_misses:,}")}
+        """)
+
+        if summary.duplicate_files:
+            print(f"""Files that are copies of another file processed: {yellow(f"{summary.duplicate_files:,}")} """
+                  f"""({summary.duplicate_bytes / 1_000_000:,.1f} MB)
+        """)
+
+        if summary.output_csv_name:
+            print(f"The full results can be found in a file called '{yellow(summary.output_csv_name)}'.\n")
+        if summary.columnar_output_name:
+            print(f"They can also be found in '{yellow(summary.columnar_output_name)}'.\n")
+        if summary.results_db_run_id is not None:
+            print(f"The results were added to the results DB as run {yellow(summary.results_db_run_id)}; use "
+                  f"'holding_verification.py query' to export them.\n")
         if summary.all_file_errors:
             print("These files encountered errors when trying to generate checksums:\n")
             for file_error in summary.all_file_errors:
@@ -0,0 +1,122 @@
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from helpers.bloom_filter import ChecksumBloomFilter, create_bloom_filter_file, get_db_fingerprint, \
+    load_or_create_bloom_filter
+from holding_verification_core import HoldingVerificationCore, RunSettings
+
+
+class TestBloomFilter(unittest.TestCase):
+    table_name = "files_in_dri"
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_file_name = os.path.join(self.temp_dir.name, "checksums.db")
+        self.bloom_filter_file_name = os.path.join(self.temp_dir.name, "checksums.bloom")
+        self.connection = sqlite3.connect(self.db_file_name)
+        self.connection.execute(f"CREATE TABLE {self.table_name} (file_ref, fixity_value, algorithm_name);")
+        self.connection.executemany(
+            f"INSERT INTO {self.table_name} (file_ref, fixity_value, algorithm_name) VALUES (?, ?, ?);",
+            ((str(n), f"{n:064x}", "SHA256") for n in range(1000))
+        )
+        self.connection.commit()
+
+    def tearDown(self):
+        self.connection.close()
+        self.temp_dir.cleanup()
+
+    def test_bloom_filter_should_contain_every_checksum_added_and_few_others(self):
+        bloom_filter = ChecksumBloomFilter.for_number_of_checksums(1000, 0.01)
+        for n in range(1000):
+            bloom_filter.add(f"{n:064x}")
+
+        self.assertEqual(True, all(f"{n:064x}" in bloom_filter for n in range(1000)))
+        false_positives = sum(f"{n:064x}" in bloom_filter for n in range(1000, 11000))
+        self.assertLess(false_positives, 300)
+
+    def test_save_and_load_should_return_the_same_bloom_filter_and_db_fingerprint(self):
+        bloom_filter = ChecksumBloomFilter.for_number_of_checksums(10)
+        bloom_filter.add("checksum")
+        bloom_filter.save(self.bloom_filter_file_name, "fingerprint")
+
+        (loaded_bloom_filter, db_fingerprint) = ChecksumBloomFilter.load(self.bloom_filter_file_name)
+
+        self.assertEqual("fingerprint", db_fingerprint)
+        self.assertEqual(bloom_filter.number_of_hashes, loaded_bloom_filter.number_of_hashes)
+        self.assertEqual(bloom_filter.bits, loaded_bloom_filter.bits)
+        self.assertIn("checksum", loaded_bloom_filter)
+
+    def test_save_should_leave_the_existing_file_as_it_was_if_the_new_one_cannot_be_written(self):
+        ChecksumBloomFilter.for_number_of_checksums(10).save(self.bloom_filter_file_name, "old fingerprint")
+
+        with patch("helpers.bloom_filter.os.replace", side_effect=OSError("disk full")), self.assertRaises(OSError):
+            ChecksumBloomFilter.for_number_of_checksums(10).save(self.bloom_filter_file_name, "new fingerprint")
+
+        (_, db_fingerprint) = ChecksumBloomFilter.load(self.bloom_filter_file_name)
+        self.assertEqual("old fingerprint", db_fingerprint)
+        self.assertEqual(["checksums.bloom", "checksums.db"], sorted(os.listdir(self.temp_dir.name)))
+
+    def test_get_db_fingerprint_should_change_when_rows_are_added_to_the_db(self):
+        db_fingerprint = get_db_fingerprint(self.connection, self.table_name)
+        self.assertEqual(db_fingerprint, get_db_fingerprint(self.connection, self.table_name))
+
+        self.connection.execute(f"INSERT INTO {self.table_name} VALUES ('1000', 'new_checksum', 'SHA256');")
+        self.connection.commit()
+
+        self.assertNotEqual(db_fingerprint, get_db_fingerprint(self.connection, self.table_name))
+
+    def test_load_or_create_bloom_filter_should_load_the_file_if_it_was_built_from_the_same_db(self):
+        create_bloom_filter_file(self.connection, self.table_name, self.bloom_filter_file_name)
+        print_func = Mock()
+
+        bloom_filter = load_or_create_bloom_filter(self.connection, self.table_name, self.bloom_filter_file_name,
+                                                   print_func)
+
+        print_func.assert_not_called()
+        self.assertIn(f"{999:064x}", bloom_filter)
+
+    def test_load_or_create_bloom_filter_should_rebuild_the_file_if_the_db_has_changed(self):
+        create_bloom_filter_file(self.connection, self.table_name, self.bloom_filter_file_name)
+        self.connection.execute(f"INSERT INTO {self.table_name} VALUES ('1000', 'new_checksum', 'SHA256');")
+        self.connection.commit()
+        print_func = Mock()
+
+        bloom_filter = load_or_create_bloom_filter(self.connection, self.table_name, self.bloom_filter_file_name,
+                                                   print_func)
+
+        self.assertIn("was built from a different version of the DB", print_func.call_args_list[0].args[0])
+        self.assertIn("new_checksum", bloom_filter)
+        (_, db_fingerprint) = ChecksumBloomFilter.load(self.bloom_filter_file_name)
+        self.assertEqual(get_db_fingerprint(self.connection, self.table_name), db_fingerprint)
+
+    def test_load_or_create_bloom_filter_should_build_the_file_if_it_does_not_exist(self):
+        bloom_filter = load_or_create_bloom_filter(self.connection, self.table_name, self.bloom_filter_file_name, Mock())
+
+        self.assertEqual(True, Path(self.bloom_filter_file_name).is_file())
+        self.assertIn(f"{0:064x}", bloom_filter)
+
+    def test_holding_verification_core_should_not_query_db_for_checksums_the_bloom_filter_does_not_contain(self):
+        holding_verification = HoldingVerificationCore(
+            self.connection, self.table_name, settings=RunSettings(bloom_filter_file_name=self.bloom_filter_file_name)
+        )
+        holding_verification.print = Mock()
+        holding_verification.cursor = Mock(wraps=self.connection.cursor())
+        checksums_not_in_db = [f"{n:064x}" for n in range(1000, 1100)]
+        checksums_not_ruled_out = [checksum for checksum in checksums_not_in_db
+                                   if holding_verification.might_be_in_db(checksum)]
+
+        rows_by_checksum = holding_verification.find_checksums_in_db(
+            [("sha256", checksum) for checksum in [f"{5:064x}"] + checksums_not_in_db]
+        )
+
+        self.assertEqual([("5", f"{5:064x}", "SHA256")], rows_by_checksum[f"{5:064x}"])
+        ((_, params), _) = holding_verification.cursor.execute.call_args
+        self.assertEqual((f"{5:064x}", *checksums_not_ruled_out), params)
+
+
+if __name__ == "__main__":
+    unittest.main()
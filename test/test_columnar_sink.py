@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from helpers.checksum_db import create_checksum_table
+from helpers.columnar_sink import ColumnarResultSink, is_columnar_output_available
+from holding_verification_core import HoldingVerificationCore, RunSettings
+
+if is_columnar_output_available():
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+
+@unittest.skipUnless(is_columnar_output_available(), "pyarrow isn't installed")
+class TestColumnarResultSink(unittest.TestCase):
+    rows = (("a.txt", 19, True, "e2d0fe15", "1, 10", "sha256", "e2d0fe15", "", ""),
+            ("b.txt", 0, False, "", "", "", "", "size", ""),
+            ("c.txt", 19, True, "e2d0fe15", "1, 10", "sha256", "e2d0fe15", "", "a.txt"))
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_rows(self, file_name: str, columnar_format: str) -> None:
+        result_sink = ColumnarResultSink(file_name, HoldingVerificationCore.CSV_HEADER, columnar_format,
+                                         row_group_rows=2, flush_every_rows=1)
+        for row in self.rows:
+            result_sink.writerow(row)
+        result_sink.close()
+
+    def test_close_should_write_the_rows_as_parquet_in_row_groups_with_the_csv_columns_and_proper_types(self):
+        file_name = os.path.join(self.temp_dir.name, "results.parquet")
+        self.write_rows(file_name, "parquet")
+
+        parquet_file = pyarrow.parquet.ParquetFile(file_name)
+        table = parquet_file.read()
+        self.assertEqual(2, parquet_file.num_row_groups)
+        self.assertEqual(list(HoldingVerificationCore.CSV_HEADER), table.column_names)
+        self.assertEqual(("int64", "bool", "binary"),
+                         tuple(str(table.schema.field(name).type) for name in table.column_names[1:4]))
+        self.assertEqual([bytes.fromhex("e2d0fe15"), None, bytes.fromhex("e2d0fe15")],
+                         table.column("SHA256 Hash").to_pylist())
+        self.assertEqual(["", "", "a.txt"], table.column("Duplicate Of").to_pylist())
+
+    def test_close_should_write_the_rows_as_an_arrow_ipc_file(self):
+        file_name = os.path.join(self.temp_dir.name, "results.arrow")
+        self.write_rows(file_name, "arrow")
+
+        table = pyarrow.ipc.open_file(file_name).read_all()
+        self.assertEqual([19, 0, 19], table.column("File Size (Bytes)").to_pylist())
+
+    def test_start_should_only_write_a_parquet_file_if_asked_not_to_write_a_csv(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, "files_in_dri")
+        holding_verification = HoldingVerificationCore(
+            connection, "files_in_dri",
+            settings=RunSettings(output_dir=self.temp_dir.name, write_csv=False, columnar_format="parquet")
+        )
+        holding_verification.print = Mock()
+
+        with patch("builtins.print"):
+            result_summary = holding_verification.start({"paths": ("test/test_files",), "are_directories": True})
+
+        self.assertEqual(("", "parquet"), (result_summary.output_csv_name,
+                                           result_summary.columnar_output_name.rsplit(".", 1)[1]))
+        self.assertEqual([os.path.basename(result_summary.columnar_output_name)], os.listdir(self.temp_dir.name))
+        self.assertNotIn("_IN_PROGRESS", result_summary.columnar_output_name)
+        self.assertEqual(3, pyarrow.parquet.read_table(result_summary.columnar_output_name).num_rows)
+        connection.close()
+
+    def test_start_should_remove_in_progress_from_every_part_once_a_resumed_run_completes(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, "files_in_dri")
+        holding_verification = HoldingVerificationCore(
+            connection, "files_in_dri", settings=RunSettings(output_dir=self.temp_dir.name, columnar_format="parquet")
+        )
+        holding_verification.print = Mock()
+        holding_verification.progress_callback = lambda file_progress: holding_verification.cancel_event.set()
+
+        with patch("builtins.print"):
+            cancelled_summary = holding_verification.start({"paths": ("test/test_files",), "are_directories": True})
+            holding_verification.progress_callback = None
+            result_summary = holding_verification.start({"paths": ("test/test_files",), "are_directories": True,
+                                                         "resume_csv_name": cancelled_summary.output_csv_name})
+
+        (csv_name_without_extension, _) = os.path.splitext(os.path.basename(result_summary.output_csv_name))
+        self.assertEqual(True, cancelled_summary.cancelled)
+        self.assertEqual(sorted((f"{csv_name_without_extension}.csv", f"{csv_name_without_extension}.parquet",
+                                 f"{csv_name_without_extension}_part_2.parquet")),
+                         sorted(os.listdir(self.temp_dir.name)))
+        self.assertEqual(os.path.join(self.temp_dir.name, f"{csv_name_without_extension}_part_2.parquet"),
+                         result_summary.columnar_output_name)
+        self.assertEqual([1, 2], [pyarrow.parquet.read_table(os.path.join(self.temp_dir.name, file_name)).num_rows
+                                  for file_name in sorted(os.listdir(self.temp_dir.name))
+                                  if file_name.endswith(".parquet")])
+        connection.close()
+
+
+class TestColumnarResultSinkWithoutPyarrow(unittest.TestCase):
+    def test_it_should_raise_an_error_if_pyarrow_is_not_installed(self):
+        with patch("helpers.columnar_sink.pyarrow", None), self.assertRaises(ImportError):
+            ColumnarResultSink("results.parquet", HoldingVerificationCore.CSV_HEADER)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,266 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from convert_checksum_csv_to_sqlite import (apply_delta, create_algorithm_fixity_value_index, create_file_size_index,
+                                            create_fingerprint_index, get_byte_ranges, get_csv_rows,
+                                            get_csv_rows_in_parallel, normalise_existing_rows, populate_table)
+from helpers.checksum_db import (create_checksum_table, get_algorithm_row_counts, get_latest_watermark,
+                                 get_schema_version, record_db_version, update_algorithm_stats)
+
+
+class TestConvertChecksumCsvToSqlite(unittest.TestCase):
+    table_name = "files_in_dri"
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_name = os.path.join(self.temp_dir.name, "checksums.csv")
+        with open(self.csv_name, "w", newline="") as csv_file:
+            csv_file.write("ALGORITHMNAME,OTHER,FILEREF,FIXITYVALUE,FILESIZE,FINGERPRINT\n"
+                           "SHA256,x,1,sha256Checksum123,19,ABC123\n"
+                           "\n"
+                           "MD5,y,2,md5Checksum234,0,def456\n"
+                           "SHA1,z,3,sha1Checksum345,,\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_csv_rows_should_yield_the_needed_columns_of_each_row_in_order(self):
+        rows = get_csv_rows(self.csv_name, "FILEREF", "FIXITYVALUE", "ALGORITHMNAME")
+
+        self.assertEqual(("1", "sha256Checksum123", "SHA256"), next(rows))
+        self.assertEqual([("2", "md5Checksum234", "MD5"), ("3", "sha1Checksum345", "SHA1")], list(rows))
+
+    def test_get_csv_rows_should_add_the_file_size_to_each_row_if_a_file_size_column_is_given(self):
+        rows = get_csv_rows(self.csv_name, "FILEREF", "FIXITYVALUE", "ALGORITHMNAME", "FILESIZE")
+
+        self.assertEqual(
+            [("1", "sha256Checksum123", "SHA256", 19), ("2", "md5Checksum234", "MD5", 0),
+             ("3", "sha1Checksum345", "SHA1", None)],
+            list(rows)
+        )
+
+    def test_get_csv_rows_should_lower_case_hex_fixity_values_and_normalise_algorithm_names(self):
+        with open(self.csv_name, "w", newline="") as csv_file:
+            csv_file.write("FILEREF,FIXITYVALUE,ALGORITHMNAME\n1, 0B26E313ED4A7CA6 ,sha-256\n2,Not Hex,md5\n")
+
+        rows = get_csv_rows(self.csv_name, "FILEREF", "FIXITYVALUE", "ALGORITHMNAME")
+
+        self.assertEqual([("1", "0b26e313ed4a7ca6", "SHA256"), ("2", "Not Hex", "MD5")], list(rows))
+
+    def test_get_byte_ranges_should_split_the_csv_after_its_header_into_ranges_of_whole_lines(self):
+        (header, byte_ranges) = get_byte_ranges(self.csv_name, chunk_bytes=10)
+
+        with open(self.csv_name, "rb") as csv_file:
+            csv_bytes = csv_file.read()
+        self.assertEqual(["ALGORITHMNAME", "OTHER", "FILEREF", "FIXITYVALUE", "FILESIZE", "FINGERPRINT"], header)
+        self.assertEqual(csv_bytes.index(b"\n") + 1, byte_ranges[0][0])
+        self.assertEqual(len(csv_bytes), byte_ranges[-1][1])
+        for ((_, end), (next_start, _)) in zip(byte_ranges, byte_ranges[1:]):
+            self.assertEqual(end, next_start)
+        for (start, end) in byte_ranges:
+            self.assertEqual(b"\n", csv_bytes[end - 1:end])
+            self.assertGreater(end, start)
+
+    def test_get_csv_rows_in_parallel_should_yield_the_same_rows_in_the_same_order_as_get_csv_rows(self):
+        with open(self.csv_name, "w", newline="") as csv_file:
+            csv_file.write("FILEREF,FIXITYVALUE,ALGORITHMNAME,FILESIZE\n")
+            csv_file.writelines(f"{file_ref},{file_ref:064X},sha256,{file_ref * 10}\n" for file_ref in range(1_000))
+        columns = ("FILEREF", "FIXITYVALUE", "ALGORITHMNAME", "FILESIZE")
+
+        rows = list(get_csv_rows_in_parallel(self.csv_name, *columns, workers=2, chunk_bytes=1_000))
+
+        self.assertEqual(list(get_csv_rows(self.csv_name, *columns)), rows)
+        self.assertEqual(("999", f"{999:064x}", "SHA256", 9_990), rows[-1])
+
+    def test_get_csv_rows_should_raise_an_error_if_the_csv_is_missing_a_column(self):
+        with self.assertRaises(ValueError) as error:
+            list(get_csv_rows(self.csv_name, "FILEREF", "FIXITY", "ALGORITHMNAME"))
+        self.assertIn("does not have these columns: FIXITY", str(error.exception))
+
+    def test_populate_table_should_write_the_rows_in_batches_and_report_progress(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute(f"CREATE TABLE {self.table_name} (file_ref, fixity_value, algorithm_name);")
+        print_func = Mock()
+
+        rows_written = populate_table(connection, self.table_name,
+                                      get_csv_rows(self.csv_name, "FILEREF", "FIXITYVALUE", "ALGORITHMNAME"), 2,
+                                      print_func)
+        create_algorithm_fixity_value_index(connection, self.table_name)
+
+        self.assertEqual(3, rows_written)
+        self.assertEqual(
+            [("1", "sha256Checksum123", "SHA256"), ("2", "md5Checksum234", "MD5"), ("3", "sha1Checksum345", "SHA1")],
+            connection.execute(f"SELECT * FROM {self.table_name};").fetchall()
+        )
+        progress_messages = [call.args[0] for call in print_func.call_args_list[1:]]
+        self.assertEqual(2, len(progress_messages))
+        self.assertTrue(progress_messages[0].startswith("2 rows added ("))
+        self.assertTrue(progress_messages[1].startswith("3 rows added ("))
+        self.assertEqual(False, connection.in_transaction)
+        self.assertEqual(
+            [("index_algorithm_fixity_value",)],
+            connection.execute("SELECT name FROM sqlite_master WHERE type = 'index';").fetchall()
+        )
+        self.assertIn("USING COVERING INDEX index_algorithm_fixity_value", connection.execute(
+            f"EXPLAIN QUERY PLAN SELECT fixity_value FROM {self.table_name} WHERE algorithm_name = ? AND "
+            "fixity_value = ?;", ("SHA256", "sha256Checksum123")
+        ).fetchone()[3])
+        connection.close()
+
+    def test_populate_table_should_write_fixity_values_as_bytes_and_algorithm_ids_if_schema_version_2(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, 2)
+        rows = (("1", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", "SHA256"),
+                ("2", "0B26E313ED4A7CA6904B0E9369E5B957", "MD5"), ("3", "not hex", "MD5"))
+
+        rows_written = populate_table(connection, self.table_name, iter(rows), print_func=Mock(), schema_version=2)
+
+        self.assertEqual(3, rows_written)
+        self.assertEqual(2, get_schema_version(connection.cursor(), self.table_name))
+        self.assertEqual([(1, "SHA256"), (2, "MD5")], connection.execute("SELECT * FROM algorithms;").fetchall())
+        self.assertEqual(
+            {("1", bytes.fromhex("e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249"), 1),
+             ("2", bytes.fromhex("0b26e313ed4a7ca6904b0e9369e5b957"), 2), ("3", "not hex", 2)},
+            set(connection.execute(f"SELECT file_ref, fixity_value, algorithm_id FROM {self.table_name};"))
+        )
+        connection.close()
+
+    def test_populate_table_should_write_the_file_sizes_if_the_table_has_a_file_size_column(self):
+        for schema_version in (1, 2):
+            connection = sqlite3.connect(":memory:")
+            create_checksum_table(connection, self.table_name, schema_version, with_file_sizes=True)
+            rows = get_csv_rows(self.csv_name, "FILEREF", "FIXITYVALUE", "ALGORITHMNAME", "FILESIZE")
+
+            populate_table(connection, self.table_name, rows, print_func=Mock(), schema_version=schema_version,
+                           with_file_sizes=True)
+            create_file_size_index(connection, self.table_name)
+
+            self.assertEqual({("1", 19), ("2", 0), ("3", None)},
+                             set(connection.execute(f"SELECT file_ref, file_size FROM {self.table_name};")))
+            self.assertIn(("index_file_size",),
+                          connection.execute("SELECT name FROM sqlite_master WHERE type = 'index';").fetchall())
+            connection.close()
+
+    def test_populate_table_should_write_the_fingerprints_if_the_table_has_a_fingerprint_column(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, with_fingerprints=True)
+        rows = get_csv_rows(self.csv_name, "FILEREF", "FIXITYVALUE", "ALGORITHMNAME", fingerprint_col="FINGERPRINT")
+
+        populate_table(connection, self.table_name, rows, print_func=Mock(), with_fingerprints=True)
+        create_fingerprint_index(connection, self.table_name)
+
+        self.assertEqual({("1", "abc123"), ("2", "def456"), ("3", None)},
+                         set(connection.execute(f"SELECT file_ref, fingerprint FROM {self.table_name};")))
+        self.assertIn(("index_fingerprint",),
+                      connection.execute("SELECT name FROM sqlite_master WHERE type = 'index';").fetchall())
+        connection.close()
+
+    def create_db_to_apply_delta_to(self, schema_version: int = 1) -> sqlite3.Connection:
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, schema_version)
+        rows = (("1", "aa11", "SHA256"), ("1", "bb22", "MD5"), ("2", "cc33", "SHA256"), ("3", "dd44", "SHA256"))
+        populate_table(connection, self.table_name, iter(rows), print_func=Mock(), schema_version=schema_version)
+        record_db_version(connection, "2026-09-01", "full_export.csv", len(rows))
+        return connection
+
+    def test_get_csv_rows_should_add_whether_each_row_is_a_deletion_if_a_delta_action_column_is_given(self):
+        with open(self.csv_name, "w", newline="") as csv_file:
+            csv_file.write("FILEREF,FIXITYVALUE,ALGORITHMNAME,ACTION\n1,aa11,SHA256,insert\n2,,,delete\n3,bb22,MD5,\n")
+
+        rows = get_csv_rows(self.csv_name, "FILEREF", "FIXITYVALUE", "ALGORITHMNAME", delta_action_col="ACTION")
+
+        self.assertEqual([("1", "aa11", "SHA256", False), ("2", "", "", True), ("3", "bb22", "MD5", False)],
+                         list(rows))
+
+    def test_apply_delta_should_upsert_and_delete_rows_in_order_and_record_the_watermark(self):
+        for schema_version in (1, 2):
+            connection = self.create_db_to_apply_delta_to(schema_version)
+            delta_rows = (("1", "ee55", "SHA256", False),  # replaces file 1's SHA256 but not its MD5
+                          ("2", "", "", True),  # all of file 2's checksums
+                          ("3", "dd44", "SHA256", True),
+                          ("3", "ff66", "SHA1", False),  # deleted and then re-ingested with a new algorithm
+                          ("4", "0077", "SHA512", False))
+
+            (rows_added, rows_deleted) = apply_delta(connection, self.table_name, iter(delta_rows), "2026-10-01",
+                                                     "delta.csv", batch_size=2, print_func=Mock())
+
+            self.assertEqual((3, 2), (rows_added, rows_deleted))
+            select_statement = (f"SELECT file_ref, algorithm_name FROM {self.table_name};" if schema_version == 1 else
+                                f"SELECT file_ref, algorithm_name FROM {self.table_name} NATURAL JOIN algorithms;")
+            self.assertEqual({("1", "SHA256"), ("1", "MD5"), ("3", "SHA1"), ("4", "SHA512")},
+                             set(connection.execute(select_statement)))
+            self.assertEqual("2026-10-01", get_latest_watermark(connection))
+            self.assertEqual([(2, "delta.csv", 3, 2)],
+                             connection.execute("SELECT version, source, rows_added, rows_deleted FROM db_versions "
+                                                "WHERE version = 2;").fetchall())
+            self.assertEqual({"SHA256": 1, "MD5": 1, "SHA1": 1, "SHA512": 1},
+                             get_algorithm_row_counts(connection, self.table_name))
+            self.assertIn(("index_file_ref",),
+                          connection.execute("SELECT name FROM sqlite_master WHERE type = 'index';").fetchall())
+            connection.close()
+
+    def test_apply_delta_should_normalise_the_rows_of_a_db_converted_before_they_were_normalised_first(self):
+        for schema_version in (1, 2):
+            connection = sqlite3.connect(":memory:")
+            create_checksum_table(connection, self.table_name, schema_version)
+            with connection:  # the way the converter used to write them, without db_versions
+                if schema_version == 2:
+                    connection.executemany("INSERT INTO algorithms (algorithm_id, algorithm_name) VALUES (?, ?);",
+                                           ((1, "sha-256"), (2, "SHA256"), (3, "md5")))
+                    connection.executemany(f"INSERT INTO {self.table_name} (file_ref, fixity_value, algorithm_id) "
+                                           "VALUES (?, ?, ?);", (("1", b"\xaa", 1), ("2", b"\xbb", 2), ("3", b"\xcc", 3)))
+                else:
+                    connection.executemany(f"INSERT INTO {self.table_name} VALUES (?, ?, ?);",
+                                           (("1", "AA", "sha-256"), ("2", "bb", "SHA256"), ("3", "Not Hex", "md5")))
+            delta_rows = (("1", "", "SHA256", True), ("3", "dd", "MD5", False))
+
+            (rows_added, rows_deleted) = apply_delta(connection, self.table_name, iter(delta_rows), "2026-10-01",
+                                                     print_func=Mock())
+
+            self.assertEqual((1, 1), (rows_added, rows_deleted))
+            select_statement = (f"SELECT file_ref, algorithm_name FROM {self.table_name};" if schema_version == 1 else
+                                f"SELECT file_ref, algorithm_name FROM {self.table_name} NATURAL JOIN algorithms;")
+            self.assertEqual({("2", "SHA256"), ("3", "MD5")}, set(connection.execute(select_statement)))
+            self.assertEqual({"SHA256": 1, "MD5": 1}, get_algorithm_row_counts(connection, self.table_name))
+            connection.close()
+
+    def test_normalise_existing_rows_should_lower_case_hex_fixity_values_and_normalise_algorithm_names(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name)
+        connection.executemany(f"INSERT INTO {self.table_name} VALUES (?, ?, ?);",
+                               (("1", "0B26E313ED4A7CA6", "sha-256"), ("2", "Not Hex", "Md5"), ("3", "ABC", "SHA1")))
+
+        normalise_existing_rows(connection, self.table_name, print_func=Mock())
+
+        self.assertEqual([("1", "0b26e313ed4a7ca6", "SHA256"), ("2", "Not Hex", "MD5"), ("3", "ABC", "SHA1")],
+                         connection.execute(f"SELECT * FROM {self.table_name};").fetchall())
+        connection.close()
+
+    def test_update_algorithm_stats_should_record_the_number_of_rows_for_each_algorithm(self):
+        for schema_version in (1, 2):
+            connection = self.create_db_to_apply_delta_to(schema_version)
+            self.assertIsNone(get_algorithm_row_counts(connection, self.table_name))
+
+            update_algorithm_stats(connection, self.table_name, schema_version)
+
+            self.assertEqual({"SHA256": 3, "MD5": 1}, get_algorithm_row_counts(connection, self.table_name))
+            self.assertIsNone(get_algorithm_row_counts(connection, "another_table"))
+            connection.close()
+
+    def test_apply_delta_should_raise_an_error_if_the_watermark_is_not_later_than_the_dbs(self):
+        connection = self.create_db_to_apply_delta_to()
+
+        with self.assertRaises(ValueError) as error:
+            apply_delta(connection, self.table_name, iter([("5", "aa11", "SHA256", False)]), "2026-09-01",
+                        print_func=Mock())
+
+        self.assertIn("already up to '2026-09-01'", str(error.exception))
+        self.assertEqual(4, connection.execute(f"SELECT COUNT(*) FROM {self.table_name};").fetchone()[0])
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
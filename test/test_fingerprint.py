@@ -0,0 +1,41 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from helpers.fingerprint import get_fingerprint, get_sample_size
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "file.bin")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, contents: bytes) -> None:
+        with open(self.file_path, "wb") as file:
+            file.write(contents)
+
+    def test_get_fingerprint_should_only_read_the_start_and_end_of_a_file(self):
+        self.write_file(b"start" + b"middle" + b"end..")
+
+        self.assertEqual(f"5:{hashlib.sha256(b"16:start" + b"end..").hexdigest()}", get_fingerprint(self.file_path, 5))
+
+    def test_get_fingerprint_should_not_read_any_bytes_twice_if_the_file_is_smaller_than_2_samples(self):
+        self.write_file(b"1234567")
+
+        self.assertEqual(f"5:{hashlib.sha256(b"7:1234567").hexdigest()}", get_fingerprint(self.file_path, 5))
+        self.write_file(b"123")
+        self.assertEqual(f"5:{hashlib.sha256(b"3:123").hexdigest()}", get_fingerprint(self.file_path, 5))
+
+    def test_get_sample_size_should_return_the_sample_size_the_fingerprint_was_taken_with(self):
+        self.write_file(b"123")
+
+        self.assertEqual((5, None, None), (get_sample_size(get_fingerprint(self.file_path, 5)),
+                                           get_sample_size(hashlib.sha256(b"3:123").hexdigest()), get_sample_size("")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from helpers.hash_cache import HashCache
+from holding_verification_core import HoldingVerificationCore
+
+
+class TestHashCache(unittest.TestCase):
+    checksums = {"sha256": "sha256Checksum123", "md5": "md5Checksum234", "sha1": "sha1Checksum345"}
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.hash_cache = HashCache(os.path.join(self.temp_dir.name, "hash_cache.db"), max_entries=2)
+        self.file_path = os.path.join(self.temp_dir.name, "file.txt")
+        with open(self.file_path, "w") as file:
+            file.write("content")
+
+    def tearDown(self):
+        self.hash_cache.close()
+        self.temp_dir.cleanup()
+
+    def test_get_should_only_return_the_checksums_if_the_file_has_not_changed_since_they_were_put(self):
+        self.hash_cache.start_run()
+        file_stat = os.stat(self.file_path)
+        self.assertEqual(None, self.hash_cache.get(self.file_path, file_stat))
+
+        self.hash_cache.put(self.file_path, file_stat, self.checksums)
+        self.assertEqual(self.checksums, self.hash_cache.get(self.file_path, file_stat))
+
+        with open(self.file_path, "a") as file:
+            file.write(" that has changed")
+        self.assertEqual(None, self.hash_cache.get(self.file_path, os.stat(self.file_path)))
+        self.assertEqual((1, 2), (self.hash_cache.hits, self.hash_cache.misses))
+
+    def test_end_run_should_evict_the_files_seen_least_recently_if_there_are_more_than_max_entries(self):
+        file_stat = os.stat(self.file_path)
+        for path in ("a", "b"):
+            self.hash_cache.start_run()
+            self.hash_cache.put(path, file_stat, self.checksums)
+            self.hash_cache.end_run()
+
+        self.hash_cache.start_run()
+        self.hash_cache.get("a", file_stat)
+        self.hash_cache.put("c", file_stat, self.checksums)
+        self.hash_cache.end_run()
+
+        paths_in_cache = {path for (path,) in self.hash_cache.connection.execute("SELECT path FROM file_hashes;")}
+        self.assertEqual({"a", "c"}, paths_in_cache)
+
+    def test_changes_should_be_written_in_short_transactions_so_that_runs_at_the_same_time_can_share_the_cache(self):
+        now = [0.0]
+        hash_cache = HashCache(self.hash_cache.file_name, clock=lambda: now[0])
+        other_hash_cache = HashCache(self.hash_cache.file_name, clock=lambda: 0.0)
+        other_hash_cache.connection.execute("PRAGMA busy_timeout = 0;")  # fail at once rather than wait, if locked
+        file_stat = os.stat(self.file_path)
+
+        hash_cache.start_run()
+        hash_cache.put("a", file_stat, self.checksums)
+        self.assertEqual(self.checksums, hash_cache.get("a", file_stat))  # from the changes not written yet
+        self.assertFalse(hash_cache.connection.in_transaction)
+        self.assertEqual(None, other_hash_cache.get("a", file_stat))
+
+        other_hash_cache.start_run()
+        other_hash_cache.put("b", file_stat, self.checksums)
+        other_hash_cache.write()  # would raise "database is locked" if the first cache held a transaction open
+        now[0] = 1.5
+        hash_cache.put("c", file_stat, self.checksums)  # more than WRITE_EVERY_SECONDS after the last write
+
+        self.assertEqual(self.checksums, other_hash_cache.get("a", file_stat))
+        self.assertEqual(self.checksums, hash_cache.get("b", file_stat))
+        hash_cache.close()
+        other_hash_cache.close()
+
+    def test_hash_files_should_only_hash_files_that_are_not_in_the_hash_cache(self):
+        holding_verification = HoldingVerificationCore(Mock(), "files_in_dri", hash_cache=self.hash_cache)
+        holding_verification.get_checksums_for_file = Mock(wraps=holding_verification.get_checksums_for_file)
+        other_file_path = os.path.join(self.temp_dir.name, "other_file.txt")
+        with open(other_file_path, "w") as file:
+            file.write("other content")
+
+        self.hash_cache.start_run()
+        first_run_results = list(holding_verification.hash_files(((self.file_path, None),)))
+        self.hash_cache.start_run()
+        second_run_results = list(holding_verification.hash_files(
+            HoldingVerificationCore.get_files((self.file_path, other_file_path), False)
+        ))
+
+        self.assertEqual(2, holding_verification.get_checksums_for_file.call_count)
+        self.assertEqual(first_run_results[0], second_run_results[0])
+        self.assertEqual((1, 1), (self.hash_cache.hits, self.hash_cache.misses))
+
+
+if __name__ == "__main__":
+    unittest.main()
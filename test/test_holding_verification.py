@@ -0,0 +1,111 @@
+import configparser
+import csv
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import holding_verification
+
+
+class TestHoldingVerificationHeadless(unittest.TestCase):
+    table_name = "files_in_dri"
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_file_name = os.path.join(self.temp_dir.name, "checksums.db")
+        connection = sqlite3.connect(self.db_file_name)
+        connection.execute(f"CREATE TABLE {self.table_name} (file_ref, fixity_value, algorithm_name);")
+        connection.execute(f"INSERT INTO {self.table_name} VALUES "
+                           "('1', 'e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249', 'SHA256');")
+        connection.commit()
+        connection.close()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_main(self, *args):
+        with patch("sys.argv", ["holding_verification.py", *args]), patch("builtins.print"), \
+                patch("builtins.input", side_effect=AssertionError("should not prompt")):
+            return holding_verification.main()
+
+    def test_parse_args_should_exit_with_an_error_if_a_path_does_not_exist(self):
+        with patch("sys.stderr"), self.assertRaises(SystemExit) as exit_error:
+            holding_verification.parse_args(["test/test_files", "test/non_existent_folder"])
+        self.assertEqual(holding_verification.EXIT_INVALID_ARGUMENTS, exit_error.exception.code)
+
+    def test_main_should_process_the_paths_without_prompting_and_write_the_csv_to_the_output_dir(self):
+        exit_code = self.run_main("test/test_files", "test/test_files2/testFile2.txt", "--db", self.db_file_name,
+                                  "--table", self.table_name, "--output-dir", self.temp_dir.name, "--prefix", "job 1",
+                                  "--no-cache", "--workers", "2")
+
+        self.assertEqual(holding_verification.EXIT_SUCCESS, exit_code)
+        [csv_name] = Path(self.temp_dir.name).glob("job_1_INGESTED_FILES_in_test_files_AND_testFile2.txt_*.csv")
+        self.assertNotIn("_IN_PROGRESS", csv_name.name)
+        with open(csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(4, len(rows))
+        self.assertEqual(
+            {os.path.abspath("test/test_files/testFile.txt"): "True",
+             os.path.abspath("test/test_files2/testFile2.txt"): "True"},
+            {row["Local File Path"]: row["In Preservica/DRI"] for row in rows if row["In Preservica/DRI"] == "True"}
+        )
+
+    def test_main_should_only_add_the_results_to_the_results_db_and_query_should_export_them(self):
+        results_db_name = os.path.join(self.temp_dir.name, "results.db")
+        export_csv_name = os.path.join(self.temp_dir.name, "held.csv")
+
+        exit_code = self.run_main("test/test_files", "--db", self.db_file_name, "--table", self.table_name,
+                                  "--output-dir", self.temp_dir.name, "--prefix", "", "--no-cache",
+                                  "--results-db", results_db_name, "--no-csv")
+        with patch("sys.argv", ["holding_verification.py", "query", "--results-db", results_db_name, "--status",
+                                "held", "--output", export_csv_name]), patch("builtins.print"):
+            query_exit_code = holding_verification.main()
+
+        self.assertEqual((holding_verification.EXIT_SUCCESS, holding_verification.EXIT_SUCCESS),
+                         (exit_code, query_exit_code))
+        self.assertEqual([], list(Path(self.temp_dir.name).glob("INGESTED_FILES*.csv")))
+        with open(export_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual([("1", os.path.abspath("test/test_files/testFile.txt"))],
+                         [(row["Run ID"], row["Local File Path"]) for row in rows])
+
+    def test_get_run_settings_should_let_the_arguments_override_the_config(self):
+        config = configparser.ConfigParser()
+        config.read_dict({"DEFAULT": {"HASHING_WORKERS": "4", "DETECT_DUPLICATES": "true", "WRITE_CSV": "true",
+                                      "FINGERPRINT_SAMPLE_SIZE": "1024"}})
+        args = holding_verification.parse_args(["test/test_files", "--workers", "2", "--no-duplicates", "--no-csv"])
+
+        settings = holding_verification.get_run_settings(args, config, self.db_file_name)
+
+        self.assertEqual(2, settings.hashing_workers)
+        self.assertFalse(settings.detect_duplicates)
+        self.assertFalse(settings.write_csv)
+        self.assertEqual(1024, settings.fingerprint_sample_size)
+
+    def test_main_should_keep_the_bloom_filter_in_the_same_folder_as_the_db(self):
+        exit_code = self.run_main("test/test_files", "--db", self.db_file_name, "--table", self.table_name,
+                                  "--output-dir", self.temp_dir.name, "--prefix", "", "--no-cache", "--bloom-filter")
+
+        self.assertEqual(holding_verification.EXIT_SUCCESS, exit_code)
+        self.assertEqual(1, len(list(Path(self.temp_dir.name).glob("*.bloom"))))
+        self.assertEqual([], list(Path(".").glob("*.bloom")))
+
+    def test_main_should_return_an_error_code_if_the_db_does_not_exist(self):
+        exit_code = self.run_main("test/test_files", "--db", os.path.join(self.temp_dir.name, "missing.db"))
+
+        self.assertEqual(holding_verification.EXIT_DB_MISSING, exit_code)
+
+    def test_main_should_return_the_run_failed_code_rather_than_crashing_if_the_run_fails(self):
+        with patch("holding_verification_core.HoldingVerificationCore.run", side_effect=OSError("disk full")):
+            exit_code = self.run_main("test/test_files", "--db", self.db_file_name, "--table", self.table_name,
+                                      "--output-dir", self.temp_dir.name, "--prefix", "", "--no-cache")
+
+        self.assertEqual(holding_verification.EXIT_RUN_FAILED, exit_code)
+        self.assertNotIn(exit_code, (1, holding_verification.EXIT_FILE_ERRORS))
+
+
+if __name__ == "__main__":
+    unittest.main()
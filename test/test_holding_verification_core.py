@@ -1,13 +1,21 @@
 import configparser
 import csv
+import hashlib
 from collections import defaultdict
 from datetime import datetime
 import os
 from pathlib import Path
+import sqlite3
+import tempfile
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
-from holding_verification_core import HoldingVerificationCore, check_db_exists
+from convert_checksum_csv_to_sqlite import populate_table
+from helpers.checksum_db import create_checksum_table, update_algorithm_stats
+from helpers.fingerprint import get_fingerprint
+from helpers.result_sinks import CsvResultSink, read_checkpoint
+from holding_verification_core import (READ_STRATEGIES, HoldingVerificationCore, InMemoryChecksumIndex, ReadSettings,
+                                       RunSettings, check_db_exists)
 
 
 def read_csv_header(csv_name):
@@ -16,7 +24,15 @@ def read_csv_header(csv_name):
         return dict_reader.fieldnames
 
 expected_csv_header = ["Local File Path", "File Size (Bytes)", "In Preservica/DRI", "SHA256 Hash", "Matching File Refs",
-                       "Matching Algorithm Name", "Matching Algorithm Hash"]
+                       "Matching Algorithm Name", "Matching Algorithm Hash", "Fast Reject",
+                       "Duplicate Of"]
+
+def create_checksum_db(table_name, rows: tuple[tuple[str, str, str], ...]):
+    connection = sqlite3.connect(":memory:")
+    connection.execute(f"CREATE TABLE {table_name} (file_ref, fixity_value, algorithm_name);")
+    connection.executemany(f"INSERT INTO {table_name} (file_ref, fixity_value, algorithm_name) VALUES (?, ?, ?);", rows)
+    connection.execute(f"CREATE INDEX index_fixity_value ON {table_name} (fixity_value ASC)")
+    return connection
 
 def expected_csv_name(expected_file_name_dirs, expected_date, string_to_append: str = "_IN_PROGRESS"):
     return f"INGESTED_FILES_in_{expected_file_name_dirs}_{expected_date}{string_to_append}.csv"
@@ -48,17 +64,18 @@ class TestHoldingVerification(unittest.TestCase):
             super().__init__(Mock(), table_name)
 
             self.checksum_for_file = {"sha256": "sha256Checksum123", "md5": "md5Checksum234", "sha1": "sha1Checksum345"}
-            self.errors_when_getting_checksum_for_file = iter(({}, {}, {}))
+            self.errors_when_getting_checksum_for_file = iter(({},))
             self.checksum_in_db = iter(checksum_in_db_return_vals)
             self.checksum_for_file_calls = 0
             self.checksum_in_db_calls = 0
             self.options = iter(["c", "f"])
 
-        def get_checksum_for_file(self, file_path: str, hash_func) -> tuple[str, dict[str, str]]:
+        def get_checksums_for_file(self, file_path: str, hash_names) -> tuple[dict[str, str], dict[str, str]]:
             self.checksum_for_file_calls += 1
-            return self.checksum_for_file[hash_func.name], next(self.errors_when_getting_checksum_for_file)
+            checksums = {hash_name: self.checksum_for_file[hash_name] for hash_name in hash_names}
+            return checksums, next(self.errors_when_getting_checksum_for_file)
 
-        def find_checksum_in_db(self, file_hash: str) -> list[list[str]]:
+        def find_checksum_in_db(self, file_hash: str, hash_name: str = "") -> list[list[str]]:
             self.checksum_in_db_calls += 1
             return next(self.checksum_in_db)
 
@@ -73,7 +90,7 @@ class TestHoldingVerification(unittest.TestCase):
             self.errors_generating_checksum = errors_generating_checksum
             self.next_hash_name = next_hash_name
 
-        def get_rows_with_hash(self, file_path: str, hash_name: str):
+        def get_rows_with_hash(self, file_path: str, hash_name: str, checksums_and_errors=None):
             return (self.sha256_hash, self.rows_with_hash, self.checksum_found, self.errors_generating_checksum,
                     self.next_hash_name)
 
@@ -89,6 +106,11 @@ class TestHoldingVerification(unittest.TestCase):
             self.run_args = Mock()
             self.print = Mock()
             self.create_csv = create_csv
+            self.find_checksums_in_db_args = Mock()
+
+        def find_checksums_in_db(self, file_hashes) -> dict[str, list[list[str]]]:
+            self.find_checksums_in_db_args(list(file_hashes))
+            return {}
 
         def get_csv_output_writer_and_file_name(self, dirs: str,
                                                 date: str = datetime.fromtimestamp(2147483648).strftime("%d-%m-%Y-%H_%M_%S")):
@@ -107,15 +129,17 @@ class TestHoldingVerification(unittest.TestCase):
 
             return self.csv_file, self.csv_writer, output_csv_name
 
-        def run(self, path, file_hash_name, all_file_errors: list[dict[str, str]], csv_writer, tally):
+        def run(self, path, file_hash_name, all_file_errors: list[dict[str, str]], csv_writer, tally,
+                checksums_and_errors=None, file_stat=None):
             self.run_args(path, file_hash_name, all_file_errors, csv_writer, tally)
             return "sha256", [], {True: 1}
 
     def test_get_csv_output_writer_and_file_name_should_append_csv_prefix_to_csv_name(self):
         dirs = "test_files"
         mock_db_connection = Mock()
-        csv_file, csv_writer, output_csv_name = HoldingVerificationCore(
-            mock_db_connection, self.table_name, "csv_prefix").get_csv_output_writer_and_file_name(
+        app_core = HoldingVerificationCore(mock_db_connection, self.table_name,
+                                           RunSettings(csv_file_name_prefix="csv_prefix"))
+        csv_file, csv_writer, output_csv_name = app_core.get_csv_output_writer_and_file_name(
             dirs, datetime.fromtimestamp(2147483648).strftime("%d-%m-%Y-%H_%M_%S")
         )
         csv_name = csv_file.name
@@ -140,7 +164,7 @@ class TestHoldingVerification(unittest.TestCase):
 
         expected_csv_file_name = "INGESTED_FILES_in_test_files_19-01-2038-03_14_08_IN_PROGRESS.csv"
         self.assertEqual(expected_csv_file_name, csv_name)
-        self.assertEqual(True, csv_writer.__str__().startswith("<_csv.writer object"))
+        self.assertIsInstance(csv_writer, CsvResultSink)
         self.assertEqual(expected_csv_file_name, output_csv_name)
         self.assertEqual(os.path.exists(expected_csv_file_name), True)
         actual_csv_header = read_csv_header(csv_name)
@@ -189,19 +213,283 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual("", file_hex)
         self.assertEqual({self.test_file: "OS Error thrown"}, errors)
 
+    def test_get_checksums_for_file_should_return_a_checksum_for_each_hash_name_from_a_single_read(self):
+        mock_db_connection = Mock()
+        holding_verification = HoldingVerificationCore(mock_db_connection, self.table_name)
+        holding_verification.BUFFER_SIZE = 4  # forces the file to be read in multiple chunks
+        open_calls = Mock(side_effect=open)
+
+        with patch("builtins.open", open_calls):
+            (checksums, errors) = holding_verification.get_checksums_for_file(self.test_file, ("sha256", "md5", "sha1"))
+
+        self.assertEqual(1, open_calls.call_count)
+        self.assertEqual(
+            {"sha256": "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249",
+             "md5": "0b26e313ed4a7ca6904b0e9369e5b957",
+             "sha1": "91b7b0b1e27bfbf7bc646946f35fa972c47c2d32"},
+            checksums
+        )
+        self.assertEqual({}, errors)
+
+    def test_get_checksums_for_file_should_return_the_same_checksums_whichever_read_strategy_is_used(self):
+        expected_checksums = {"sha256": "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249",
+                              "md5": "0b26e313ed4a7ca6904b0e9369e5b957"}
+        expected_empty_file_checksums = {"sha256": hashlib.sha256().hexdigest(), "md5": hashlib.md5().hexdigest()}
+
+        for read_strategy in READ_STRATEGIES:
+            holding_verification = HoldingVerificationCore(
+                Mock(), self.table_name, settings=RunSettings(read_settings=ReadSettings(4, read_strategy))
+            )
+
+            self.assertEqual((expected_checksums, {}),
+                             holding_verification.get_checksums_for_file(self.test_file, ("sha256", "md5")))
+            # an empty file can't be memory-mapped, so it's read instead
+            self.assertEqual((expected_empty_file_checksums, {}),
+                             holding_verification.get_checksums_for_file(self.empty_test_file, ("sha256", "md5")))
+
+    def test_get_read_settings_should_return_the_settings_for_the_longest_path_that_the_file_is_in(self):
+        holding_verification = HoldingVerificationCore(Mock(), self.table_name, settings=RunSettings(
+            read_settings=ReadSettings(1_000, "read"),
+            read_settings_by_path={"test": ReadSettings(2_000, "readinto"),
+                                   self.test_files_folder: ReadSettings(3_000, "mmap")}
+        ))
+
+        self.assertEqual(ReadSettings(3_000, "mmap"), holding_verification.get_read_settings(self.test_file))
+        self.assertEqual(ReadSettings(2_000, "readinto"),
+                         holding_verification.get_read_settings(os.path.join(self.test_files_folder2, "testFile2.txt")))
+        self.assertEqual(ReadSettings(1_000, "read"), holding_verification.get_read_settings("testing/file.txt"))
+
+    def test_get_checksums_for_file_should_return_empty_checksums_and_an_os_error_if_thrown(self):
+        mock_db_connection = Mock()
+        missing_file = os.path.normpath("test/test_files/missingFile.txt")
+
+        (checksums, errors) = HoldingVerificationCore(mock_db_connection, self.table_name).get_checksums_for_file(
+            missing_file, ("sha256", "md5")
+        )
+
+        self.assertEqual({"sha256": "", "md5": ""}, checksums)
+        self.assertEqual([missing_file], list(errors))
+
+    def test_get_rows_with_hash_should_not_query_db_if_error_was_thrown_when_getting_checksums(self):
+        mock_holding_verification = self.HVWithMockedChecksumMethods(self.table_name, ())
+        mock_holding_verification.errors_when_getting_checksum_for_file = iter(({self.test_file: "OS Error thrown"},))
+        (sha256_hash, rows_with_hash, checksum_found, errors, next_hash_name) = mock_holding_verification.get_rows_with_hash(
+            self.test_file, "sha256"
+        )
+
+        self.assertEqual([], rows_with_hash)
+        self.assertEqual(False, checksum_found)
+        self.assertEqual({self.test_file: "OS Error thrown"}, errors)
+        self.assertEqual("", next_hash_name)
+        self.assertEqual(0, mock_holding_verification.checksum_in_db_calls)
+
+    def test_hash_files_should_yield_the_same_results_in_the_same_order_regardless_of_the_number_of_workers(self):
+        files = list(HoldingVerificationCore.get_files(
+            (self.test_files_folder, self.test_files_folder2, self.test_files_folder3), True
+        ))
+        serial_results = list(HoldingVerificationCore(Mock(), self.table_name).hash_files(files))
+
+        for hashing_pool in ("thread", "process"):
+            holding_verification = HoldingVerificationCore(
+                Mock(), self.table_name, settings=RunSettings(hashing_workers=3, hashing_pool=hashing_pool)
+            )
+            holding_verification.MAX_PENDING_FILES_PER_WORKER = 1
+            parallel_results = list(holding_verification.hash_files(files))
+
+            self.assertEqual(6, len(parallel_results))
+            self.assertEqual(serial_results, parallel_results)
+
     def test_find_checksum_in_db_should_use_correct_sql_query_and_return_list_of_results(self):
         cursor = Mock()
         cursor.execute = Mock()
         cursor.fetchall = Mock(return_value=["result1", "result2"])
         mock_db_connection = Mock()
         mock_db_connection.cursor = Mock(return_value=cursor)
+        mock_db_connection.execute.return_value.fetchone.return_value = None  # the DB has no algorithm stats
 
         response = HoldingVerificationCore(mock_db_connection, self.table_name).find_checksum_in_db("mock_hash")
         cursor.execute.assert_called_with(
-            """SELECT file_ref, fixity_value, algorithm_name FROM files_in_dri WHERE "fixity_value" = "mock_hash";""")
+            """SELECT file_ref, fixity_value, algorithm_name FROM files_in_dri WHERE "fixity_value" = ?;""",
+            ("mock_hash",)
+        )
         self.assertEqual(["result1", "result2"], response)
 
-    def test_get_rows_with_hash_should_call_other_methods_1X_if_it_starts_with_sha256_and_sha256_checksum_found(self):
+    def test_find_checksums_in_db_should_return_the_rows_for_each_checksum_using_one_query_per_batch(self):
+        connection = create_checksum_db(self.table_name, (
+            ("1", "sha256Checksum123", "SHA256"), ("10", "sha256Checksum123", "SHA256"), ("2", "md5Checksum234", "MD5")
+        ))
+        holding_verification = HoldingVerificationCore(connection, self.table_name)
+        holding_verification.MAX_SQL_VARIABLES = 2
+        holding_verification.cursor = Mock(wraps=connection.cursor())
+
+        rows_by_checksum = holding_verification.find_checksums_in_db(
+            [("sha256", "sha256Checksum123"), ("md5", "md5Checksum234"), ("sha1", "sha1Checksum345"),
+             ("sha256", "sha256Checksum123")]
+        )
+
+        select_calls = [call for call in holding_verification.cursor.execute.call_args_list
+                        if call.args[0].startswith("SELECT")]
+        self.assertEqual(2, len(select_calls))
+        self.assertEqual(
+            {"sha256Checksum123": [("1", "sha256Checksum123", "SHA256"), ("10", "sha256Checksum123", "SHA256")],
+             "md5Checksum234": [("2", "md5Checksum234", "MD5")],
+             "sha1Checksum345": []},
+            rows_by_checksum
+        )
+        connection.close()
+
+    def test_find_checksums_in_db_should_look_up_each_algorithms_checksums_among_its_rows_if_the_db_has_stats(self):
+        sha256_checksum = "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249"
+        md5_checksum = "0b26e313ed4a7ca6904b0e9369e5b957"
+        for schema_version in (1, 2):
+            connection = sqlite3.connect(":memory:")
+            create_checksum_table(connection, self.table_name, schema_version)
+            populate_table(connection, self.table_name, iter((
+                ("1", sha256_checksum, "SHA256"), ("2", md5_checksum, "MD5"), ("3", f"{3:032x}", "MD5")
+            )), print_func=Mock(), schema_version=schema_version)
+            update_algorithm_stats(connection, self.table_name, schema_version)
+            holding_verification = HoldingVerificationCore(connection, self.table_name,
+                                                           progress_reporter=Mock())
+            holding_verification.cursor = Mock(wraps=connection.cursor())
+
+            rows_by_checksum = holding_verification.find_checksums_in_db(
+                (("sha256", sha256_checksum), ("md5", md5_checksum), ("sha1", f"{1:040x}"), ("sha256", f"{3:032x}"))
+            )
+
+            self.assertEqual({"sha256": 1, "md5": 2, "sha1": 0}, holding_verification.algorithm_row_counts)
+            self.assertEqual(
+                {sha256_checksum: [("1", sha256_checksum, "SHA256")], md5_checksum: [("2", md5_checksum, "MD5")],
+                 f"{1:040x}": [], f"{3:032x}": []},  # the last one is an MD5 in the DB, but was given as a SHA256
+                rows_by_checksum
+            )
+            select_params = [call.args[1][0] for call in holding_verification.cursor.execute.call_args_list
+                             if call.args[0].startswith("SELECT")]
+            self.assertEqual(["SHA256", "MD5"], select_params)  # no query for SHA1, as the DB has no SHA1 rows
+            self.assertEqual([], holding_verification.find_checksum_in_db(f"{1:040x}", "sha1"))
+            self.assertEqual([("2", md5_checksum, "MD5")],
+                             holding_verification.find_checksum_in_db(md5_checksum, "md5"))
+            connection.close()
+
+    def test_get_hash_lookup_order_should_put_the_algorithms_with_the_most_rows_first_and_skip_any_without_rows(self):
+        holding_verification = HoldingVerificationCore(Mock(), self.table_name)
+        self.assertEqual(["sha256", "md5", "sha1"], holding_verification.get_hash_lookup_order(""))
+        self.assertEqual(["md5", "sha256", "sha1"], holding_verification.get_hash_lookup_order("md5"))
+
+        holding_verification.algorithm_row_counts = {"sha256": 10, "md5": 30, "sha1": 0}
+
+        self.assertEqual(["md5", "sha256"], holding_verification.get_hash_lookup_order(""))
+        self.assertEqual(["sha256", "md5"], holding_verification.get_hash_lookup_order("sha256"))
+        self.assertEqual(["md5", "sha256"], holding_verification.get_hash_lookup_order("sha1"))
+
+    def test_find_checksum_in_db_methods_should_return_rows_with_hex_fixity_values_if_db_uses_schema_version_2(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, 2)
+        populate_table(connection, self.table_name, iter((
+            ("1", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", "SHA256"),
+            ("2", "0B26E313ED4A7CA6904B0E9369E5B957", "MD5")
+        )), print_func=Mock(), schema_version=2)
+        holding_verification = HoldingVerificationCore(
+            connection, self.table_name, settings=RunSettings(use_in_memory_index=True)
+        )
+
+        self.assertEqual(
+            [("2", "0b26e313ed4a7ca6904b0e9369e5b957", "MD5")],
+            holding_verification.find_checksum_in_db("0b26e313ed4a7ca6904b0e9369e5b957")
+        )
+        self.assertEqual(
+            {"e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249": [
+                ("1", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", "SHA256")
+            ], "91b7b0b1e27bfbf7bc646946f35fa972c47c2d32": []},
+            holding_verification.find_checksums_in_db(
+                (("sha256", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249"),
+                 ("sha1", "91b7b0b1e27bfbf7bc646946f35fa972c47c2d32"))
+            )
+        )
+        self.assertEqual(2, holding_verification.schema_version)
+        connection.close()
+
+    def test_in_memory_checksum_index_should_only_contain_the_hex_fixity_values_it_was_created_with(self):
+        index = InMemoryChecksumIndex((
+            "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", "0b26e313ed4a7ca6904b0e9369e5b957",
+            "91b7b0b1e27bfbf7bc646946f35fa972c47c2d32", "d41d8cd98f00b204e9800998ecf8427e", "not a hex value", None
+        ))
+
+        self.assertEqual(4, len(index))
+        self.assertEqual({16, 20, 32}, set(index.packed_digests))
+        self.assertIn("0b26e313ed4a7ca6904b0e9369e5b957", index)
+        self.assertIn("D41D8CD98F00B204E9800998ECF8427E", index)
+        self.assertIn("91b7b0b1e27bfbf7bc646946f35fa972c47c2d32", index)
+        self.assertIn("e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", index)
+        self.assertNotIn("00000000000000000000000000000000", index)
+        self.assertNotIn("ffffffffffffffffffffffffffffffff", index)
+        self.assertNotIn("0b26e313ed4a7ca6904b0e9369e5b95", index)
+        self.assertNotIn("not a hex value", index)
+        self.assertNotIn("", index)
+
+    def test_in_memory_checksum_index_from_db_should_pack_the_sorted_digests_without_duplicates(self):
+        connection = create_checksum_db(self.table_name, (
+            ("1", "E2D0FE1585A63EC6009C8016FF8DDA8B17719A637405A4E23C0FF81339148249", "SHA256"),
+            ("2", "0b26e313ed4a7ca6904b0e9369e5b957", "MD5"),
+            ("3", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", "SHA256"),
+            ("4", "d41d8cd98f00b204e9800998ecf8427e", "MD5"),
+            ("5", "0B26E313ED4A7CA6904B0E9369E5B957", "MD5"),
+            ("6", "not a hex value", "MD5"),
+        ))
+
+        index = InMemoryChecksumIndex.from_db(connection.cursor(), self.table_name)
+
+        self.assertEqual(3, len(index))
+        self.assertEqual(
+            {16: bytes.fromhex("0b26e313ed4a7ca6904b0e9369e5b957d41d8cd98f00b204e9800998ecf8427e"),
+             32: bytes.fromhex("e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249")},
+            index.packed_digests
+        )
+        connection.close()
+
+    def test_find_checksums_in_db_should_only_query_db_for_checksums_in_the_in_memory_index(self):
+        connection = create_checksum_db(self.table_name, (
+            ("1", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", "SHA256"),
+        ))
+        holding_verification = HoldingVerificationCore(
+            connection, self.table_name, settings=RunSettings(use_in_memory_index=True)
+        )
+        holding_verification.cursor = Mock(wraps=connection.cursor())
+        not_in_db = "0b26e313ed4a7ca6904b0e9369e5b957"
+
+        rows_by_checksum = holding_verification.find_checksums_in_db((("md5", not_in_db),))
+        self.assertEqual({not_in_db: []}, rows_by_checksum)
+        self.assertEqual(0, holding_verification.cursor.execute.call_count)
+        self.assertEqual([], holding_verification.find_checksum_in_db(not_in_db))
+        self.assertEqual(0, holding_verification.cursor.execute.call_count)
+
+        rows_by_checksum = holding_verification.find_checksums_in_db(
+            (("md5", not_in_db), ("sha256", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249"))
+        )
+        self.assertEqual(
+            {not_in_db: [], "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249": [
+                ("1", "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249", "SHA256")
+            ]},
+            rows_by_checksum
+        )
+        ((_, params), _) = holding_verification.cursor.execute.call_args
+        self.assertEqual(("e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249",), params)
+        connection.close()
+
+    def test_get_rows_with_hash_should_use_prefetched_rows_instead_of_querying_db(self):
+        mock_holding_verification = self.HVWithMockedChecksumMethods(self.table_name, ())
+        mock_holding_verification.rows_by_checksum = {
+            "sha256Checksum123": [], "md5Checksum234": [["2", "md5Checksum234", "md5"]], "sha1Checksum345": []
+        }
+        (sha256_hash, rows_with_hash, checksum_found, errors, next_hash_name) = mock_holding_verification.get_rows_with_hash(
+            self.test_file, "sha256"
+        )
+
+        self.assertEqual([["2", "md5Checksum234", "md5"]], rows_with_hash)
+        self.assertEqual(True, checksum_found)
+        self.assertEqual("md5", next_hash_name)
+        self.assertEqual(0, mock_holding_verification.checksum_in_db_calls)
+
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_1X_if_it_starts_with_sha256_and_sha256_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([["1", "sha256Checksum123", "sha256"]],)
         )
@@ -218,7 +506,7 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(1, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_2X_if_it_starts_with_sha256_but_md5_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_2X_if_it_starts_with_sha256_but_md5_checksum_found(self):
 
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [["2", "md5Checksum234", "md5"]], [])
@@ -233,10 +521,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("md5", next_hash_name)
 
-        self.assertEqual(2, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(2, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_3X_if_it_starts_with_sha256_but_sha1_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_3X_if_it_starts_with_sha256_but_sha1_checksum_found(self):
 
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [], [["3", "sha1Checksum345", "sha1"]])
@@ -251,10 +539,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("sha1", next_hash_name)
 
-        self.assertEqual(3, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(3, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_3X_if_it_starts_with_sha256_but_no_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_3X_if_it_starts_with_sha256_but_no_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [], [])
         )
@@ -268,10 +556,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("", next_hash_name)
 
-        self.assertEqual(3, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(3, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_1X_if_it_starts_with_md5_and_md5_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_1X_if_it_starts_with_md5_and_md5_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([["2", "md5Checksum234", "md5"]],)
         )
@@ -285,10 +573,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("md5", next_hash_name)
 
-        self.assertEqual(2, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(1, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_2X_if_it_starts_with_md5_but_sha256_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_2X_if_it_starts_with_md5_but_sha256_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [["1", "sha256Checksum123", "sha256"]])
         )
@@ -302,10 +590,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("sha256", next_hash_name)
 
-        self.assertEqual(2, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(2, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_3X_if_it_starts_with_md5_but_sha1_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_3X_if_it_starts_with_md5_but_sha1_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [], [["3", "sha1Checksum345", "sha1"]])
         )
@@ -319,10 +607,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("sha1", next_hash_name)
 
-        self.assertEqual(3, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(3, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_3X_if_it_starts_with_md5_but_no_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_3X_if_it_starts_with_md5_but_no_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [], [])
         )
@@ -336,10 +624,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("", next_hash_name)
 
-        self.assertEqual(3, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(3, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_1X_if_it_starts_with_sha1_and_sha1_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_1X_if_it_starts_with_sha1_and_sha1_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([["3", "sha1Checksum345", "sha1"]],)
         )
@@ -353,10 +641,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("sha1", next_hash_name)
 
-        self.assertEqual(2, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(1, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_2X_if_it_starts_with_sha1_but_sha256_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_2X_if_it_starts_with_sha1_but_sha256_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [["1", "sha256Checksum123", "sha256"]])
         )
@@ -370,10 +658,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("sha256", next_hash_name)
 
-        self.assertEqual(2, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(2, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_3X_if_it_starts_with_sha1_but_md5_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_3X_if_it_starts_with_sha1_but_md5_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [], [["2", "md5Checksum234", "md5"]])
         )
@@ -387,10 +675,10 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("md5", next_hash_name)
 
-        self.assertEqual(3, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(3, mock_holding_verification.checksum_in_db_calls)
 
-    def test_get_rows_with_hash_should_call_other_methods_3X_if_it_starts_with_sha1_but_no_checksum_found(self):
+    def test_get_rows_with_hash_should_read_file_once_and_query_db_3X_if_it_starts_with_sha1_but_no_checksum_found(self):
         mock_holding_verification = self.HVWithMockedChecksumMethods(
             self.table_name, ([], [], [])
         )
@@ -404,7 +692,7 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual({}, errors)
         self.assertEqual("", next_hash_name)
 
-        self.assertEqual(3, mock_holding_verification.checksum_for_file_calls)
+        self.assertEqual(1, mock_holding_verification.checksum_for_file_calls)
         self.assertEqual(3, mock_holding_verification.checksum_in_db_calls)
 
     def test_run_should_write_the_correct_info_to_the_csv_if_checksum_found_and_return_a_tally(self):
@@ -421,7 +709,7 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual([], all_file_errors)
         self.assertEqual({True: 1}, tally)
         (args, _) = csv_writer.writerow.call_args
-        self.assertEqual(((self.test_file, 19, True, "sha256Checksum123", "1, 10", "sha256", "sha256Checksum123"),), args)
+        self.assertEqual(((self.test_file, 19, True, "sha256Checksum123", "1, 10", "sha256", "sha256Checksum123", "", ""),), args)
 
     def test_run_should_write_the_correct_info_to_the_csv_if_checksum_not_found_and_return_a_tally(self):
         csv_writer = Mock()
@@ -436,7 +724,7 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual([], all_file_errors)
         self.assertEqual({False: 1}, tally)
         (args, _) = csv_writer.writerow.call_args
-        self.assertEqual(((self.test_file, 19, False, "sha256Checksum123", "", "", ""),), args)
+        self.assertEqual(((self.test_file, 19, False, "sha256Checksum123", "", "", "", "", ""),), args)
 
     def test_run_should_write_the_correct_info_to_the_csv_if_error_was_thrown_when_getting_checksum_and_return_a_tally(
         self):
@@ -452,7 +740,32 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual([{self.test_file: "OS Error thrown"}], all_file_errors)
         self.assertEqual({False: 1}, tally)
         (args, _) = csv_writer.writerow.call_args
-        self.assertEqual(((self.test_file, 19, False, "sha256Checksum123", "", "", ""),), args)
+        self.assertEqual(((self.test_file, 19, False, "sha256Checksum123", "", "", "", "", ""),), args)
+
+    def test_start_should_record_a_file_that_cannot_be_statted_as_an_error_rather_than_stopping_the_run(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        folder = os.path.join(temp_dir.name, "folder")
+        os.mkdir(folder)
+        broken_link = os.path.join(folder, "broken_link.txt")
+        try:
+            os.symlink(os.path.join(temp_dir.name, "deleted.txt"), broken_link)
+        except (OSError, NotImplementedError):  # e.g. on Windows without the privilege to create symlinks
+            temp_dir.cleanup()
+            self.skipTest("symlinks can't be created")
+        holding_verification = HoldingVerificationCore(
+            create_checksum_db(self.table_name, ()), self.table_name, settings=RunSettings(output_dir=temp_dir.name)
+        )
+        holding_verification.print = Mock()
+
+        with patch("builtins.print"):
+            result_summary = holding_verification.start({"paths": (folder,), "are_directories": True})
+
+        self.assertEqual((1, False), (result_summary.files_processed, result_summary.cancelled))
+        self.assertEqual([{broken_link}], [set(file_errors) for file_errors in result_summary.all_file_errors])
+        with open(result_summary.output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual([broken_link, "", "False", ""], rows[1][:4])
+        temp_dir.cleanup()
 
     def test_check_db_exists_should_prompt_the_user_if_db_does_not_exist(self):
         db_file_name = "non_existent_db_file_name"
@@ -503,7 +816,7 @@ class TestHoldingVerification(unittest.TestCase):
             self.assertEqual("csv_writer", csv_writer_run_args.object_type)
             self.assertEqual(expected_tally, tally)
 
-        self.assertEqual(1, mock_holding_verification.csv_file.close.call_count)
+        mock_holding_verification.csv_writer.close.assert_called_once_with(keep_checkpoint=False)
         self.assertEqual(1, db_connection.cursor.call_count)
 
         files_in_current_dir = os.listdir(self.output_csvs_dir)
@@ -544,7 +857,7 @@ class TestHoldingVerification(unittest.TestCase):
             self.assertEqual("csv_writer", csv_writer_run_args.object_type)
             self.assertEqual(expected_tally, tally)
 
-        self.assertEqual(1, mock_holding_verification.csv_file.close.call_count)
+        mock_holding_verification.csv_writer.close.assert_called_once_with(keep_checkpoint=False)
         self.assertEqual(1, db_connection.cursor.call_count)
 
         files_in_current_dir = os.listdir(self.output_csvs_dir)
@@ -600,12 +913,321 @@ class TestHoldingVerification(unittest.TestCase):
         self.assertEqual(expected_date, date_arg)
 
         self.assertEqual(5, mock_holding_verification.run_args.call_count)
+        self.assertEqual(1, mock_holding_verification.find_checksums_in_db_args.call_count)
+        ((checksums_looked_up,), _) = mock_holding_verification.find_checksums_in_db_args.call_args
+        self.assertEqual(15, len(checksums_looked_up))  # 3 checksums for each of the 5 files
 
         files_in_current_dir = os.listdir(self.output_csvs_dir)
 
         self.assertEqual(False, expected_csv_name(expected_file_name_dirs, expected_date) in files_in_current_dir)
         self.assertEqual(True, expected_csv_name(expected_file_name_dirs, expected_date, "") in files_in_current_dir)
 
+    def test_start_should_look_up_the_checksums_of_each_batch_of_files_together(self):
+        mock_holding_verification = self.HVWithMockedUserPromptCsvAndRunMethods(
+            self.table_name, {"paths": (self.test_files_folder, self.test_files_folder2), "are_directories": True}, Mock()
+        )
+        mock_holding_verification.LOOKUP_BATCH_SIZE = 2
+
+        mock_holding_verification.start(mock_holding_verification.selected_items)
+
+        self.assertEqual(5, mock_holding_verification.run_args.call_count)
+        self.assertEqual(
+            [6, 6, 3],
+            [len(checksums) for ((checksums,), _) in mock_holding_verification.find_checksums_in_db_args.call_args_list]
+        )
+
+    def test_start_should_skip_files_already_in_the_csv_and_add_the_rest_to_it_if_resuming_a_run(self):
+        test_file_sha256 = "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249"
+        connection = create_checksum_db(self.table_name, (("1", test_file_sha256, "SHA256"),))
+        resume_csv_name = os.path.normpath(f"{self.output_csvs_dir}/INGESTED_FILES_in_test_files_resume_IN_PROGRESS.csv")
+        empty_file_path = str(Path(self.test_files_folder) / "emptyTestFile.txt")
+        with open(resume_csv_name, "w", newline="", encoding="utf-8") as csv_file:
+            csv.writer(csv_file).writerows((
+                expected_csv_header, (empty_file_path, 0, False, "e3b0c442", "", "", "", "", ""),
+                (self.test_file, 19, True, test_file_sha256, "1", "sha256", test_file_sha256, "", "")
+            ))
+            csv_file.write(f"{self.empty_test_db},0,Fal")  # the app stopped part-way through writing this row
+        holding_verification = HoldingVerificationCore(connection, self.table_name)
+        holding_verification.print = Mock()
+
+        with patch("builtins.print"):
+            result_summary = holding_verification.start(
+                {"paths": (self.test_files_folder,), "are_directories": True, "resume_csv_name": resume_csv_name}
+            )
+
+        final_csv_name = resume_csv_name.replace("_IN_PROGRESS", "")
+        self.assertEqual(final_csv_name, result_summary.output_csv_name)
+        self.assertEqual(3, result_summary.files_processed)
+        self.assertEqual({False: 2, True: 1}, result_summary.tally)
+        with open(final_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(4, len(rows))
+        self.assertEqual([empty_file_path, self.test_file], [row[0] for row in rows[1:3]])
+        self.assertEqual(True, Path(rows[3][0]).match(f"*{self.empty_test_db}"))
+        self.assertEqual("False", rows[3][2])
+        connection.close()
+
+    def test_start_should_not_hash_or_look_up_files_of_a_size_that_is_not_in_the_db(self):
+        test_file_sha256 = "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249"
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, with_file_sizes=True)
+        connection.execute(f"INSERT INTO {self.table_name} VALUES ('1', '{test_file_sha256}', 'SHA256', 19);")
+
+        for (sha256_for_fast_rejects, expected_empty_file_sha256) in ((False, ""), (True, hashlib.sha256().hexdigest())):
+            holding_verification = HoldingVerificationCore(
+                connection, self.table_name,
+                settings=RunSettings(output_dir=self.output_csvs_dir, use_size_prefilter=True,
+                                     sha256_for_fast_rejects=sha256_for_fast_rejects)
+            )
+            holding_verification.print = Mock()
+            holding_verification.get_checksums_for_file = Mock(wraps=holding_verification.get_checksums_for_file)
+
+            with patch("builtins.print"):
+                result_summary = holding_verification.start(
+                    {"paths": (self.test_file, self.empty_test_file), "are_directories": False}
+                )
+
+            with open(result_summary.output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+                rows = list(csv.DictReader(csv_file))
+            self.assertEqual(
+                [(self.test_file, "True", test_file_sha256, ""),
+                 (self.empty_test_file, "False", expected_empty_file_sha256, "size")],
+                [(row["Local File Path"], row["In Preservica/DRI"], row["SHA256 Hash"], row["Fast Reject"])
+                 for row in rows]
+            )
+            self.assertEqual(
+                [((self.test_file, ("sha256", "md5", "sha1")), {})] +
+                ([((self.empty_test_file, ("sha256",)), {})] if sha256_for_fast_rejects else []),
+                holding_verification.get_checksums_for_file.call_args_list
+            )
+            os.remove(result_summary.output_csv_name)
+
+    def test_start_should_write_the_rows_so_far_and_keep_the_checkpoint_if_processing_fails_part_way(self):
+        connection = create_checksum_db(self.table_name, ())
+        output_dir = tempfile.TemporaryDirectory()
+        holding_verification = HoldingVerificationCore(
+            connection, self.table_name, settings=RunSettings(output_dir=output_dir.name, detect_duplicates=True),
+            progress_reporter=Mock()
+        )
+        run_file = holding_verification.run
+        paths_run = []
+
+        def run_until_the_second_file(*args):
+            paths_run.append(args[0])
+            if len(paths_run) == 2:
+                raise KeyboardInterrupt
+            return run_file(*args)
+
+        holding_verification.run = run_until_the_second_file
+        with self.assertRaises(KeyboardInterrupt):
+            holding_verification.start({"paths": (self.test_file, self.empty_test_file), "are_directories": False})
+
+        [output_csv_name] = [os.path.join(output_dir.name, file_name) for file_name in os.listdir(output_dir.name)
+                             if file_name.endswith("_IN_PROGRESS.csv")]
+        with open(output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            self.assertEqual([self.test_file], [row["Local File Path"] for row in csv.DictReader(csv_file)])
+        self.assertIsNotNone(read_checkpoint(output_csv_name))
+        self.assertEqual(({}, False), (holding_verification.earlier_copies, holding_verification.cancel_event.is_set()))
+        holding_verification.progress_reporter.finish.assert_called_once()
+        output_dir.cleanup()
+        connection.close()
+
+    def test_start_should_only_look_up_the_first_copy_of_a_file_and_give_its_result_to_the_later_copies(self):
+        test_file_sha256 = "e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249"
+        test_file2 = os.path.normpath("test/test_files2/testFile2.txt")
+        empty_test_file2 = os.path.normpath("test/test_files2/emptyTestFile2.txt")
+        connection = create_checksum_db(self.table_name, (("1", test_file_sha256, "SHA256"),))
+        holding_verification = HoldingVerificationCore(
+            connection, self.table_name, settings=RunSettings(output_dir=self.output_csvs_dir, detect_duplicates=True)
+        )
+        holding_verification.print = Mock()
+        holding_verification.look_up_checksums = Mock(wraps=holding_verification.look_up_checksums)
+
+        with patch("builtins.print"):
+            result_summary = holding_verification.start(
+                {"paths": (self.test_file, self.empty_test_file, test_file2, empty_test_file2), "are_directories": False}
+            )
+
+        with open(result_summary.output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(
+            [(self.test_file, "True", "1", ""), (self.empty_test_file, "False", "", ""),
+             (test_file2, "True", "1", self.test_file), (empty_test_file2, "False", "", "")],
+            [(row["Local File Path"], row["In Preservica/DRI"], row["Matching File Refs"], row["Duplicate Of"])
+             for row in rows]
+        )
+        self.assertEqual(3, holding_verification.look_up_checksums.call_count)
+        self.assertEqual((1, 19), (result_summary.duplicate_files, result_summary.duplicate_bytes))
+        os.remove(result_summary.output_csv_name)
+        connection.close()
+
+    def test_start_should_only_hash_a_file_ruled_out_by_its_size_once_another_file_has_the_same_size(self):
+        test_file2 = os.path.normpath("test/test_files2/testFile2.txt")
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, with_file_sizes=True)
+        connection.execute(f"INSERT INTO {self.table_name} VALUES ('1', 'sha256Checksum123', 'SHA256', 5);")
+        holding_verification = HoldingVerificationCore(
+            connection, self.table_name,
+            settings=RunSettings(output_dir=self.output_csvs_dir, use_size_prefilter=True, detect_duplicates=True)
+        )
+        holding_verification.print = Mock()
+        holding_verification.get_checksums_for_file = Mock(wraps=holding_verification.get_checksums_for_file)
+
+        with patch("builtins.print"):
+            result_summary = holding_verification.start(
+                {"paths": (self.test_file, self.empty_test_file, test_file2), "are_directories": False}
+            )
+
+        with open(result_summary.output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(
+            [("size", ""), ("size", ""), ("size", self.test_file)],
+            [(row["Fast Reject"], row["Duplicate Of"]) for row in rows]
+        )
+        self.assertEqual(
+            [((self.test_file, ("sha256",)), {}), ((test_file2, ("sha256",)), {})],
+            holding_verification.get_checksums_for_file.call_args_list
+        )
+        os.remove(result_summary.output_csv_name)
+
+    def test_start_should_only_hash_large_files_in_full_if_their_fingerprint_is_in_the_db(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, with_fingerprints=True)
+        connection.execute(f"INSERT INTO {self.table_name} VALUES ('1', 'sha256Checksum123', 'SHA256', "
+                           f"'{get_fingerprint(self.test_file, 4)}');")
+        temp_dir = tempfile.TemporaryDirectory()
+        large_file = os.path.join(temp_dir.name, "largeFile.txt")
+        with open(large_file, "w") as file:
+            file.write("This is not a test file")
+        holding_verification = HoldingVerificationCore(
+            connection, self.table_name,
+            settings=RunSettings(output_dir=self.output_csvs_dir, use_fingerprint_prefilter=True,
+                                 fingerprint_files_over_size=10, fingerprint_sample_size=4)
+        )
+        holding_verification.print = Mock()
+        holding_verification.get_checksums_for_file = Mock(wraps=holding_verification.get_checksums_for_file)
+
+        with patch("builtins.print"):
+            result_summary = holding_verification.start(
+                {"paths": (self.test_file, self.empty_test_file, large_file), "are_directories": False}
+            )
+
+        with open(result_summary.output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(["", "", "fingerprint"], [row["Fast Reject"] for row in rows])
+        self.assertEqual(
+            [((self.test_file, ("sha256", "md5", "sha1")), {}), ((self.empty_test_file, ("sha256", "md5", "sha1")), {})],
+            holding_verification.get_checksums_for_file.call_args_list
+        )
+        self.assertEqual({}, holding_verification.fingerprints_in_db)
+        os.remove(result_summary.output_csv_name)
+        temp_dir.cleanup()
+
+    def test_start_should_not_rule_out_large_files_if_the_db_fingerprints_were_taken_with_another_sample_size(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, with_fingerprints=True)
+        connection.execute(f"INSERT INTO {self.table_name} VALUES ('1', "
+                           "'e2d0fe1585a63ec6009c8016ff8dda8b17719a637405a4e23c0ff81339148249', 'SHA256', "
+                           f"'{get_fingerprint(self.test_file, 4)}');")
+        with patch("builtins.print") as mock_print:
+            holding_verification = HoldingVerificationCore(
+                connection, self.table_name,
+                settings=RunSettings(output_dir=self.output_csvs_dir, use_fingerprint_prefilter=True,
+                                     fingerprint_files_over_size=10, fingerprint_sample_size=8)
+            )
+            result_summary = holding_verification.start({"paths": (self.test_file,), "are_directories": False})
+
+        with open(result_summary.output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual([("", "True")], [(row["Fast Reject"], row["In Preservica/DRI"]) for row in rows])
+        self.assertEqual(False, holding_verification.use_fingerprint_prefilter)
+        self.assertIn("sample size of 8 bytes", mock_print.call_args_list[0].args[0])
+        os.remove(result_summary.output_csv_name)
+
+    def test_get_lookup_batches_should_end_a_batch_after_a_number_of_files_bytes_or_seconds(self):
+        holding_verification = HoldingVerificationCore(Mock(), self.table_name)
+        (holding_verification.LOOKUP_BATCH_SIZE, holding_verification.LOOKUP_BATCH_BYTES,
+         holding_verification.LOOKUP_BATCH_SECONDS) = (3, 100, 1.0)
+        now = [0.0]
+
+        def hashed_files():
+            for (path, size, seconds_to_hash) in (("a", 1, 0), ("b", 1, 0), ("c", 1, 0), ("d", 60, 0), ("e", 50, 0),
+                                                  ("f", 1, 0), ("g", 1, 2.0), ("h", 1, 0)):
+                now[0] += seconds_to_hash
+                yield path, os.stat_result((0,) * 6 + (size,) + (0,) * 3), ({}, {})
+
+        batches = list(holding_verification.get_lookup_batches(hashed_files(), clock=lambda: now[0]))
+
+        self.assertEqual([["a", "b", "c"], ["d", "e"], ["f", "g"], ["h"]],
+                         [[path for (path, _, _) in batch] for batch in batches])
+
+    def test_size_prefilter_should_not_be_used_if_any_rows_in_the_db_do_not_have_a_file_size(self):
+        connection = sqlite3.connect(":memory:")
+        create_checksum_table(connection, self.table_name, with_file_sizes=True)
+        connection.execute(f"INSERT INTO {self.table_name} VALUES ('1', 'sha256Checksum123', 'SHA256', NULL);")
+
+        with patch("builtins.print"):
+            holding_verification = HoldingVerificationCore(
+                connection, self.table_name, settings=RunSettings(use_size_prefilter=True)
+            )
+
+        self.assertEqual(False, holding_verification.use_size_prefilter)
+        self.assertEqual("", holding_verification.get_fast_reject_reason(self.test_file, 19))
+
+    def test_start_should_stop_after_the_current_file_and_keep_the_in_progress_csv_if_cancelled(self):
+        holding_verification = HoldingVerificationCore(
+            create_checksum_db(self.table_name, ()), self.table_name,
+            settings=RunSettings(csv_file_name_prefix="cancelled", output_dir=self.output_csvs_dir)
+        )
+        holding_verification.print = Mock()
+        progress_callback = Mock(side_effect=lambda file_progress: holding_verification.cancel_event.set())
+        holding_verification.progress_callback = progress_callback
+
+        with patch("builtins.print"):
+            result_summary = holding_verification.start({"paths": (self.test_files_folder,), "are_directories": True})
+
+        self.assertEqual(True, result_summary.cancelled)
+        self.assertEqual(1, result_summary.files_processed)
+        self.assertEqual(False, holding_verification.cancel_event.is_set())
+        self.assertIn("_IN_PROGRESS", result_summary.output_csv_name)
+        with open(result_summary.output_csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(2, len(rows))
+        [(file_progress,), _] = progress_callback.call_args
+        self.assertEqual((rows[1][0], int(rows[1][1]), False),
+                         (file_progress.path, file_progress.file_size, file_progress.checksum_found))
+
+    def test_read_in_progress_csv_should_return_nothing_if_the_app_stopped_while_writing_the_header(self):
+        csv_name = os.path.normpath(f"{self.output_csvs_dir}/partial_header.csv")
+        with open(csv_name, "w", newline="", encoding="utf-8") as csv_file:
+            csv_file.write("Local File Path,File Si")
+
+        processed_paths, rows_in_csv, tally, last_hash_name_found = HoldingVerificationCore(
+            Mock(), self.table_name
+        ).read_in_progress_csv(csv_name)
+
+        self.assertEqual((set(), 0, {}, ""), (processed_paths, rows_in_csv, tally, last_hash_name_found))
+        self.assertEqual(0, Path(csv_name).stat().st_size)
+
+        csv_file, _, _ = HoldingVerificationCore(Mock(), self.table_name).get_csv_writer_for_resumed_run(csv_name)
+        csv_file.close()
+        self.assertEqual(expected_csv_header, read_csv_header(csv_name))
+
+    def test_read_in_progress_csv_should_remove_the_rows_after_the_last_checkpoint(self):
+        csv_name = os.path.normpath(f"{self.output_csvs_dir}/checkpointed_IN_PROGRESS.csv")
+        csv_file = open(csv_name, "w", newline="", encoding="utf-8")
+        result_sink = CsvResultSink(csv_file, expected_csv_header)
+        result_sink.writerow((self.test_file, 19, True, "abc", "1", "sha256", "abc", "", ""))
+        result_sink.flush()
+        csv_file.write(f"{self.empty_test_file},0,False,def,,,,,\n\0\0\0")  # not synced to the disk before it stopped
+        csv_file.close()
+
+        processed_paths, rows_in_csv, tally, _ = HoldingVerificationCore(
+            Mock(), self.table_name
+        ).read_in_progress_csv(csv_name)
+
+        self.assertEqual(({self.test_file}, 1, {True: 1}), (processed_paths, rows_in_csv, tally))
+
     def test_start_should_print_a_message_letting_users_know_that_processing_is_completed_but_file_not_renamed(self):
         db_connection = Mock()
         db_connection.commit = Mock()
@@ -0,0 +1,54 @@
+import os
+import unittest
+
+from helpers.pre_scan import PreScan
+from holding_verification_core import HoldingVerificationCore
+
+
+class TestPreScan(unittest.TestCase):
+    def test_pre_scan_should_count_the_same_files_and_bytes_that_will_be_processed(self):
+        paths = ("test/test_files", "test/test_files2")
+        file_paths = list(HoldingVerificationCore.get_file_paths(paths, True))
+        file_to_skip = file_paths[0]
+
+        pre_scan = PreScan(paths, {file_to_skip}).start()
+        pre_scan.thread.join()
+
+        self.assertEqual(True, pre_scan.finished.is_set())
+        self.assertEqual(len(file_paths) - 1, pre_scan.files_found)
+        self.assertEqual(sum(os.stat(path).st_size for path in file_paths[1:]), pre_scan.bytes_found)
+
+    def test_pre_scan_should_count_files_given_alongside_folders(self):
+        pre_scan = PreScan(("test/test_files2", "test/test_files/testFile.txt")).start()
+        pre_scan.thread.join()
+
+        self.assertEqual((3, 38), (pre_scan.files_found, pre_scan.bytes_found))
+
+    def test_get_files_should_yield_the_files_found_in_the_same_order_as_processing_would_find_them(self):
+        paths = ("test/test_files", "test/test_files2")
+        files = list(HoldingVerificationCore.get_files(paths, True))
+
+        pre_scan = PreScan(paths, {files[0][0]}).start()
+
+        self.assertEqual([(path, file_stat.st_size) for (path, file_stat) in files[1:]],
+                         [(path, file_stat.st_size) for (path, file_stat) in pre_scan.get_files()])
+
+    def test_pre_scan_should_wait_for_the_files_found_to_be_processed_once_it_has_queued_the_maximum(self):
+        pre_scan = PreScan(("test/test_files", "test/test_files2"), max_queued_files=2).start()
+        pre_scan.thread.join(timeout=0.5)
+
+        self.assertEqual((False, 3), (pre_scan.finished.is_set(), pre_scan.files_found))
+        self.assertEqual(5, len(list(pre_scan.get_files())))
+        self.assertEqual(True, pre_scan.finished.is_set())
+
+    def test_stop_should_end_the_scan_even_if_the_files_found_are_not_being_processed(self):
+        pre_scan = PreScan(("test/test_files", "test/test_files2"), max_queued_files=1).start()
+
+        pre_scan.stop()
+        pre_scan.thread.join(timeout=5)
+
+        self.assertEqual(False, pre_scan.thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+from helpers.helper import ColourCliText
+from helpers.progress import (FileProgress, ProgressTracker, SilentProgressReporter, StatusLineProgressReporter,
+                              get_progress_reporter)
+
+
+class TestProgressTracker(unittest.TestCase):
+    def test_update_should_keep_running_totals_and_rates_of_the_files_processed(self):
+        progress_tracker = ProgressTracker(clock=Mock(side_effect=[100.0, 102.0, 102.0]))
+
+        progress_tracker.update(FileProgress("a.txt", 3_000_000, True))
+        progress_tracker.update(FileProgress("b.txt", 1_000_000, False))
+        progress_tracker.update(FileProgress("c.txt", 0, False))
+
+        self.assertEqual((3, 4_000_000, 1, 2, "c.txt"),
+                         (progress_tracker.files_processed, progress_tracker.bytes_processed,
+                          progress_tracker.files_matched, progress_tracker.files_not_matched,
+                          progress_tracker.current_file))
+        self.assertEqual(1.5, progress_tracker.files_per_second)
+        self.assertEqual(2.0, progress_tracker.mb_per_second)
+
+    def test_percent_complete_and_seconds_remaining_should_be_based_on_the_bytes_found_by_the_pre_scan(self):
+        pre_scan = Mock(files_found=4, bytes_found=8_000_000, finished=threading.Event())
+        progress_tracker = ProgressTracker(clock=Mock(side_effect=[0.0] + [10.0] * 10), pre_scan=pre_scan)
+        progress_tracker.update(FileProgress("a.txt", 2_000_000, True))
+
+        self.assertEqual(25.0, progress_tracker.percent_complete)
+        self.assertEqual(None, progress_tracker.seconds_remaining)  # more files might still be found
+        pre_scan.finished.set()
+        self.assertEqual(30.0, progress_tracker.seconds_remaining)
+        self.assertEqual("1 of 4 files processed; 25.0% of 8.0 MB (0.2 MB/sec), about 0:00:30 left",
+                         progress_tracker.describe())
+
+
+class TestProgressReporters(unittest.TestCase):
+    def test_status_line_reporter_should_only_rewrite_the_status_line_at_most_n_times_a_second(self):
+        progress_tracker = Mock(describe=Mock(side_effect=["1 file", "3 files", "4 files"]))
+        reporter = StatusLineProgressReporter(refreshes_per_second=2, clock=Mock(side_effect=[0.0, 0.3, 0.6, 0.6, 0.7, 0.7]),
+                                              colour_text=ColourCliText(use_colour=False))
+
+        with patch("builtins.print") as mock_print:
+            for path in ("a.txt", "b.txt", "c.txt", "d.txt"):
+                reporter.file_processed(FileProgress(path, 1, True), progress_tracker)
+            reporter.finish()
+
+        self.assertEqual(["\r1 file", "\r3 files", "\r4 files", ""],
+                         [call_args.args[0] if call_args.args else "" for call_args in mock_print.call_args_list])
+
+    def test_silent_reporter_should_not_print_anything_but_add_each_file_to_the_log_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            log_file_name = os.path.join(temp_dir, "holding_verification.log")
+            reporter = get_progress_reporter("silent", log_file_name=log_file_name)
+
+            with patch("builtins.print") as mock_print:
+                reporter.file_processed(FileProgress("a.txt", 1, True), ProgressTracker())
+                reporter.totals("1 files processed")
+                reporter.finish()
+
+            mock_print.assert_not_called()
+            self.assertIsInstance(reporter, SilentProgressReporter)
+            with open(log_file_name, encoding="utf-8") as log_file:
+                self.assertEqual("File ingested = True: a.txt\n1 files processed\n", log_file.read())
+
+    def test_colour_cli_text_should_not_add_colour_codes_if_the_output_is_not_a_terminal(self):
+        self.assertEqual("True", ColourCliText(use_colour=False).green(True))
+        self.assertNotEqual("True", ColourCliText(use_colour=True).green(True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from helpers.read_benchmark import (ALL_ALGORITHMS, BenchmarkResult, get_best_read_settings, get_sample,
+                                    run_benchmark, update_config_file)
+from holding_verification_core import ReadSettings
+
+
+class TestReadBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_run_benchmark_should_time_each_combination_of_settings_and_algorithm_with_the_sample(self):
+        sample = get_sample(("test/test_files", "test/test_files2"), max_bytes=1_000, max_files=3)
+
+        results = run_benchmark(sample, (4, 1_000), ("read", "mmap"), ("md5", ALL_ALGORITHMS), print_func=Mock())
+
+        self.assertEqual(3, len(sample))
+        self.assertEqual(
+            {(ReadSettings(buffer_size, read_strategy), algorithm) for buffer_size in (4, 1_000)
+             for read_strategy in ("read", "mmap") for algorithm in ("md5", ALL_ALGORITHMS)},
+            {(result.read_settings, result.algorithm) for result in results}
+        )
+        self.assertEqual({19}, {result.bytes_hashed for result in results})
+
+    def test_get_best_read_settings_should_pick_the_fastest_settings_for_calculating_every_algorithm(self):
+        results = [BenchmarkResult(ReadSettings(1, "read"), "md5", 100, 1.0),
+                   BenchmarkResult(ReadSettings(2, "mmap"), ALL_ALGORITHMS, 100, 2.0),
+                   BenchmarkResult(ReadSettings(3, "readinto"), ALL_ALGORITHMS, 100, 3.0)]
+
+        self.assertEqual(ReadSettings(2, "mmap"), get_best_read_settings(results))
+
+    def test_update_config_file_should_replace_or_add_the_values_and_keep_the_comments(self):
+        config_file_name = os.path.join(self.temp_dir.name, "config.ini")
+        with open(config_file_name, "w", encoding="utf-8") as config_file:
+            config_file.write("[DEFAULT]\nHASHING_WORKERS=1\nread_strategy=read\n\n# a comment\n")
+
+        update_config_file(config_file_name, "DEFAULT", {"READ_STRATEGY": "mmap", "READ_BUFFER_SIZE": "65536"})
+        update_config_file(config_file_name, "READ_SETTINGS D:/", {"PATH": "D:/", "READ_STRATEGY": "readinto"})
+
+        with open(config_file_name, "r", encoding="utf-8") as config_file:
+            self.assertEqual("[DEFAULT]\nHASHING_WORKERS=1\nread_strategy=mmap\nREAD_BUFFER_SIZE=65536\n\n# a comment\n"
+                             "\n[READ_SETTINGS D:/]\nPATH=D:/\nREAD_STRATEGY=readinto\n", config_file.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from helpers.result_sinks import CsvResultSink, ResultSink, get_checkpoint_name, read_checkpoint
+
+
+class TestCsvResultSink(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_name = os.path.join(self.temp_dir.name, "results_IN_PROGRESS.csv")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_rows(self) -> list[list[str]]:
+        with open(self.csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            return list(csv.reader(csv_file))
+
+    def test_writerow_should_only_write_the_rows_every_n_rows_or_t_seconds_and_record_a_checkpoint(self):
+        csv_file = open(self.csv_name, "w", newline="", encoding="utf-8")
+        result_sink = CsvResultSink(csv_file, ("Path", "Size"), flush_every_rows=2, flush_every_seconds=10,
+                                    clock=Mock(side_effect=[0.0, 1.0, 2.0, 2.0, 13.0, 13.0]))
+
+        result_sink.writerow(("a.txt", 1))
+        self.assertEqual([["Path", "Size"]], self.read_rows())
+        self.assertEqual(None, read_checkpoint(self.csv_name))
+        result_sink.writerow(("b.txt", 2))  # 2 rows
+        result_sink.writerow(("c.txt", 3))
+        result_sink.writerow(("d.txt", 4))  # 10 seconds since the last flush
+
+        self.assertEqual([["Path", "Size"], ["a.txt", "1"], ["b.txt", "2"], ["c.txt", "3"], ["d.txt", "4"]],
+                         self.read_rows())
+        self.assertEqual({"durable_bytes": os.path.getsize(self.csv_name), "last_durable_path": "d.txt"},
+                         read_checkpoint(self.csv_name))
+        self.assertEqual((4, ("d.txt", 4)), (result_sink.durable_rows, result_sink.last_durable_row))
+        result_sink.close()
+
+    def test_close_should_write_the_rows_left_and_only_keep_the_checkpoint_if_asked_to(self):
+        for keep_checkpoint in (True, False):
+            csv_file = open(self.csv_name, "w", newline="", encoding="utf-8")
+            result_sink = CsvResultSink(csv_file, ("Path", "Size"), flush_every_rows=100)
+            result_sink.writerow(("a.txt", 1))
+
+            result_sink.close(keep_checkpoint=keep_checkpoint)
+
+            self.assertEqual(True, csv_file.closed)
+            self.assertEqual([["Path", "Size"], ["a.txt", "1"]], self.read_rows())
+            self.assertEqual(keep_checkpoint, os.path.exists(get_checkpoint_name(self.csv_name)))
+
+
+class TestResultSink(unittest.TestCase):
+    def test_a_result_sink_that_cannot_write_rows_should_not_be_able_to_be_created(self):
+        class ResultSinkWithoutWriteRows(ResultSink):
+            pass
+
+        with self.assertRaises(TypeError):
+            ResultSinkWithoutWriteRows()
+
+
+if __name__ == "__main__":
+    unittest.main()
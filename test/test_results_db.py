@@ -0,0 +1,80 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from helpers.results_db import ResultsDb, SqliteResultSink
+from holding_verification_core import HoldingVerificationCore, ResultSummary, RunSettings
+
+
+class TestResultsDb(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.results_db = ResultsDb(os.path.join(self.temp_dir.name, "results.db"))
+
+    def tearDown(self):
+        self.results_db.close()
+        self.temp_dir.cleanup()
+
+    def add_run(self, roots, rows) -> int:
+        run_id = self.results_db.start_run(roots)
+        result_sink = SqliteResultSink(self.results_db, run_id, flush_every_rows=2)
+        for row in rows:
+            result_sink.writerow(row)
+        result_sink.close()
+        tally = {True: sum(row[2] for row in rows), False: sum(not row[2] for row in rows)}
+        self.results_db.end_run(run_id, ResultSummary(len(rows), tally, [], "results.csv"))
+        return run_id
+
+    def test_query_file_results_should_only_give_the_latest_result_of_each_file_with_the_status_asked_for(self):
+        first_run_id = self.add_run(["D:/"], [("D:/a.txt", 1, False, "aaa", "", "", "", "", ""),
+                                               ("D:/b.txt", 2, False, "bbb", "", "", "", "size", "")])
+        second_run_id = self.add_run(["D:/"], [("D:/a.txt", 1, True, "aaa", "1", "sha256", "aaa", "", "")])
+        self.add_run(["E:/"], [("E:/c.txt", 3, False, "ccc", "", "", "", "", "D:/b.txt")])
+
+        self.assertEqual(
+            [(first_run_id, "D:/b.txt"), (second_run_id, "D:/a.txt")],
+            [(run_id, path) for (run_id, path, *_) in self.results_db.query_file_results(run_ids=[1, 2])]
+        )
+        self.assertEqual(
+            [(first_run_id, "D:/a.txt"), (first_run_id, "D:/b.txt")],
+            [(run_id, path) for (run_id, path, *_) in
+             self.results_db.query_file_results(run_ids=[1, 2], in_dri=False, latest_only=False)]
+        )
+        self.assertEqual(["E:/c.txt"],
+                         [path for (_, path, *_) in self.results_db.query_file_results(last_runs=1, in_dri=False)])
+        self.assertEqual([(3, 1, 0, 1), (2, 1, 1, 0)],
+                         [(run_id, files_processed, files_in_dri, files_not_in_dri) for
+                          (run_id, _, _, _, files_processed, files_in_dri, files_not_in_dri, _)
+                          in self.results_db.get_runs(last_runs=2)])
+
+    def test_export_file_results_should_write_the_results_as_a_csv_with_the_run_id(self):
+        run_id = self.add_run(["D:/"], [("D:/a.txt", 1, True, "aaa", "1", "sha256", "aaa", "", "")])
+        csv_name = os.path.join(self.temp_dir.name, "export.csv")
+
+        rows_exported = self.results_db.export_file_results(csv_name, HoldingVerificationCore.CSV_HEADER,
+                                                            in_dri=True)
+
+        with open(csv_name, "r", newline="", encoding="utf-8") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(1, rows_exported)
+        self.assertEqual([["Run ID", *HoldingVerificationCore.CSV_HEADER],
+                          [str(run_id), "D:/a.txt", "1", "True", "aaa", "1", "sha256", "aaa", "", ""]], rows)
+
+    def test_the_results_db_should_be_written_as_often_as_configured_if_it_is_the_only_output(self):
+        holding_verification = HoldingVerificationCore(
+            Mock(), "files_in_dri",
+            settings=RunSettings(results_flush_every_rows=5, results_flush_every_seconds=2.5, write_csv=False),
+            results_db=self.results_db
+        )
+
+        (result_sink, run_id, _) = holding_verification.add_other_outputs_to_result_sink(None, ("D:/",), "", "D")
+
+        self.assertIsInstance(result_sink, SqliteResultSink)
+        self.assertEqual((run_id, 5, 2.5),
+                         (result_sink.run_id, result_sink.flush_every_rows, result_sink.flush_every_seconds))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from helpers.traversal import walk_files
+
+
+class TestTraversal(unittest.TestCase):
+    def test_walk_files_should_yield_the_same_files_in_the_same_order_as_path_walk_with_their_stat_results(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for (sub_dir, file_names) in (("", ("a.txt", "b.txt")), ("x", ("c.txt",)), ("x/y", ("d.txt", "e.txt")),
+                                          ("z", ("f.txt",)), ("empty", ())):
+                os.makedirs(os.path.join(temp_dir, sub_dir), exist_ok=True)
+                for file_name in file_names:
+                    Path(temp_dir, sub_dir, file_name).write_text(file_name)
+
+            files = list(walk_files(temp_dir))
+
+            expected_paths = [f"{direct_dir / file_name}" for (direct_dir, _, file_names) in Path(temp_dir).walk()
+                              for file_name in file_names]
+            self.assertEqual(expected_paths, [path for (path, _) in files])
+            self.assertEqual([os.stat(path).st_size for path in expected_paths],
+                             [file_stat.st_size for (_, file_stat) in files])
+
+
+if __name__ == "__main__":
+    unittest.main()